@@ -0,0 +1,54 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from api.qr import label_lines, render_qr
+from api.qrcodes import get_qr, get_qr_pool, render_sheet
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare printing the QR codes of synthetic items one request at a time with one sheet, '
+        'uncached and cached. Only the rendering and the cache are timed; the database is not used.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=48)
+        parser.add_argument('--workers', type=int, default=settings.QR_WORKERS, help='QR_WORKERS for the sheets; 0 renders them in this process.')
+
+    def handle(self, *args, **options):
+        with override_settings(QR_WORKERS=options['workers']):
+            self.run(options['items'])
+
+    def run(self, count):
+        self.stdout.write('%d items, %d QR workers, %s cache' % (count, settings.QR_WORKERS, settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]))
+
+        if settings.QR_WORKERS:
+            # Start the workers before timing anything
+            get_qr_pool().submit(render_qr, 'warm up', 'png').result()
+
+        for kind in ('svg', 'png'):
+            codes = self.codes(count)
+            self.report('Per item %s, uncached' % kind, count, self.time(lambda: [get_qr(item_id, url, kind) for item_id, url, lines in codes]))
+            self.report('Per item %s, cached' % kind, count, self.time(lambda: [get_qr(item_id, url, kind) for item_id, url, lines in codes]))
+
+        for kind in ('svg', 'pdf'):
+            entries = self.codes(count)
+            self.report('Sheet %s, uncached' % kind, count, self.time(lambda: render_sheet(entries, kind)))
+            self.report('Sheet %s, cached codes' % kind, count, self.time(lambda: render_sheet(entries, kind)))
+
+    def codes(self, count):
+        # A new host every run, so nothing is cached yet
+        host = 'http://%s.example.com' % uuid.uuid4().hex
+        return [(item_id, '%s/api/v1/claim-item/%d/' % (host, item_id), label_lines(item_id, 'Item %d' % item_id)) for item_id in range(1, count + 1)]
+
+    def time(self, function):
+        start = time.perf_counter()
+        function()
+        return time.perf_counter() - start
+
+    def report(self, name, count, seconds):
+        self.stdout.write('%-28s %8.1f ms  %8.0f items/s' % (name, seconds * 1000, count / seconds))
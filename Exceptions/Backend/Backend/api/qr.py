@@ -0,0 +1,122 @@
+"""
+QR codes for item claim URLs and the printable sheets of them. Like items/imaging.py this runs
+in worker processes, so it does not import Django; caching and the pool are in api/qrcodes.py.
+"""
+import base64
+import io
+from html import escape
+
+import segno
+from PIL import Image, ImageDraw, ImageFont
+
+KINDS = ('svg', 'png')
+SHEET_KINDS = ('svg', 'pdf')
+# Part of every cache key and ETag: change it when the output below changes
+VERSION = 1
+
+# The SVG is what QRCodeOptions(size='M', border=4) gave through django-qr-code
+BORDER = 4
+SVG_SCALE = 1.8 # mm per module
+# About 330 pixels wide, a little more than the codes on a PDF sheet need
+PNG_SCALE = 10 # pixels per module
+
+# A4 sheets of COLUMNS x ROWS codes, in mm
+PAGE_SIZE = (210, 297)
+MARGIN = 10
+COLUMNS = 3
+ROWS = 4
+CODE_SIZE = 50
+LABEL_SIZE = 3.5
+LABEL_LENGTH = 30 # characters of the item name
+PDF_DPI = 150
+
+
+def render_qr(data, kind):
+    """The QR code for data as SVG or PNG bytes."""
+    qr = segno.make(data, error='m', micro=False, boost_error=True, mode='byte', encoding='utf-8')
+    out = io.BytesIO()
+
+    if kind == 'svg':
+        qr.save(out, kind='svg', border=BORDER, scale=SVG_SCALE, unit='mm')
+    elif kind == 'png':
+        qr.save(out, kind='png', border=BORDER, scale=PNG_SCALE)
+    else:
+        raise ValueError('Unknown QR code kind %r' % kind)
+
+    return out.getvalue()
+
+
+def render_qrs(urls, kind):
+    """render_qr for a chunk of URLs, so the pool sends one task per chunk instead of per code."""
+    return [render_qr(url, kind) for url in urls]
+
+
+def label_lines(item_id, item_name):
+    name = item_name if len(item_name) <= LABEL_LENGTH else item_name[:LABEL_LENGTH - 1] + '…'
+    return [name, '#%d' % item_id]
+
+
+def _cells(count):
+    """(page, x, y) in mm of the top left corner of each code, page by page, row by row."""
+    cell_width = (PAGE_SIZE[0] - 2 * MARGIN) / COLUMNS
+    cell_height = (PAGE_SIZE[1] - 2 * MARGIN) / ROWS
+
+    for i in range(count):
+        page, position = divmod(i, COLUMNS * ROWS)
+        row, column = divmod(position, COLUMNS)
+        yield page, MARGIN + column * cell_width + (cell_width - CODE_SIZE) / 2, MARGIN + row * cell_height + LABEL_SIZE
+
+
+def svg_sheet(codes):
+    """
+    One SVG of (svg bytes, label lines) pairs laid out as A4 pages stacked top to bottom.
+    The codes are embedded as they are, so they are the same bytes the single code endpoint serves.
+    """
+    pages = max(1, -(-len(codes) // (COLUMNS * ROWS)))
+    width, height = PAGE_SIZE[0], PAGE_SIZE[1] * pages
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        'width="%dmm" height="%dmm" viewBox="0 0 %d %d" font-family="sans-serif" font-size="%s" text-anchor="middle">'
+        '<rect width="100%%" height="100%%" fill="#fff"/>' % (width, height, width, height, LABEL_SIZE)
+    ]
+
+    for (page, x, y), (svg, lines) in zip(_cells(len(codes)), codes):
+        y += page * PAGE_SIZE[1]
+        parts.append('<image x="%.2f" y="%.2f" width="%d" height="%d" xlink:href="data:image/svg+xml;base64,%s"/>' % (
+            x, y, CODE_SIZE, CODE_SIZE, base64.b64encode(svg).decode(),
+        ))
+        for n, line in enumerate(lines, start=1):
+            parts.append('<text x="%.2f" y="%.2f">%s</text>' % (x + CODE_SIZE / 2, y + CODE_SIZE + n * LABEL_SIZE * 1.3, escape(line)))
+
+    parts.append('</svg>')
+    return ''.join(parts).encode()
+
+
+def pdf_sheet(codes):
+    """One PDF of (png bytes, label lines) pairs, an A4 page per COLUMNS x ROWS codes."""
+    def px(mm):
+        return round(mm * PDF_DPI / 25.4)
+
+    font = ImageFont.load_default(size=px(LABEL_SIZE))
+    pages = []
+
+    for (page, x, y), (png, lines) in zip(_cells(len(codes)), codes):
+        if page == len(pages):
+            pages.append(Image.new('L', (px(PAGE_SIZE[0]), px(PAGE_SIZE[1])), 255))
+        sheet = pages[page]
+
+        with Image.open(io.BytesIO(png)) as code:
+            # Nearest neighbour keeps the modules sharp
+            sheet.paste(code.convert('L').resize((px(CODE_SIZE), px(CODE_SIZE)), Image.NEAREST), (px(x), px(y)))
+
+        draw = ImageDraw.Draw(sheet)
+        for n, line in enumerate(lines, start=1):
+            draw.text((px(x + CODE_SIZE / 2), px(y + CODE_SIZE + n * LABEL_SIZE * 1.3)), line, fill=0, font=font, anchor='ms')
+
+    if not pages:
+        pages.append(Image.new('L', (px(PAGE_SIZE[0]), px(PAGE_SIZE[1])), 255))
+
+    out = io.BytesIO()
+    pages[0].save(out, 'PDF', resolution=PDF_DPI, save_all=True, append_images=pages[1:])
+    return out.getvalue()
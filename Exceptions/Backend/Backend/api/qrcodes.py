@@ -0,0 +1,82 @@
+"""
+Cached QR codes for the item claim URLs, rendered by api/qr.py. A code depends only on its claim URL,
+so it is cached under the item id and a hash of the URL, and the same hash is its ETag.
+Sheets render the codes that are not cached yet in a process pool.
+"""
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .qr import VERSION, pdf_sheet, render_qrs, svg_sheet
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_qr_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the workers don't inherit the web process's threads or database connections
+            _pool = ProcessPoolExecutor(max_workers=settings.QR_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+
+    return _pool
+
+
+def qr_etag(url, kind):
+    return '"%s"' % hashlib.sha1(('%d:%s:%s' % (VERSION, kind, url)).encode()).hexdigest()
+
+
+def sheet_etag(entries, kind):
+    """ETag of a sheet of (item id, claim URL, label lines) entries; the labels change with the item names."""
+    digest = hashlib.sha1(('%d:sheet:%s' % (VERSION, kind)).encode())
+    for item_id, url, lines in entries:
+        digest.update(('\0%s\0%s' % (url, '\0'.join(lines))).encode())
+    return '"%s"' % digest.hexdigest()
+
+
+def _cache_key(item_id, url, kind):
+    return 'qr:%d:%s:%s' % (item_id, kind, qr_etag(url, kind)[1:17])
+
+
+def get_qrs(codes, kind):
+    """
+    The QR code bytes of (item id, claim URL) pairs. The ones not cached are rendered in the pool,
+    a chunk per worker, or right here for a single code or when QR_WORKERS is 0.
+    """
+    keys = [_cache_key(item_id, url, kind) for item_id, url in codes]
+    found = cache.get_many(keys)
+    missing = {key: url for key, (item_id, url) in zip(keys, codes) if key not in found}
+
+    if missing:
+        urls = list(missing.values())
+        if settings.QR_WORKERS and len(urls) > 1:
+            size = -(-len(urls) // settings.QR_WORKERS)
+            chunks = [urls[i:i + size] for i in range(0, len(urls), size)]
+            rendered = [code for chunk in get_qr_pool().map(render_qrs, chunks, [kind] * len(chunks)) for code in chunk]
+        else:
+            rendered = render_qrs(urls, kind)
+
+        rendered = dict(zip(missing, rendered))
+        cache.set_many(rendered, settings.QR_CACHE_TIMEOUT)
+        found.update(rendered)
+
+    return [found[key] for key in keys]
+
+
+def get_qr(item_id, url, kind):
+    return get_qrs([(item_id, url)], kind)[0]
+
+
+def render_sheet(entries, kind):
+    """A printable sheet of (item id, claim URL, label lines) entries as SVG or PDF bytes."""
+    # The PDF is made of the PNG codes, the SVG sheet embeds the SVG ones
+    codes = get_qrs([(item_id, url) for item_id, url, lines in entries], 'svg' if kind == 'svg' else 'png')
+    cells = [(code, lines) for code, (item_id, url, lines) in zip(codes, entries)]
+
+    return svg_sheet(cells) if kind == 'svg' else pdf_sheet(cells)
@@ -0,0 +1,79 @@
+import base64
+from datetime import date
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from items.models import Item
+from users.models import User
+from . import qrcodes
+
+
+@override_settings(QR_WORKERS=0)
+class QRCodeTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('desk', 'desk@example.com', 'password', unique_id='F001')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_item(self, name, **kwargs):
+        return Item.objects.create(item_name=name, found_date=date(2025, 3, 1), posted_by=self.user, **kwargs)
+
+    def test_code_is_cached_and_revalidated(self):
+        item = self.create_item('Umbrella')
+        url = '/api/v1/generate-qr/%d/' % item.id
+
+        with mock.patch.object(qrcodes, 'render_qrs', wraps=qrcodes.render_qrs) as render:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'image/svg+xml')
+            self.assertIn(b'<svg', response.content)
+
+            self.assertEqual(self.client.get(url).content, response.content)
+            self.assertEqual(render.call_count, 1)
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+        png = self.client.get(url + '?type=png')
+        self.assertTrue(png.content.startswith(b'\x89PNG'))
+        self.assertNotEqual(png['ETag'], response['ETag'])
+
+        # The ETag check comes after the claimed check
+        item.is_claimed = True
+        item.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/generate-qr/%d/?type=gif' % item.id).status_code, 400)
+
+    def test_sheet_holds_the_unclaimed_items_codes(self):
+        items = [self.create_item('Item %d' % i) for i in range(13)]
+        claimed = self.create_item('Claimed', is_claimed=True)
+        ids = ','.join(str(item.id) for item in items + [claimed])
+
+        response = self.client.get('/api/v1/generate-qr/sheet/?ids=%s' % ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.count(b'<image '), 13)
+        self.assertNotIn(b'Claimed', response.content)
+
+        # The sheet embeds the codes the single code endpoint serves, and they are cached
+        code = self.client.get('/api/v1/generate-qr/%d/' % items[0].id).content
+        self.assertIn(base64.b64encode(code), response.content)
+
+        self.assertEqual(self.client.get('/api/v1/generate-qr/sheet/?ids=%s' % ids, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        items[0].item_name = 'Renamed'
+        items[0].save()
+        self.assertEqual(self.client.get('/api/v1/generate-qr/sheet/?ids=%s' % ids, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+        pdf = self.client.get('/api/v1/generate-qr/sheet/?type=pdf&ids=%s' % ids)
+        self.assertEqual(pdf['Content-Type'], 'application/pdf')
+        self.assertTrue(pdf.content.startswith(b'%PDF'))
+
+        self.assertEqual(self.client.get('/api/v1/generate-qr/sheet/?ids=%d' % claimed.id).status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/generate-qr/sheet/?ids=1,x').status_code, 400)
@@ -8,6 +8,7 @@ from items.views import (
 )
 from .views import (
     GenerateItemQRAPIView,
+    QRSheetAPIView,
     ClaimItemAPIView
 )
 
@@ -17,6 +18,7 @@ urlpatterns = [
     path('all/', ItemListAPIView.as_view(), name='item-list'),
     path('pending/', NonApprovedItemListAPIView.as_view(), name='non-approved-items'),
     path('item/<int:item_id>/', ItemDetailAPIView.as_view(), name='item-detail'),
+    path('generate-qr/sheet/', QRSheetAPIView.as_view(), name='generate-qr-sheet'),
     path('generate-qr/<int:item_id>/', GenerateItemQRAPIView.as_view(), name='generate-item-qr'),
     path('claim-item/<int:item_id>/', ClaimItemAPIView.as_view(), name='claim-item'),
 ]
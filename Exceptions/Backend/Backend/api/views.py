@@ -8,8 +8,9 @@ from .serializers import ItemSerializer
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponse
 from django.urls import reverse
-from qr_code.qrcode.utils import QRCodeOptions
-from qr_code.qrcode.maker import make_qr
+from django.utils.cache import get_conditional_response, patch_cache_control
+from .qr import KINDS, SHEET_KINDS, label_lines
+from .qrcodes import get_qr, qr_etag, render_sheet, sheet_etag
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 
@@ -57,54 +58,97 @@ class FoundItemCreateAPIView(generics.CreateAPIView):
         serializer.save(posted_by=self.request.user, is_claimed=False)
 
 
-class ItemListAPIView(generics.ListAPIView):
+class ItemDetailAPIView(generics.RetrieveAPIView):
     """
-    API to retrieve all items. Requires authentication.
+    API to fetch details of a specific item. Requires authentication.
     """
     authentication_classes = [CookieJWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
+    lookup_field = 'id'
 
 
-class NonApprovedItemListAPIView(generics.ListAPIView):
-    """
-    API to retrieve items that are not yet approved (is_claimed=False). Requires authentication.
-    """
-    authentication_classes = [CookieJWTAuthentication]
-    permission_classes = [IsAuthenticated]
-    queryset = Item.objects.filter(is_claimed=False)
-    serializer_class = ItemSerializer
+QR_CONTENT_TYPES = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+    'pdf': 'application/pdf',
+}
+# Most items on one QR sheet
+QR_SHEET_MAX_ITEMS = 200
 
 
-class ItemDetailAPIView(generics.RetrieveAPIView):
-    """
-    API to fetch details of a specific item. Requires authentication.
-    """
-    authentication_classes = [CookieJWTAuthentication]
-    permission_classes = [IsAuthenticated]
-    queryset = Item.objects.all()
-    serializer_class = ItemSerializer
-    lookup_field = 'id'
+def qr_response(content, kind, etag):
+    response = HttpResponse(content, content_type=QR_CONTENT_TYPES[kind])
+    response['ETag'] = etag
+    # Revalidated every time, as the item may have been claimed since
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 class GenerateItemQRAPIView(APIView):
     """
-    API to generate a QR code for an item using django-qr-code.
+    API to generate the QR code of an item's claim URL, as SVG or, with ?type=png, PNG.
+    Codes are cached and sent with an ETag, so a repeated request is answered with 304 Not Modified.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, item_id):
+        kind = request.query_params.get('type', 'svg')
+        if kind not in KINDS:
+            return Response({"message": "type must be one of: %s." % ', '.join(KINDS)}, status=status.HTTP_400_BAD_REQUEST)
+
         item = get_object_or_404(Item, id=item_id)
 
         if item.is_claimed:
             return HttpResponse("This item has already been claimed.", status=400)
 
         claim_url = request.build_absolute_uri(reverse('claim-item', args=[item.id]))
-        qr_options = QRCodeOptions(size='M', border=4)
-        qr_svg = make_qr(claim_url, qr_options)
+        etag = qr_etag(claim_url, kind)
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        return qr_response(get_qr(item.id, claim_url, kind), kind, etag)
+
+
+class QRSheetAPIView(APIView):
+    """
+    API to generate a printable sheet of the QR codes of several items, e.g. ?ids=1,2,3,
+    as SVG or, with ?type=pdf, PDF with an A4 page per 12 codes. Claimed items are left out.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        kind = request.query_params.get('type', 'svg')
+        if kind not in SHEET_KINDS:
+            return Response({"message": "type must be one of: %s." % ', '.join(SHEET_KINDS)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            ids = list(dict.fromkeys(int(item_id) for item_id in request.query_params.get('ids', '').split(',') if item_id.strip()))
+        except ValueError:
+            return Response({"message": "ids must be comma separated item ids."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not ids or len(ids) > QR_SHEET_MAX_ITEMS:
+            return Response({"message": "Give between 1 and %d item ids." % QR_SHEET_MAX_ITEMS}, status=status.HTTP_400_BAD_REQUEST)
+
+        items = Item.objects.filter(id__in=ids, is_claimed=False).only('id', 'item_name').in_bulk()
+        if not items:
+            return Response({"message": "No unclaimed items found."}, status=status.HTTP_404_NOT_FOUND)
+
+        # In the order asked for
+        entries = [
+            (item_id, request.build_absolute_uri(reverse('claim-item', args=[item_id])), label_lines(item_id, items[item_id].item_name))
+            for item_id in ids if item_id in items
+        ]
+        etag = sheet_etag(entries, kind)
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
 
-        return HttpResponse(qr_svg, content_type="image/svg+xml")
+        return qr_response(render_sheet(entries, kind), kind, etag)
 
 
 class ClaimItemAPIView(APIView):
@@ -0,0 +1,40 @@
+"""
+Processing of uploaded item photos: orientation, resizing to the standard variants and WebP
+encoding without metadata. Like items/phash.py this runs in the image worker processes, so it
+does not import Django.
+"""
+from PIL import Image, ImageOps
+
+from .phash import hash_image
+
+# Longest side of each variant, largest first; list responses link the first one as the image
+VARIANTS = (
+    ('large', 1600),
+    ('medium', 800),
+    ('thumb', 320),
+)
+WEBP_QUALITY = 80
+
+
+def process_image(source, destination):
+    """
+    Write source as destination-<variant>.webp for every variant and return ({variant: path}, phash).
+    EXIF orientation is applied to the pixels; EXIF (with any GPS position), ICC and XMP are not copied.
+    """
+    largest = VARIANTS[0][1]
+
+    with Image.open(source) as image:
+        # JPEGs are decoded at the smallest scale that still covers the largest variant
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+        paths = {}
+        for name, size in VARIANTS:
+            # thumbnail() only ever shrinks, and each variant is made from the previous, smaller one
+            image.thumbnail((size, size), Image.LANCZOS)
+            paths[name] = '%s-%s.webp' % (destination, name)
+            image.save(paths[name], 'WEBP', quality=WEBP_QUALITY, method=4)
+
+        return paths, hash_image(image)
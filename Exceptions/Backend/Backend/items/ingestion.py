@@ -0,0 +1,134 @@
+"""
+Uploaded item photos: the request only stores the originals and inserts their rows, pending.
+After the commit a process pool turns each original into WebP variants and a perceptual hash
+(items/imaging.py), the row is pointed at the variants and the original is deleted.
+Images left pending when a web process stops before its pool is done are picked up again
+by the process_pending_images command.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .imaging import process_image
+from .models import ItemImage
+from .similarity import index_hashes
+
+logger = logging.getLogger(__name__)
+
+ORIGINALS_DIR = 'item_images/originals/'
+VARIANTS_DIR = 'item_images/variants/'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_image_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the workers don't inherit the web process's threads or database connections
+            _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+
+    return _pool
+
+
+def shutdown_image_pool():
+    """Wait for the images submitted to the pool to be finished, e.g. before a command exits."""
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def save_uploads(item, uploaded_files):
+    """
+    Store the uploads as originals and insert their rows in one query; they are processed once the
+    transaction commits. Uploads over FILE_UPLOAD_MAX_MEMORY_SIZE are already temporary files and are moved, not copied.
+    """
+    storage = ItemImage._meta.get_field('image').storage
+    images = ItemImage.objects.bulk_create([
+        ItemImage(item=item, image=storage.save(ORIGINALS_DIR + os.path.basename(upload.name), upload), status=ItemImage.PENDING)
+        for upload in uploaded_files
+    ])
+
+    if images:
+        transaction.on_commit(partial(process_images, [image.id for image in images]))
+    return images
+
+
+def process_images(image_ids):
+    """Process pending images in the pool without waiting for it, or right away when IMAGE_WORKERS is 0."""
+    storage = ItemImage._meta.get_field('image').storage
+
+    for image_id, item_id, name in ItemImage.objects.filter(id__in=image_ids, status=ItemImage.PENDING).values_list('id', 'item_id', 'image'):
+        source = storage.path(name)
+        destination = storage.path('%s%d' % (VARIANTS_DIR, image_id))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        if not settings.IMAGE_WORKERS:
+            try:
+                result = process_image(source, destination)
+            except Exception:
+                result = None
+                logger.exception('Could not process item image %d', image_id)
+            finish_image(image_id, item_id, name, result)
+            continue
+
+        future = get_image_pool().submit(process_image, source, destination)
+        future.add_done_callback(partial(_finish_future, image_id, item_id, name))
+
+
+def process_stale_images(max_age):
+    """
+    Process the images still pending max_age (a timedelta) after their upload, and wait for them.
+    Returns how many there were.
+    """
+    image_ids = list(ItemImage.objects.filter(status=ItemImage.PENDING, uploaded_at__lt=timezone.now() - max_age).values_list('id', flat=True))
+    process_images(image_ids)
+    shutdown_image_pool()
+    return len(image_ids)
+
+
+def _finish_future(image_id, item_id, name, future):
+    # Runs on the pool's result thread, which gets its own database connection
+    try:
+        try:
+            result = future.result()
+        except Exception:
+            result = None
+            logger.exception('Could not process item image %d', image_id)
+        finish_image(image_id, item_id, name, result)
+    finally:
+        connection.close()
+
+
+def finish_image(image_id, item_id, original, result):
+    """
+    Point the row at its variants and drop the original, or mark it failed and keep the original.
+    Only pending rows change, so a late result never undoes one the stale image sweep already finished.
+    """
+    if result is None:
+        ItemImage.objects.filter(id=image_id, status=ItemImage.PENDING).update(status=ItemImage.FAILED)
+        return
+
+    storage = ItemImage._meta.get_field('image').storage
+    paths, value = result
+    variants = {name: os.path.relpath(path, storage.location).replace(os.sep, '/') for name, path in paths.items()}
+    now = timezone.now()
+
+    if not ItemImage.objects.filter(id=image_id, status=ItemImage.PENDING).update(
+        image=next(iter(variants.values())), variants=variants, status=ItemImage.READY, phash=value, hashed_at=now,
+    ):
+        return
+    storage.delete(original)
+    index_hashes([(image_id, item_id, value)], now)
@@ -0,0 +1,64 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from items.models import Item, ItemImage
+from items.renderers import ORJSONRenderer
+from items.serializers import ItemSerializer, serialize_items
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Compare items/sec of ItemSerializer + JSONRenderer against serialize_items + ORJSONRenderer. Nothing is written to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=200, help='Items per page.')
+        parser.add_argument('--images', type=int, default=3, help='Images per item.')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            items = self.create_items(options['items'], options['images'])
+            results = self.run(items, options['repeat'])
+            transaction.set_rollback(True)
+
+        for name, seconds in results:
+            self.stdout.write('%-34s %12.0f items/s' % (name, options['items'] * options['repeat'] / seconds))
+        self.stdout.write('Speed-up: %.1fx' % (results[0][1] / results[1][1]))
+
+    def create_items(self, count, images):
+        user = User.objects.create_user('benchmark-serializer', unique_id='BENCHMARK')
+        items = Item.objects.bulk_create([
+            Item(item_name='Item %d' % i, description='Black umbrella with a wooden handle', found_location='Library',
+                 found_date=date(2025, 1, 1) + timedelta(days=i % 90), posted_by=user)
+            for i in range(count)
+        ])
+        ItemImage.objects.bulk_create([
+            ItemImage(item=item, image='item_images/%d-%d.jpg' % (item.id, n)) for item in items for n in range(images)
+        ])
+        return list(Item.objects.filter(posted_by=user).prefetch_related('images'))
+
+    def run(self, items, repeat):
+        request = RequestFactory().get('/api/v1/items/', HTTP_HOST='localhost')
+
+        def drf():
+            return JSONRenderer().render(ItemSerializer(items, many=True, context={'request': request}).data)
+
+        def plain():
+            return ORJSONRenderer().render(serialize_items(items, request))
+
+        if drf() != plain():
+            raise CommandError('serialize_items output differs from ItemSerializer')
+
+        results = []
+        for name, render in (('ItemSerializer + JSONRenderer', drf), ('serialize_items + ORJSONRenderer', plain)):
+            start = time.perf_counter()
+            for i in range(repeat):
+                render()
+            results.append((name, time.perf_counter() - start))
+
+        return results
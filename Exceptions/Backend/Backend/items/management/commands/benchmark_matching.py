@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from items.matching import MatchIndex, item_terms
+
+COLORS = ['black', 'blue', 'red', 'green', 'grey', 'white', 'silver', 'brown', 'pink', 'yellow']
+THINGS = ['umbrella', 'wallet', 'phone', 'laptop', 'charger', 'bottle', 'jacket', 'keys', 'headphones', 'calculator', 'id card', 'backpack', 'watch', 'notebook', 'glasses']
+BRANDS = ['samsung', 'apple', 'dell', 'hp', 'lenovo', 'casio', 'boat', 'milton', 'wildcraft', 'puma', 'nike', 'sony']
+DETAILS = ['scratched', 'sticker', 'cracked screen', 'leather', 'zip pocket', 'name tag', 'keychain', 'cover', 'strap', 'lanyard']
+PLACES = ['library', 'canteen', 'block', 'lab', 'auditorium', 'parking', 'hostel', 'gym', 'ground', 'bus stop']
+
+
+def make_item(rng, item_id):
+    thing = rng.choice(THINGS)
+    name = '%s %s %s' % (rng.choice(COLORS), rng.choice(BRANDS), thing)
+    description = '%s %s with %s and %s, found near room %d' % (rng.choice(COLORS), thing, rng.choice(DETAILS), rng.choice(DETAILS), rng.randint(100, 999))
+    location = '%s %d' % (rng.choice(PLACES), rng.randint(1, 20))
+    return item_id, name, description, location
+
+
+class Command(BaseCommand):
+    help = 'Build the match index over synthetic items and time building, queries and incremental updates. The database is not used.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--updates', type=int, default=2000)
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        documents = [make_item(rng, i) for i in range(1, options['items'] + 1)]
+
+        start = time.perf_counter()
+        index = MatchIndex.build(documents)
+        self.stdout.write('Built %d items, %d terms in %.2fs' % (len(index), len(index.vocabulary), time.perf_counter() - start))
+
+        queries = [item_terms(*make_item(rng, 0)[1:]) for i in range(options['queries'])]
+        self.report('Queries', [self.time(index.search, terms, options['limit']) for terms in queries])
+
+        next_id = options['items'] + 1
+        timings = []
+        for i in range(options['updates']):
+            if i % 2:
+                timings.append(self.time(index.remove, rng.randint(1, options['items'])))
+            else:
+                timings.append(self.time(index.add, *make_item(rng, next_id)))
+                next_id += 1
+        self.report('Updates (add/claim)', timings)
+
+        # Queries with changes waiting to be merged into the matrices
+        self.report('Queries after updates', [self.time(index.search, terms, options['limit']) for terms in queries])
+
+    def time(self, function, *args):
+        start = time.perf_counter()
+        function(*args)
+        return (time.perf_counter() - start) * 1000
+
+    def report(self, name, timings):
+        timings.sort()
+        self.stdout.write('%-24s p50 %8.3f ms  p95 %8.3f ms  max %8.3f ms' % (
+            name, timings[len(timings) // 2], timings[int(len(timings) * 0.95)], timings[-1],
+        ))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from items.ingestion import process_stale_images
+
+
+class Command(BaseCommand):
+    help = (
+        'Process item photos still pending some time after upload, e.g. because the web process that '
+        'had them in its image pool restarted. Run it periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=float, default=10, help='Minutes since upload before a pending photo is processed again.')
+
+    def handle(self, *args, **options):
+        count = process_stale_images(timedelta(minutes=options['min_age']))
+        self.stdout.write('Processed %d pending photos' % count)
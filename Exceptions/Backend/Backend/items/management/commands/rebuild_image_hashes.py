@@ -0,0 +1,35 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from items.models import ItemImage
+from items.phash import hash_files
+from items.similarity import store_hashes
+
+
+class Command(BaseCommand):
+    help = 'Compute the perceptual hashes of item photos that have none (or of all of them) in a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rehash every photo, not just the ones without a hash.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=max(settings.IMAGE_WORKERS, 1))
+
+    def handle(self, *args, **options):
+        images = ItemImage.objects.order_by('id')
+        if not options['all']:
+            images = images.filter(phash__isnull=True)
+
+        rows = list(images.values_list('id', 'item_id', 'image'))
+        storage = ItemImage._meta.get_field('image').storage
+        batches = [rows[i:i + options['batch_size']] for i in range(0, len(rows), options['batch_size'])]
+
+        hashed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn')) as pool:
+            paths = ([storage.path(name) for image_id, item_id, name in batch] for batch in batches)
+            for batch, hashes in zip(batches, pool.map(hash_files, paths)):
+                hashed += store_hashes([(image_id, item_id) for image_id, item_id, name in batch], hashes)
+
+        self.stdout.write('Hashed %d of %d photos; the others are missing or not images' % (hashed, len(rows)))
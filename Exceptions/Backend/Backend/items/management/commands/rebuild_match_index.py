@@ -0,0 +1,22 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from items.matching import build_match_index
+
+
+class Command(BaseCommand):
+    help = 'Build the lost-to-found match index from the unclaimed items and save it where web processes load it from.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.ITEM_MATCH_INDEX_PATH)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        index = build_match_index()
+        index.save(options['path'])
+
+        self.stdout.write('Indexed %d items, %d terms in %.1fs to %s' % (
+            len(index), len(index.vocabulary), time.perf_counter() - start, options['path'],
+        ))
@@ -0,0 +1,301 @@
+"""
+Lost-to-found matching: a BM25 index over the unclaimed items' name, description and found location.
+
+The index lives in each process, in SciPy sparse matrices (rows are items, columns are terms).
+New and edited items go to a small pending list that is merged into the matrices every
+COMPACT_AT changes; claimed and deleted items are masked out until the next merge.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+
+from .models import Item
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset('a an and at by for from in into is it its of on or the to was were with'.split())
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# The item name counts this many times, it says more than the description
+NAME_WEIGHT = 2
+# Pending changes merged into the matrices at once
+COMPACT_AT = 500
+
+
+def tokenize(text):
+    return [term for term in TOKEN_RE.findall((text or '').lower()) if len(term) > 1 and term not in STOP_WORDS]
+
+
+def item_terms(item_name, description, found_location):
+    return tokenize(item_name) * NAME_WEIGHT + tokenize(description) + tokenize(found_location)
+
+
+class MatchIndex:
+    def __init__(self):
+        self.vocabulary = {} # term -> column
+        self.rows = {} # item id -> row
+        self.item_ids = np.zeros(0, dtype=np.int64) # row -> item id
+        self.lengths = np.zeros(0, dtype=np.float32) # row -> number of terms
+        self.active = np.zeros(0, dtype=bool) # False once the item is claimed, deleted or re-added
+        self.document_frequency = np.zeros(0, dtype=np.int64) # column -> active rows with the term
+        self.csr = sparse.csr_matrix((0, 0), dtype=np.float32) # term frequencies, for reading a row
+        self.impacts = self.csr.tocsc() # BM25 weight of each term in each row, for reading a term's postings
+        self.pending = [] # (columns, frequencies) of rows after the matrices, in row order
+        self.total_length = 0.0
+        self.count = 0
+        self.max_id = 0 # highest item id seen, for catch_up
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return self.count
+
+    def _columns(self, terms, grow):
+        counts = Counter(terms)
+        columns = []
+        frequencies = []
+        for term, frequency in counts.items():
+            column = self.vocabulary.get(term)
+            if column is None:
+                if not grow:
+                    continue
+                column = self.vocabulary[term] = len(self.vocabulary)
+            columns.append(column)
+            frequencies.append(frequency)
+
+        if len(self.vocabulary) > len(self.document_frequency):
+            self.document_frequency = np.concatenate([
+                self.document_frequency,
+                np.zeros(max(len(self.vocabulary) - len(self.document_frequency), 1024), dtype=np.int64),
+            ])
+
+        return np.array(columns, dtype=np.int64), np.array(frequencies, dtype=np.float32)
+
+    def _row_columns(self, row):
+        if row < self.csr.shape[0]:
+            return self.csr.indices[self.csr.indptr[row]:self.csr.indptr[row + 1]]
+        return self.pending[row - self.csr.shape[0]][0]
+
+    @classmethod
+    def build(cls, documents):
+        """Index (item id, item_name, description, found_location) tuples in one pass."""
+        index = cls()
+        data, indices, indptr, item_ids, lengths = [], [], [0], [], []
+
+        for item_id, item_name, description, found_location in documents:
+            columns, frequencies = index._columns(item_terms(item_name, description, found_location), grow=True)
+            indices.append(columns)
+            data.append(frequencies)
+            indptr.append(indptr[-1] + len(columns))
+            item_ids.append(item_id)
+            lengths.append(frequencies.sum())
+
+        shape = (len(item_ids), len(index.vocabulary))
+        index.csr = sparse.csr_matrix((
+            np.concatenate(data) if data else np.zeros(0, dtype=np.float32),
+            np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+            np.array(indptr, dtype=np.int64),
+        ), shape=shape)
+        index._set_rows(np.array(item_ids, dtype=np.int64), np.array(lengths, dtype=np.float32))
+        return index
+
+    def _norm(self, lengths):
+        return K1 * (1 - B + B * lengths / ((self.total_length / self.count) if self.count else 1))
+
+    def _set_rows(self, item_ids, lengths):
+        self.item_ids = item_ids
+        self.lengths = lengths
+        self.active = np.ones(len(item_ids), dtype=bool)
+        self.rows = {int(item_id): row for row, item_id in enumerate(item_ids)}
+        self.total_length = float(lengths.sum())
+        self.count = len(item_ids)
+        self.max_id = max(self.max_id, int(item_ids.max()) if len(item_ids) else 0)
+
+        document_frequency = np.bincount(self.csr.indices, minlength=len(self.vocabulary))
+        self.document_frequency = np.concatenate([document_frequency, np.zeros(1024, dtype=np.int64)])
+
+        # tf * (K1 + 1) / (tf + norm) per posting, so a query only multiplies by the idf. The average
+        # length drifts a little as items are added and removed; the next compaction brings it up to date.
+        self.impacts = self.csr.tocsc()
+        tf = self.impacts.data
+        self.impacts.data = (tf * (K1 + 1) / (tf + self._norm(self.lengths[self.impacts.indices]))).astype(np.float32)
+
+    def add(self, item_id, item_name, description, found_location):
+        with self.lock:
+            self.remove(item_id)
+
+            columns, frequencies = self._columns(item_terms(item_name, description, found_location), grow=True)
+            row = len(self.item_ids)
+            self.pending.append((columns, frequencies))
+            self.rows[item_id] = row
+            self.item_ids = np.append(self.item_ids, item_id)
+            self.lengths = np.append(self.lengths, frequencies.sum())
+            self.active = np.append(self.active, True)
+            self.document_frequency[columns] += 1
+            self.total_length += float(frequencies.sum())
+            self.count += 1
+            self.max_id = max(self.max_id, item_id)
+
+            if len(self.pending) >= COMPACT_AT:
+                self.compact()
+
+    def remove(self, item_id):
+        with self.lock:
+            row = self.rows.pop(item_id, None)
+            if row is None:
+                return
+
+            self.active[row] = False
+            self.document_frequency[self._row_columns(row)] -= 1
+            self.total_length -= float(self.lengths[row])
+            self.count -= 1
+
+    def compact(self):
+        """Merge the pending rows into the matrices and drop the inactive ones."""
+        with self.lock:
+            shape = (len(self.item_ids), len(self.vocabulary))
+            matrix = self.csr.copy()
+            matrix.resize((self.csr.shape[0], shape[1]))
+
+            if self.pending:
+                pending = sparse.csr_matrix((
+                    np.concatenate([frequencies for columns, frequencies in self.pending]),
+                    np.concatenate([columns for columns, frequencies in self.pending]),
+                    np.cumsum([0] + [len(columns) for columns, frequencies in self.pending]),
+                ), shape=(len(self.pending), shape[1]))
+                matrix = sparse.vstack([matrix, pending], format='csr')
+
+            keep = self.active
+            self.csr = matrix[keep]
+            self.pending = []
+            self._set_rows(self.item_ids[keep], self.lengths[keep])
+
+    def search(self, terms, limit, exclude=()):
+        """The limit best (item id, score) pairs for a query's terms, best first."""
+        with self.lock:
+            columns, frequencies = self._columns(terms, grow=False)
+            if not len(columns) or not self.count:
+                return []
+
+            document_frequency = self.document_frequency[columns]
+            idf = np.log(1 + (self.count - document_frequency + 0.5) / (document_frequency + 0.5))
+            scores = np.zeros(len(self.item_ids), dtype=np.float32)
+            offset = self.csr.shape[0]
+
+            # Terms first seen in pending rows have no column in the matrices yet
+            in_matrix = columns < self.impacts.shape[1]
+            if in_matrix.any():
+                scores[:offset] = self.impacts[:, columns[in_matrix]] @ idf[in_matrix]
+
+            if self.pending:
+                query = dict(zip(columns.tolist(), idf.tolist()))
+                norm = self._norm(self.lengths[offset:]).tolist()
+                for i, (row_columns, row_frequencies) in enumerate(self.pending):
+                    for column, tf in zip(row_columns.tolist(), row_frequencies.tolist()):
+                        if column in query:
+                            scores[offset + i] += query[column] * tf * (K1 + 1) / (tf + norm[i])
+
+            scores[~self.active] = 0
+            for item_id in exclude:
+                row = self.rows.get(item_id)
+                if row is not None:
+                    scores[row] = 0
+
+            candidates = np.flatnonzero(scores)
+            if len(candidates) > limit:
+                candidates = candidates[np.argpartition(scores[candidates], -limit)[-limit:]]
+            candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+            return [(int(self.item_ids[row]), float(scores[row])) for row in candidates]
+
+    def catch_up(self):
+        """Add unclaimed items created since the index was built, including by other processes."""
+        for item_id, item_name, description, found_location in (
+            Item.objects.filter(id__gt=self.max_id, is_claimed=False).order_by('id')
+            .values_list('id', 'item_name', 'description', 'found_location')
+        ):
+            self.add(item_id, item_name, description, found_location)
+
+    def save(self, path):
+        with self.lock:
+            self.compact()
+            tmp = path + '.tmp'
+            with open(tmp, 'wb') as f:
+                np.savez(
+                    f,
+                    data=self.csr.data, indices=self.csr.indices, indptr=self.csr.indptr, shape=np.array(self.csr.shape),
+                    item_ids=self.item_ids, lengths=self.lengths, max_id=np.array([self.max_id]),
+                    vocabulary=np.array([json.dumps(self.vocabulary)]),
+                )
+            os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with np.load(path) as saved:
+            index.vocabulary = json.loads(str(saved['vocabulary'][0]))
+            index.csr = sparse.csr_matrix((saved['data'], saved['indices'], saved['indptr']), shape=tuple(saved['shape']))
+            index.max_id = int(saved['max_id'][0])
+            index._set_rows(saved['item_ids'], saved['lengths'])
+        return index
+
+
+def build_match_index():
+    documents = (
+        Item.objects.filter(is_claimed=False).order_by('id')
+        .values_list('id', 'item_name', 'description', 'found_location').iterator(chunk_size=5000)
+    )
+    return MatchIndex.build(documents)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_match_index():
+    """This process's index: loaded from ITEM_MATCH_INDEX_PATH if rebuild_match_index wrote it, otherwise built."""
+    global _index
+
+    with _index_lock:
+        if _index is None:
+            path = settings.ITEM_MATCH_INDEX_PATH
+            _index = MatchIndex.load(path) if path and os.path.exists(path) else build_match_index()
+        _index.catch_up()
+
+    return _index
+
+
+def update_match_index(item):
+    """Keep a loaded index in step with a saved item. A process without one builds it when first asked."""
+    if _index is None:
+        return
+
+    if item.is_claimed:
+        _index.remove(item.id)
+    else:
+        _index.add(item.id, item.item_name, item.description, item.found_location)
+
+
+def remove_from_match_index(item_id):
+    if _index is not None:
+        _index.remove(item_id)
+
+
+def find_matches(item, limit=10):
+    """The unclaimed items that best match item's text, as (item, score) pairs, best first."""
+    index = get_match_index()
+    # Some candidates may have been claimed by another process since they were indexed
+    results = index.search(item_terms(item.item_name, item.description, item.found_location), limit * 2, exclude={item.id})
+
+    items = Item.objects.filter(id__in=[item_id for item_id, score in results], is_claimed=False).prefetch_related('images').in_bulk()
+    for item_id, score in results:
+        if item_id not in items:
+            index.remove(item_id)
+
+    return [(items[item_id], score) for item_id, score in results if item_id in items][:limit]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0002_alter_item_description_alter_item_found_location_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['found_date', 'id'], name='item_found_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['is_claimed', 'found_date', 'id'], name='item_claimed_found_date_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0003_item_found_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemimage',
+            name='hashed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='itemimage',
+            name='phash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
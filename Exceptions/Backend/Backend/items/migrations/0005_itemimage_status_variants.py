@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0004_itemimage_phash'),
+    ]
+
+    operations = [
+        # Images uploaded before the pipeline are served as they are
+        migrations.AddField(
+            model_name='itemimage',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='itemimage',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='itemimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0005_itemimage_status_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='itemimage',
+            index=models.Index(fields=['status', 'uploaded_at'], name='itemimage_status_uploaded_idx'),
+        ),
+    ]
@@ -11,6 +11,13 @@ class Item(models.Model):
     is_claimed = models.BooleanField(default=False)
     claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="items_claimed")
     claimed_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Cursor pagination of the item lists seeks on (found_date, id)
+        indexes = [
+            models.Index(fields=['found_date', 'id'], name='item_found_date_id_idx'),
+            models.Index(fields=['is_claimed', 'found_date', 'id'], name='item_claimed_found_date_idx'),
+        ]
     
     def __str__(self):
         return self.item_name
@@ -20,9 +27,32 @@ class ItemImage(models.Model):
     """
     Model to store multiple images for each item.
     """
+    # pending: the uploaded original, waiting for the image workers; ready: image is the large WebP variant;
+    # failed: the original could not be processed and is kept as it was
+    PENDING = 'pending'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Processing'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    )
+
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to="item_images/")  # Store images in the media directory
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Perceptual hash of the photo (items/phash.py), filled in by the hashing workers after upload
+    phash = models.BigIntegerField(null=True, blank=True)
+    hashed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    variants = models.JSONField(default=dict, blank=True)  # variant name -> media path (items/imaging.py VARIANTS)
+
+    class Meta:
+        # process_pending_images looks for rows still pending some time after upload
+        indexes = [
+            models.Index(fields=['status', 'uploaded_at'], name='itemimage_status_uploaded_idx'),
+        ]
 
     def __str__(self):
         return f"Image for {self.item.item_name}"
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ItemCursorPagination(CursorPagination):
+    """
+    Cursor pagination for item lists, newest found first.
+    Items found on the same day are kept in a stable order by id.
+    """
+    ordering = ('-found_date', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
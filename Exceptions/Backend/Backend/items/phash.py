@@ -0,0 +1,47 @@
+"""
+Perceptual hashes of item photos. Nothing here imports Django, so the hashing worker
+processes start quickly and share no database connections with the web process.
+"""
+import numpy as np
+from PIL import Image, ImageOps
+from scipy.fft import dctn
+
+HASH_SIZE = 8
+# The DCT runs on a HASH_SIZE * HIGHFREQ_FACTOR square thumbnail
+HIGHFREQ_FACTOR = 4
+MASK = (1 << HASH_SIZE * HASH_SIZE) - 1
+
+
+def phash(fp):
+    """64-bit DCT hash of an image (path or file object), as a signed integer to fit a BigIntegerField."""
+    size = HASH_SIZE * HIGHFREQ_FACTOR
+
+    with Image.open(fp) as image:
+        # JPEGs are decoded straight to a small greyscale image instead of at full size
+        image.draft('L', (size * 2, size * 2))
+        return hash_image(ImageOps.exif_transpose(image))
+
+
+def hash_image(image):
+    """phash() of an already opened and oriented image."""
+    size = HASH_SIZE * HIGHFREQ_FACTOR
+    pixels = np.asarray(image.convert('L').resize((size, size), Image.LANCZOS), dtype=np.float64)
+
+    low = dctn(pixels, type=2)[:HASH_SIZE, :HASH_SIZE]
+    bits = (low > np.median(low)).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big', signed=True)
+
+
+def hamming(a, b):
+    return bin((a ^ b) & MASK).count('1')
+
+
+def hash_files(paths):
+    """Hashes of image files, None for files that are missing or not images. Runs in the worker processes."""
+    hashes = []
+    for path in paths:
+        try:
+            hashes.append(phash(path))
+        except (OSError, ValueError, Image.DecompressionBombError):
+            hashes.append(None)
+    return hashes
@@ -1,10 +1,18 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from items.models import Item, ItemImage
+from items.ingestion import save_uploads
 
 class ItemImageSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = ItemImage
-        fields = ['id', 'image', 'uploaded_at']
+        fields = ['id', 'image', 'uploaded_at', 'status', 'variants']
+
+    def get_variants(self, item_image):
+        return _variant_urls(item_image, self.context.get('request'))
 
 class ItemSerializer(serializers.ModelSerializer):
     images = ItemImageSerializer(many=True, read_only=True)  # Include images in response
@@ -25,8 +33,65 @@ class ItemSerializer(serializers.ModelSerializer):
         uploaded_images = validated_data.pop('uploaded_images', [])
         item = Item.objects.create(**validated_data)
 
-        for image in uploaded_images:
-            ItemImage.objects.create(item=item, image=image)
+        # Resized, re-encoded and hashed in the background; the response shows them as pending
+        save_uploads(item, uploaded_images)
 
         return item
 
+
+def _variant_urls(item_image, request):
+    storage = item_image.image.storage
+    urls = {name: storage.url(path) for name, path in item_image.variants.items()}
+    if request is not None:
+        urls = {name: request.build_absolute_uri(url) for name, url in urls.items()}
+    return urls
+
+
+def _date(value):
+    return value.isoformat() if value else None
+
+
+def _datetime(value):
+    # As DRF's DateTimeField renders it: in the current timezone, with Z for UTC
+    if not value:
+        return None
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def serialize_items(items, request=None):
+    """
+    Read-only list representation of items, the same as ItemSerializer(items, many=True).data
+    without building DRF fields for every item and image. The items' images should be prefetched.
+    """
+    build_url = request.build_absolute_uri if request is not None else None
+    data = []
+
+    for item in items:
+        images = []
+        for item_image in item.images.all():
+            url = item_image.image.url if item_image.image else None
+            if url and build_url:
+                url = build_url(url)
+            images.append({
+                'id': item_image.id,
+                'image': url,
+                'uploaded_at': _datetime(item_image.uploaded_at),
+                'status': item_image.status,
+                'variants': _variant_urls(item_image, request),
+            })
+
+        data.append({
+            'item_name': item.item_name,
+            'description': item.description,
+            'found_location': item.found_location,
+            'found_date': _date(item.found_date),
+            'is_claimed': item.is_claimed,
+            'images': images,
+        })
+
+    return data
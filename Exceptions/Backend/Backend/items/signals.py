@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .matching import remove_from_match_index, update_match_index
+from .models import Item, ItemImage
+from .similarity import remove_from_image_index
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, **kwargs):
+    # New, edited and claimed items
+    update_match_index(instance)
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, **kwargs):
+    remove_from_match_index(instance.id)
+
+
+@receiver(post_delete, sender=ItemImage)
+def item_image_deleted(sender, instance, **kwargs):
+    remove_from_image_index(instance.id)
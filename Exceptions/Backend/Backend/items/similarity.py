@@ -0,0 +1,167 @@
+"""
+"Looks like this photo": a BK-tree over the perceptual hashes of ItemImage files (computed by the
+image workers, see items/ingestion.py) that finds the hashes within a Hamming distance without
+comparing against every image.
+"""
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Item, ItemImage
+from .phash import hamming
+
+
+class BKTree:
+    """Metric tree over 64-bit hashes. Nodes are [hash, keys, {distance: child}]."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, value, key):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [key], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [key], {}]
+                return
+            node = child
+
+    def remove(self, value, key):
+        """Drop key from the node for value. The node stays, as the subtrees below it hang off its hash."""
+        node = self.root
+        while node is not None:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                if key in node[1]:
+                    node[1].remove(key)
+                    self.size -= 1
+                return
+            node = node[2].get(distance)
+
+    def search(self, value, radius):
+        """(key, distance) for every hash within radius of value."""
+        results = []
+        stack = [self.root] if self.root is not None else []
+
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                results += [(key, distance) for key in node[1]]
+            # The triangle inequality rules out every other subtree
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+
+        return results
+
+
+class ImageIndex:
+    def __init__(self):
+        self.tree = BKTree()
+        self.hashes = {} # image id -> (hash, item id) in the tree
+        self.hashed_since = None # newest hashed_at seen, for catch_up
+        self.lock = threading.Lock()
+
+    def add(self, image_id, item_id, value, hashed_at):
+        """Add an image's hash, replacing the one indexed before if it was rehashed."""
+        with self.lock:
+            indexed = self.hashes.get(image_id)
+            if indexed != (value, item_id):
+                if indexed is not None:
+                    self.tree.remove(indexed[0], (image_id, indexed[1]))
+                self.tree.add(value, (image_id, item_id))
+                self.hashes[image_id] = (value, item_id)
+            if self.hashed_since is None or hashed_at > self.hashed_since:
+                self.hashed_since = hashed_at
+
+    def remove(self, image_id):
+        with self.lock:
+            indexed = self.hashes.pop(image_id, None)
+            if indexed is not None:
+                self.tree.remove(indexed[0], (image_id, indexed[1]))
+
+    def catch_up(self):
+        """Add images hashed since the last call, including by other processes and the rebuild command."""
+        images = ItemImage.objects.filter(phash__isnull=False)
+        if self.hashed_since is not None:
+            images = images.filter(hashed_at__gte=self.hashed_since)
+
+        for image_id, item_id, value, hashed_at in images.values_list('id', 'item_id', 'phash', 'hashed_at').iterator(chunk_size=5000):
+            self.add(image_id, item_id, value, hashed_at)
+
+    def search(self, value, radius):
+        with self.lock:
+            return self.tree.search(value, radius)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_image_index():
+    global _index
+
+    with _index_lock:
+        if _index is None:
+            _index = ImageIndex()
+        _index.catch_up()
+
+    return _index
+
+
+def find_similar_items(value, limit=20, radius=None):
+    """Unclaimed items with a photo within radius of the hash value, as (item, distance) pairs, closest first."""
+    radius = settings.IMAGE_MATCH_DISTANCE if radius is None else radius
+    index = get_image_index()
+    results = index.search(value, radius)
+
+    # Rehashed images were replaced by catch_up; images deleted by another process are dropped here
+    existing = set(ItemImage.objects.filter(id__in=[image_id for (image_id, item_id), distance in results]).values_list('id', flat=True))
+    closest = {}
+    for (image_id, item_id), distance in results:
+        if image_id not in existing:
+            index.remove(image_id)
+            continue
+        closest[item_id] = min(distance, closest.get(item_id, distance))
+
+    items = Item.objects.filter(id__in=closest, is_claimed=False).prefetch_related('images').in_bulk()
+    ranked = sorted((closest[item_id], item_id) for item_id in items)
+    return [(items[item_id], distance) for distance, item_id in ranked[:limit]]
+
+
+def index_hashes(hashed, hashed_at):
+    """Add (image id, item id, hash) triples just saved to a loaded index."""
+    if _index is not None:
+        for image_id, item_id, value in hashed:
+            _index.add(image_id, item_id, value, hashed_at)
+
+
+def remove_from_image_index(image_id):
+    if _index is not None:
+        _index.remove(image_id)
+
+
+def store_hashes(images, hashes):
+    """Save the hashes of (image id, item id) pairs and add them to a loaded index."""
+    now = timezone.now()
+    hashed = [(image_id, item_id, value) for (image_id, item_id), value in zip(images, hashes) if value is not None]
+
+    ItemImage.objects.bulk_update([ItemImage(id=image_id, phash=value, hashed_at=now) for image_id, item_id, value in hashed], ['phash', 'hashed_at'])
+    index_hashes(hashed, now)
+
+    return len(hashed)
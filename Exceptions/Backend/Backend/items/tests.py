@@ -1,3 +1,338 @@
-from django.test import TestCase
+import io
+import random
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db import transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from PIL import Image, ImageDraw
+from rest_framework.test import APIClient
+
+from users.models import User
+from . import ingestion, matching, similarity
+from .ingestion import save_uploads
+from .matching import MatchIndex, item_terms
+from .models import Item, ItemImage
+from .phash import hamming, phash
+from .similarity import BKTree, find_similar_items, store_hashes
+from .renderers import ORJSONRenderer
+from .serializers import ItemSerializer, serialize_items
+
+
+class ItemListTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', 'student@example.com', 'password', unique_id='S001')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_items(self, count, **kwargs):
+        for i in range(count):
+            item = Item.objects.create(item_name='Item %d' % i, found_date=date(2025, 3, 1) + timedelta(days=i % 3), posted_by=self.user, **kwargs)
+            ItemImage.objects.bulk_create([ItemImage(item=item, image='item_images/%d-%d.jpg' % (item.id, n)) for n in range(2)])
+
+    def page_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response.data
+
+    def test_query_count_is_constant_per_page(self):
+        for url in ('/api/v1/items/', '/api/v1/items/unclaimed/'):
+            Item.objects.all().delete()
+            self.create_items(3)
+            few, data = self.page_queries(url)
+            self.assertEqual(len(data['results']), 3)
+
+            self.create_items(60)
+            many, data = self.page_queries(url)
+            self.assertEqual(len(data['results']), 50)
+            self.assertEqual(len(data['results'][0]['images']), 2)
+
+            self.assertEqual(few, many)
+
+    def test_cursor_walks_every_item_once(self):
+        self.create_items(25)
+
+        names = []
+        url = '/api/v1/items/?page_size=10'
+        while url:
+            response = self.client.get(url)
+            names += [item['item_name'] for item in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(len(names), 25)
+        self.assertEqual(len(set(names)), 25)
+
+    def test_list_json_matches_item_serializer(self):
+        self.create_items(5)
+        # DRF escapes the JavaScript line terminators, orjson doesn't by itself
+        Item.objects.filter(id=Item.objects.first().id).update(description='Line\u2028separator, paragraph\u2029separator, caf\u00e9')
+        request = RequestFactory().get('/api/v1/items/')
+        items = Item.objects.prefetch_related('images')
+
+        self.assertEqual(
+            ORJSONRenderer().render(serialize_items(items, request)),
+            JSONRenderer().render(ItemSerializer(items, many=True, context={'request': request}).data),
+        )
+
+
+class MatchIndexTestCase(TestCase):
+    def setUp(self):
+        matching._index = None
+        self.addCleanup(setattr, matching, '_index', None)
+
+    def test_ranks_by_text_and_follows_updates(self):
+        index = MatchIndex.build([
+            (1, 'Black umbrella', 'Wooden handle', 'Library'),
+            (2, 'Blue water bottle', 'Milton steel', 'Canteen'),
+            (3, 'Black wallet', 'Leather, two cards', 'Library'),
+        ])
+
+        results = index.search(item_terms('Lost black umbrella', 'wooden handle', ''), 10)
+        self.assertEqual([item_id for item_id, score in results], [1, 3])
+
+        index.add(4, 'Umbrella', 'Black with wooden handle', 'Library')
+        index.remove(1)
+        results = index.search(item_terms('Lost black umbrella', 'wooden handle', ''), 10)
+        self.assertEqual(results[0][0], 4)
+        self.assertNotIn(1, [item_id for item_id, score in results])
+
+        # Merging the pending rows does not change the ranking
+        index.compact()
+        self.assertEqual([item_id for item_id, score in index.search(item_terms('Lost black umbrella', 'wooden handle', ''), 10)], [item_id for item_id, score in results])
+
+    def test_matches_endpoint_skips_claimed_items(self):
+        user = User.objects.create_user('student', 'student@example.com', 'password', unique_id='S001')
+        lost = Item.objects.create(item_name='Black umbrella', description='Wooden handle', found_date=date(2025, 3, 1), posted_by=user)
+        found = Item.objects.create(item_name='Umbrella', description='Black, wooden handle', found_location='Library', found_date=date(2025, 3, 2), posted_by=user)
+        other = Item.objects.create(item_name='Black umbrella', description='Folding', found_date=date(2025, 3, 2), posted_by=user)
+        Item.objects.create(item_name='Water bottle', found_date=date(2025, 3, 2), posted_by=user)
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/v1/items/%d/matches/' % lost.id)
+        self.assertEqual([result['id'] for result in response.data['results']], [found.id, other.id])
+
+        # Claimed through the API view's save(), which updates the loaded index
+        found.is_claimed = True
+        found.save()
+        response = client.get('/api/v1/items/%d/matches/' % lost.id)
+        self.assertEqual([result['id'] for result in response.data['results']], [other.id])
+
+
+def make_photo(seed, size=(400, 300), brightness=0):
+    # Random rectangles: photos with the same seed look alike at any size, different seeds don't
+    rng = random.Random(seed)
+    image = Image.new('RGB', (400, 300), (128, 128, 128))
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        x, y = rng.randint(0, 400), rng.randint(0, 300)
+        draw.rectangle([x, y, x + rng.randint(20, 200), y + rng.randint(20, 200)], fill=tuple(rng.randint(0, 255) for c in range(3)))
+    image = image.resize(size).point(lambda value: min(255, value + brightness))
+    f = io.BytesIO()
+    image.save(f, 'JPEG', quality=85)
+    f.seek(0)
+    return f
+
+
+@override_settings(IMAGE_WORKERS=0)
+class PhotoSearchTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        similarity._index = None
+        self.addCleanup(setattr, similarity, '_index', None)
+
+    def test_hash_survives_resizing_and_brightness(self):
+        original = phash(make_photo(1))
+
+        self.assertLessEqual(hamming(original, phash(make_photo(1, size=(800, 600), brightness=20))), 6)
+        self.assertGreater(hamming(original, phash(make_photo(2))), 16)
+
+    def test_bk_tree_finds_what_a_scan_finds(self):
+        rng = random.Random(1)
+        values = [rng.getrandbits(64) - (1 << 63) for i in range(2000)]
+        tree = BKTree()
+        for key, value in enumerate(values):
+            tree.add(value, key)
+
+        for query in values[:20]:
+            expected = sorted((key, hamming(query, value)) for key, value in enumerate(values) if hamming(query, value) <= 12)
+            self.assertEqual(sorted(tree.search(query, 12)), expected)
+
+        for key in range(0, 2000, 2):
+            tree.remove(values[key], key)
+        self.assertEqual(len(tree), 1000)
+        for query in values[:20]:
+            expected = sorted((key, hamming(query, value)) for key, value in enumerate(values) if key % 2 and hamming(query, value) <= 12)
+            self.assertEqual(sorted(tree.search(query, 12)), expected)
+
+    def test_rehashed_and_deleted_images_leave_the_index(self):
+        user = User.objects.create_user('student', 'student@example.com', 'password', unique_id='S001')
+        item = Item.objects.create(item_name='Umbrella', found_date=date(2025, 3, 1), posted_by=user)
+        image, other = ItemImage.objects.bulk_create([ItemImage(item=item, image='item_images/%d.jpg' % n) for n in range(2)])
+        old, new = phash(make_photo(1)), phash(make_photo(2))
+
+        store_hashes([(image.id, item.id)], [old])
+        self.assertEqual([match.id for match, distance in find_similar_items(old)], [item.id])
+
+        # Rehashed by another process, as rebuild_image_hashes --all does
+        ItemImage.objects.filter(id=image.id).update(phash=new, hashed_at=timezone.now())
+        self.assertEqual(find_similar_items(old), [])
+        self.assertEqual([match.id for match, distance in find_similar_items(new)], [item.id])
+        self.assertEqual(len(similarity.get_image_index().tree), 1)
+
+        image.delete()
+        self.assertEqual(find_similar_items(new), [])
+
+        # Deleted by another process, so this one got no signal
+        store_hashes([(other.id, item.id)], [new])
+        with mock.patch('items.signals.remove_from_image_index'):
+            other.delete()
+        self.assertEqual(find_similar_items(new), [])
+        self.assertEqual(len(similarity.get_image_index().tree), 0)
+
+    def test_uploaded_photos_are_searchable(self):
+        user = User.objects.create_user('student', 'student@example.com', 'password', unique_id='S001')
+        request = RequestFactory().post('/api/v1/items/lost/')
+        request.user = user
+
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer = ItemSerializer(data={
+                'item_name': 'Umbrella', 'found_date': '2025-03-01', 'is_claimed': False,
+                'uploaded_images': [SimpleUploadedFile('umbrella.jpg', make_photo(1).read(), content_type='image/jpeg')],
+            }, context={'request': request})
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            item = serializer.save()
+
+        item_image = item.images.get()
+        self.assertEqual(item_image.status, ItemImage.READY)
+        self.assertIsNotNone(item_image.phash)
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/v1/items/similar/', {'image': SimpleUploadedFile('photo.jpg', make_photo(1, size=(640, 480)).read())}, format='multipart')
+        self.assertEqual([result['id'] for result in response.data['results']], [item.id])
+
+        response = client.post('/api/v1/items/similar/', {'image': SimpleUploadedFile('other.jpg', make_photo(2).read())}, format='multipart')
+        self.assertEqual(response.data['results'], [])
+
+    def test_uploads_are_resized_and_stripped(self):
+        user = User.objects.create_user('student', 'student@example.com', 'password', unique_id='S001')
+        item = Item.objects.create(item_name='Umbrella', found_date=date(2025, 3, 1), posted_by=user)
+
+        photo = Image.new('RGB', (4000, 3000), (200, 10, 10))
+        exif = Image.Exif()
+        exif[0x0112] = 6 # Orientation: rotated 90 degrees
+        exif[0x8825] = {2: (12.0, 58.0, 20.0)} # GPS latitude
+        f = io.BytesIO()
+        photo.save(f, 'JPEG', exif=exif)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            [pending] = save_uploads(item, [SimpleUploadedFile('photo.jpg', f.getvalue(), content_type='image/jpeg')])
+        self.assertEqual(pending.status, ItemImage.PENDING)
+
+        item_image = ItemImage.objects.get()
+        self.assertEqual(item_image.status, ItemImage.READY)
+        self.assertEqual(sorted(item_image.variants), ['large', 'medium', 'thumb'])
+        self.assertEqual(item_image.image.name, item_image.variants['large'])
+        self.assertFalse(item_image.image.storage.exists(pending.image.name))
+
+        with Image.open(item_image.image.path) as large:
+            self.assertEqual((large.format, large.size), ('WEBP', (1200, 1600)))
+            self.assertNotIn('exif', large.info)
+        with Image.open(item_image.image.storage.path(item_image.variants['thumb'])) as thumb:
+            self.assertEqual(thumb.size, (240, 320))
+
+
+@override_settings(IMAGE_WORKERS=1)
+class ImageWorkerTestCase(TransactionTestCase):
+    """The default path: a spawned worker process, with the result written from the pool's callback thread."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        similarity._index = None
+        self.addCleanup(setattr, similarity, '_index', None)
+        self.addCleanup(self.shutdown_pool)
+
+        user = User.objects.create_user('student', 'student@example.com', 'password', unique_id='S001')
+        self.item = Item.objects.create(item_name='Umbrella', found_date=date(2025, 3, 1), posted_by=user)
+
+    def shutdown_pool(self):
+        if ingestion._pool is not None:
+            ingestion._pool.shutdown()
+            ingestion._pool = None
+
+    def upload(self, name, data):
+        with transaction.atomic():
+            [image] = save_uploads(self.item, [SimpleUploadedFile(name, data, content_type='image/jpeg')])
+        return image
+
+    def wait_for(self, image_id, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            image = ItemImage.objects.get(id=image_id)
+            if image.status != ItemImage.PENDING:
+                return image
+            time.sleep(0.1)
+        self.fail('Image %d was not processed within %ds' % (image_id, timeout))
+
+    def test_worker_saves_variants_and_hash(self):
+        pending = self.upload('umbrella.jpg', make_photo(1, size=(2000, 1500)).read())
+        image = self.wait_for(pending.id)
+
+        self.assertEqual(image.status, ItemImage.READY)
+        self.assertEqual(image.phash, phash(make_photo(1, size=(2000, 1500))))
+        self.assertIsNotNone(image.hashed_at)
+        self.assertFalse(image.image.storage.exists(pending.image.name))
+        with Image.open(image.image.storage.path(image.variants['thumb'])) as thumb:
+            self.assertEqual(thumb.size, (320, 240))
+
+        self.assertEqual([match.id for match, distance in similarity.find_similar_items(image.phash)], [self.item.id])
+
+    def test_worker_marks_broken_files_failed(self):
+        with self.assertLogs('items.ingestion', 'ERROR'):
+            pending = self.upload('broken.jpg', b'not an image')
+            image = self.wait_for(pending.id)
+
+        self.assertEqual(image.status, ItemImage.FAILED)
+        self.assertIsNone(image.phash)
+        # The original is kept for a look or a retry
+        self.assertTrue(image.image.storage.exists(pending.image.name))
+
+    def test_lost_pending_images_are_processed_again(self):
+        # As if the web process stopped before its pool got to them
+        with mock.patch.object(ingestion, 'process_images'):
+            stale = self.upload('umbrella.jpg', make_photo(1).read())
+            recent = self.upload('bag.jpg', make_photo(2).read())
+        ItemImage.objects.filter(id=stale.id).update(uploaded_at=timezone.now() - timedelta(minutes=30))
+
+        out = io.StringIO()
+        call_command('process_pending_images', stdout=out)
+        self.assertIn('Processed 1 pending photos', out.getvalue())
+
+        image = ItemImage.objects.get(id=stale.id)
+        self.assertEqual(image.status, ItemImage.READY)
+        self.assertFalse(image.image.storage.exists(stale.image.name))
+        self.assertEqual(ItemImage.objects.get(id=recent.id).status, ItemImage.PENDING)
@@ -1,10 +1,19 @@
+import time
+
 from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import BrowsableAPIRenderer
+from .matching import find_matches
 from .models import Item
-from .serializers import ItemSerializer
+from .pagination import ItemCursorPagination
+from .phash import phash
+from .renderers import ORJSONRenderer
+from .serializers import ItemSerializer, serialize_items
+from .similarity import find_similar_items
 from users.models import User 
 
 class LostItemCreateAPIView(APIView):
@@ -51,23 +60,40 @@ class FoundItemCreateAPIView(APIView):
             return Response({"message": "Found item submitted successfully!", "item": serializer.data}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class ItemListAPIView(generics.ListAPIView):
+class ItemListMixin:
+    """
+    Renders item lists with serialize_items and orjson instead of ItemSerializer;
+    the JSON is the same, the per-field DRF machinery is skipped.
+    """
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(serialize_items(queryset, request))
+        return self.get_paginated_response(serialize_items(page, request))
+
+class ItemListAPIView(ItemListMixin, generics.ListAPIView):
     """
-    API to fetch all items.
+    API to fetch all items, one page at a time.
     """
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = Item.objects.all()
+    # Images for the whole page in one query instead of one per item
+    queryset = Item.objects.select_related('posted_by', 'claimed_by').prefetch_related('images')
     serializer_class = ItemSerializer
+    pagination_class = ItemCursorPagination
 
-class NonApprovedItemListAPIView(generics.ListAPIView):
+class NonApprovedItemListAPIView(ItemListMixin, generics.ListAPIView):
     """
-    API to fetch only non-approved (unclaimed) items.
+    API to fetch only non-approved (unclaimed) items, one page at a time.
     """
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = Item.objects.filter(is_claimed=False)  # Fetch only unclaimed items
+    queryset = Item.objects.filter(is_claimed=False).select_related('posted_by', 'claimed_by').prefetch_related('images')  # Fetch only unclaimed items
     serializer_class = ItemSerializer
+    pagination_class = ItemCursorPagination
 
 class ItemDetailAPIView(generics.RetrieveAPIView):
     """
@@ -85,4 +111,65 @@ class ItemDetailAPIView(generics.RetrieveAPIView):
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Item.DoesNotExist:
             return Response({"message": "Item not found."}, status=status.HTTP_404_NOT_FOUND)
-        
+
+
+class ItemMatchesAPIView(APIView):
+    """
+    API to fetch the unclaimed items whose name, description and location best match an item's, best first.
+    """
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+    max_limit = 50
+
+    def get(self, request, pk):
+        try:
+            item = Item.objects.get(id=pk)
+        except Item.DoesNotExist:
+            return Response({"message": "Item not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), self.max_limit)
+        except ValueError:
+            return Response({"limit": "A number is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        start = time.perf_counter()
+        matches = find_matches(item, limit)
+        took_ms = (time.perf_counter() - start) * 1000
+
+        results = serialize_items([match for match, score in matches], request)
+        for (match, score), data in zip(matches, results):
+            data['id'] = match.id
+            data['score'] = round(score, 4)
+
+        return Response({"item": item.id, "results": results, "took_ms": round(took_ms, 2)})
+
+
+class SimilarItemsAPIView(APIView):
+    """
+    API to find the unclaimed items with a photo that looks like an uploaded one, closest first.
+    """
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+
+    def post(self, request):
+        image = request.FILES.get('image')
+        if image is None:
+            return Response({"image": "A photo is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            value = phash(image)
+        except (OSError, ValueError):
+            return Response({"image": "The file is not an image."}, status=status.HTTP_400_BAD_REQUEST)
+
+        matches = find_similar_items(value)
+
+        results = serialize_items([match for match, distance in matches], request)
+        for (match, distance), data in zip(matches, results):
+            data['id'] = match.id
+            data['distance'] = distance
+
+        return Response({"results": results})
+
@@ -152,6 +152,27 @@ AUTH_USER_MODEL = 'users.User'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Written by `manage.py rebuild_match_index`; without it each process builds the match index from the database
+ITEM_MATCH_INDEX_PATH = os.path.join(BASE_DIR, 'match_index.npz')
+
+# Processes resizing, re-encoding and hashing uploaded photos (items/ingestion.py); 0 processes them in the request
+IMAGE_WORKERS = 2
+# Uploads bigger than this are streamed to a temporary file instead of held in memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 512 * 1024
+# Largest Hamming distance (out of 64 bits) between photo hashes that still counts as a match
+IMAGE_MATCH_DISTANCE = 10
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+# Rendered item QR codes are cached this long (api/qrcodes.py); they only change with the claim URL
+QR_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+# Processes rendering the codes of a QR sheet; 0 renders them in the request
+QR_WORKERS = 2
+
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5174",
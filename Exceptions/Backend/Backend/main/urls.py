@@ -29,7 +29,9 @@ from items.views import (
     FoundItemCreateAPIView,
     ItemListAPIView,
     NonApprovedItemListAPIView,
-    ItemDetailAPIView
+    ItemDetailAPIView,
+    ItemMatchesAPIView,
+    SimilarItemsAPIView,
 )
 from .views import api_root
 
@@ -51,7 +53,9 @@ urlpatterns = [
     path('api/v1/items/unclaimed/', NonApprovedItemListAPIView.as_view(), name='non-approved-item-list'),
     path('api/v1/items/lost/', LostItemCreateAPIView.as_view(), name='lost-item-create'),
     path('api/v1/items/found/', FoundItemCreateAPIView.as_view(), name='found-item-create'),
+    path('api/v1/items/similar/', SimilarItemsAPIView.as_view(), name='item-similar'),
     path('api/v1/items/<int:pk>/', ItemDetailAPIView.as_view(), name='item-detail'),
+    path('api/v1/items/<int:pk>/matches/', ItemMatchesAPIView.as_view(), name='item-matches'),
 ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
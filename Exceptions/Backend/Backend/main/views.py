@@ -52,6 +52,10 @@ def api_root(request):
             'create_lost': api_urls.get('lost-item-create', {}),
             'create_found': api_urls.get('found-item-create', {}),
             'item_detail': api_urls.get('item-detail', {}),
+            'item_matches': api_urls.get('item-matches', {}),
+            'item_similar': api_urls.get('item-similar', {}),
+            'item_qr': api_urls.get('generate-item-qr', {}),
+            'qr_sheet': api_urls.get('generate-qr-sheet', {}),
         },
         'users': {
             'profile': api_urls.get('user-profile', {}),
@@ -72,6 +76,10 @@ def api_root(request):
             'create_lost': f"{request.build_absolute_uri('/api/v1/items/lost/')}",
             'create_found': f"{request.build_absolute_uri('/api/v1/items/found/')}",
             'item_detail': f"{request.build_absolute_uri('/api/v1/items/1/')}",
+            'item_matches': f"{request.build_absolute_uri('/api/v1/items/1/matches/')}",
+            'item_similar': f"{request.build_absolute_uri('/api/v1/items/similar/')}",
+            'item_qr': f"{request.build_absolute_uri('/api/v1/generate-qr/1/')}",
+            'qr_sheet': f"{request.build_absolute_uri('/api/v1/generate-qr/sheet/?ids=1,2,3')}",
         },
         'users': {
             'profile': f"{request.build_absolute_uri('/api/v1/profile/')}",
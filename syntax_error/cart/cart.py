@@ -1,61 +1,136 @@
+import secrets
+from decimal import Decimal
+
 from django.conf import settings
 
 from product.models import Product
 
+from .stores import get_cart_store
+
+
+def get_user_cart_key(user):
+    return 'user:%d' % user.pk
+
+
+def get_cart_key(request, create=False):
+    """
+    'user:<id>' for signed in users; otherwise 'session:<token>', with the token kept in the session.
+    The token is only created when something is added, so browsing doesn't create a session row per visitor.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return get_user_cart_key(user)
+
+    token = request.session.get(settings.CART_SESSION_ID)
+
+    if isinstance(token, dict):
+        # Cart from before the cart store, with the lines in the session itself
+        legacy, token = token, None
+    else:
+        legacy = None
+
+    if token is None and (create or legacy):
+        token = secrets.token_hex(16)
+        request.session[settings.CART_SESSION_ID] = token
+
+    if legacy:
+        migrate_session_cart(legacy, 'session:%s' % token)
+
+    return 'session:%s' % token if token else None
+
+
+def migrate_session_cart(lines, key):
+    store = get_cart_store()
+    for product_id, item in lines.items():
+        store.increment(key, product_id, int(item['quantity']))
+
 
 class Cart(object):
     def __init__(self, request):
+        self.request = request
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
+        self.store = get_cart_store()
+        self.key = get_cart_key(request)
+
+    @property
+    def cart(self):
+        # Every Cart built for the same request shares one read of the store until the cart changes
+        memo = getattr(self.request, '_cart_lines', None)
 
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {}
+        if memo is None or memo[0] != self.key:
+            memo = (self.key, self.store.lines(self.key) if self.key else {})
+            self.request._cart_lines = memo
 
-        self.cart = cart
+        return memo[1]
 
     def __iter__(self):
-        for p in self.cart.keys():
-            self.cart[str(p)]['product'] = Product.objects.get(pk=p)
+        products = self.get_products()
 
-        for item in self.cart.values():
-            item['total_price'] = item['product'].price * item['quantity']
+        for p, quantity in self.cart.items():
+            product = products.get(p)
 
-            yield item
+            # Product was deleted since it was added to the cart
+            if product is None:
+                continue
+
+            yield {
+                'id': p,
+                'quantity': quantity,
+                'product': product,
+                'total_price': product.price * quantity,
+            }
 
     def __len__(self):
-        return sum(item['quantity'] for item in self.cart.values())
+        # Pages outside the cart only show the count, so don't load the lines for it
+        memo = getattr(self.request, '_cart_lines', None)
+        if memo is not None and memo[0] == self.key:
+            return sum(memo[1].values())
+
+        count = getattr(self.request, '_cart_count', None)
+        if count is None or count[0] != self.key:
+            count = (self.key, self.store.count(self.key) if self.key else 0)
+            self.request._cart_count = count
+
+        return count[1]
 
     def add(self, product_id, quantity=1, update_quantity=False):
         product_id = str(product_id)
+        self.key = self.key or get_cart_key(self.request, create=True)
 
-        if product_id not in self.cart:
-            self.cart[product_id] = {'quantity': 1, 'id': product_id}
+        self.store.setdefault(self.key, product_id, 1)
 
         if update_quantity:
-            self.cart[product_id]['quantity'] += int(quantity)
-            
-            if self.cart[product_id]['quantity'] == 0:
-                self.remove(product_id)
-        
+            self.store.increment(self.key, product_id, int(quantity))
+
         self.save()
 
     def remove(self, product_id):
-        if product_id in self.cart:
-            del self.cart[product_id]
+        if self.key:
+            self.store.remove(self.key, str(product_id))
             self.save()
 
     def save(self):
-        self.session[settings.CART_SESSION_ID] = self.cart
-        self.session.modified = True
+        # Lines are written to the store as they change; only this request's snapshot is dropped
+        self.request._cart_lines = None
+        self.request._cart_count = None
 
     def clear(self):
-        del self.session[settings.CART_SESSION_ID]
-        self.session.modified = True
+        if self.key:
+            self.store.clear(self.key)
+            self.save()
 
-    def get_total_cost(self):
-        for p in self.cart.keys():
-            self.cart[str(p)]['product'] = Product.objects.get(pk=p)
+    def get_products(self):
+        # Every Cart built for the same request (context processor, view, checkout)
+        # shares one snapshot, reloaded only when the set of products changes
+        product_ids = frozenset(self.cart.keys())
+        memo = getattr(self.request, '_cart_products', None)
 
-        return sum(item['quantity'] * item['product'].price for item in self.cart.values())
+        if memo is None or memo[0] != product_ids:
+            products = Product.objects.select_related('vendor', 'category').in_bulk([int(p) for p in product_ids])
+            memo = (product_ids, {str(pk): product for pk, product in products.items()})
+            self.request._cart_products = memo
 
-        
+        return memo[1]
+
+    def get_total_cost(self):
+        return sum((item['total_price'] for item in self), Decimal('0.00'))
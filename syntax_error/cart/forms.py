@@ -1,3 +1,5 @@
+import uuid
+
 from django import forms
 from django.forms.fields import CharField 
 
@@ -10,6 +12,8 @@ class CheckoutForm(forms.Form):
     zipcode = forms.CharField(max_length=255)
     place = forms.CharField(max_length=255)
     stripe_token = forms.CharField(max_length=255)
+    # New for every rendered form; a resubmission reuses it and gets the same order
+    checkout_id = forms.UUIDField(initial=uuid.uuid4, widget=forms.HiddenInput)
 
 
     
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cart.stores import get_cart_store
+
+
+class Command(BaseCommand):
+    help = 'Delete the anonymous session carts nobody has changed for longer than a session lasts. Run it daily, like clearsessions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=settings.SESSION_COOKIE_AGE, help='Seconds since a cart last changed; defaults to SESSION_COOKIE_AGE.')
+
+    def handle(self, *args, **options):
+        deleted = get_cart_store().clear_expired(timezone.now() - timedelta(seconds=options['max_age']))
+        self.stdout.write('Deleted %d cart lines' % deleted)
@@ -1,3 +1,18 @@
 from django.db import models
 
+from product.models import Product
+
 # Create your models here.
+
+class CartLine(models.Model):
+    # Used by cart.stores.DatabaseCartStore; cart_key is 'user:<id>' or 'session:<token>'
+    cart_key = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, related_name='cart_lines', on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [['cart_key', 'product']]
+
+    def __str__(self):
+        return '%s: %s x %d' % (self.cart_key, self.product_id, self.quantity)
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .cart import get_user_cart_key, migrate_session_cart
+from .stores import get_cart_store
+
+
+@receiver(user_logged_in)
+def merge_session_cart(sender, request, user, **kwargs):
+    # What was added before signing in joins the user's own cart
+    token = request.session.pop(settings.CART_SESSION_ID, None)
+    key = get_user_cart_key(user)
+
+    if isinstance(token, dict):
+        migrate_session_cart(token, key)
+    elif token:
+        get_cart_store().merge('session:%s' % token, key)
@@ -0,0 +1,176 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import CartLine
+
+
+class BaseCartStore(object):
+    """
+    Where cart lines live, keyed by a cart key. Quantities are keyed by product id as a string.
+    increment() must be atomic, so two tabs adding to the same cart never lose an update.
+    """
+
+    def lines(self, key):
+        raise NotImplementedError
+
+    def count(self, key):
+        return sum(self.lines(key).values())
+
+    def increment(self, key, product_id, quantity):
+        """Add quantity (may be negative) to a line, creating it if needed; lines at zero or below are removed."""
+        raise NotImplementedError
+
+    def setdefault(self, key, product_id, quantity):
+        """Create the line with quantity unless it already exists."""
+        raise NotImplementedError
+
+    def remove(self, key, product_id):
+        raise NotImplementedError
+
+    def remove_many(self, key, product_ids):
+        for product_id in product_ids:
+            self.remove(key, product_id)
+
+    def clear(self, key):
+        raise NotImplementedError
+
+    def merge(self, from_key, to_key):
+        for product_id, quantity in self.lines(from_key).items():
+            self.increment(to_key, product_id, quantity)
+        self.clear(from_key)
+
+    def clear_expired(self, before):
+        """Delete the anonymous 'session:' carts last changed before the given time. Returns how many lines went."""
+        raise NotImplementedError
+
+
+class DatabaseCartStore(BaseCartStore):
+    """One CartLine row per product, updated in place with F() expressions."""
+
+    def lines(self, key):
+        return {str(product_id): quantity for product_id, quantity in CartLine.objects.filter(cart_key=key).values_list('product_id', 'quantity')}
+
+    def count(self, key):
+        return CartLine.objects.filter(cart_key=key).aggregate(count=Sum('quantity'))['count'] or 0
+
+    def increment(self, key, product_id, quantity):
+        line = CartLine.objects.filter(cart_key=key, product_id=product_id)
+        # update() skips auto_now, and clear_expired goes by updated_at
+        changes = {'quantity': F('quantity') + quantity, 'updated_at': timezone.now()}
+
+        if not line.update(**changes):
+            try:
+                with transaction.atomic():
+                    CartLine.objects.create(cart_key=key, product_id=product_id, quantity=quantity)
+            except IntegrityError:
+                # Another request created the line first
+                line.update(**changes)
+
+        if quantity < 0:
+            line.filter(quantity__lte=0).delete()
+
+    def setdefault(self, key, product_id, quantity):
+        try:
+            with transaction.atomic():
+                CartLine.objects.get_or_create(cart_key=key, product_id=product_id, defaults={'quantity': quantity})
+        except IntegrityError:
+            pass
+
+    def remove(self, key, product_id):
+        CartLine.objects.filter(cart_key=key, product_id=product_id).delete()
+
+    def remove_many(self, key, product_ids):
+        CartLine.objects.filter(cart_key=key, product_id__in=product_ids).delete()
+
+    def clear(self, key):
+        CartLine.objects.filter(cart_key=key).delete()
+
+    def clear_expired(self, before):
+        # Whole carts go by their newest line, so an old line in a cart still in use stays
+        stale = CartLine.objects.filter(cart_key__startswith='session:').values('cart_key').annotate(last_updated=Max('updated_at')).filter(last_updated__lt=before)
+        return CartLine.objects.filter(cart_key__in=stale.values('cart_key')).delete()[0]
+
+
+class CacheCartStore(BaseCartStore):
+    """
+    Lines in the cache: one counter per line, changed with cache.incr/decr, plus an index
+    of the cart's product ids. Quantity changes are atomic on Redis/Memcached; two tabs adding
+    different new products at the same instant can still race on the index.
+    """
+    timeout = 60 * 60 * 24 * 30
+
+    def _index_key(self, key):
+        return 'cart:%s' % key
+
+    def _line_key(self, key, product_id):
+        return 'cart:%s:%s' % (key, product_id)
+
+    def lines(self, key):
+        product_ids = cache.get(self._index_key(key), [])
+        quantities = cache.get_many([self._line_key(key, product_id) for product_id in product_ids])
+
+        lines = {}
+        for product_id in product_ids:
+            quantity = quantities.get(self._line_key(key, product_id))
+            if quantity:
+                lines[product_id] = quantity
+        return lines
+
+    def _index(self, key, product_id, present):
+        product_ids = cache.get(self._index_key(key), [])
+        if (product_id in product_ids) != present:
+            product_ids = [p for p in product_ids if p != product_id] + ([product_id] if present else [])
+            cache.set(self._index_key(key), product_ids, self.timeout)
+
+    def increment(self, key, product_id, quantity):
+        product_id = str(product_id)
+        line_key = self._line_key(key, product_id)
+
+        if cache.add(line_key, quantity, self.timeout):
+            new_quantity = quantity
+        else:
+            try:
+                new_quantity = cache.incr(line_key, quantity)
+            except ValueError:
+                # Expired between add and incr
+                cache.set(line_key, quantity, self.timeout)
+                new_quantity = quantity
+
+        if new_quantity <= 0:
+            self.remove(key, product_id)
+        else:
+            self._index(key, product_id, True)
+
+    def setdefault(self, key, product_id, quantity):
+        product_id = str(product_id)
+        cache.add(self._line_key(key, product_id), quantity, self.timeout)
+        self._index(key, product_id, True)
+
+    def remove(self, key, product_id):
+        product_id = str(product_id)
+        cache.delete(self._line_key(key, product_id))
+        self._index(key, product_id, False)
+
+    def remove_many(self, key, product_ids):
+        product_ids = {str(product_id) for product_id in product_ids}
+        cache.delete_many([self._line_key(key, product_id) for product_id in product_ids])
+
+        index = cache.get(self._index_key(key), [])
+        if product_ids.intersection(index):
+            cache.set(self._index_key(key), [p for p in index if p not in product_ids], self.timeout)
+
+    def clear(self, key):
+        product_ids = cache.get(self._index_key(key), [])
+        cache.delete_many([self._line_key(key, product_id) for product_id in product_ids] + [self._index_key(key)])
+
+    def clear_expired(self, before):
+        # The lines expire with the cache timeout
+        return 0
+
+
+def get_cart_store():
+    return import_string(settings.CART_STORE)()
@@ -1,3 +1,188 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from product.models import Category, Product
+from vendor.models import Vendor
+
+from .cart import Cart, get_cart_key
+from .context_processors import cart as cart_context
+from .models import CartLine
+from .stores import CacheCartStore, DatabaseCartStore
+
+
+class CartTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('vendor', 'vendor@example.com', 'password')
+        cls.vendor = Vendor.objects.create(name='Vendor', created_by=user)
+        cls.category = Category.objects.create(title='Category', slug='category')
+        cls.products = [
+            Product.objects.create(category=cls.category, vendor=cls.vendor, title='Product %d' % i, slug='product-%d' % i, price=Decimal('1.25') * (i + 1))
+            for i in range(30)
+        ]
+
+    def make_request(self, products):
+        request = RequestFactory().get('/cart/')
+        request.session = SessionStore()
+        key = get_cart_key(request, create=True)
+        for product in products:
+            DatabaseCartStore().increment(key, product.id, 2)
+        return request
+
+    def test_total_cost(self):
+        request = self.make_request(self.products[:3])
+        self.assertEqual(Cart(request).get_total_cost(), Decimal('15.00'))
+
+    def test_products_loaded_once_per_request(self):
+        request = self.make_request(self.products)
+
+        # The context processor, the template loop, cart_detail and checkout
+        # all build their own Cart from the same request: one read of the lines, one of the products
+        with self.assertNumQueries(2):
+            cart_context(request)['cart'].get_total_cost()
+            items = list(Cart(request))
+            Cart(request).get_total_cost()
+            Cart(request).get_total_cost()
+            [item['product'].vendor.name for item in items]
+            [item['product'].category.slug for item in items]
+
+        self.assertEqual(len(items), 30)
+
+    def test_products_reloaded_when_cart_changes(self):
+        request = self.make_request(self.products[:2])
+        cart = Cart(request)
+        self.assertEqual(len(list(cart)), 2)
+
+        cart.add(self.products[2].id)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(len([item for item in cart]), 3)
+
+    def test_deleted_product_is_skipped(self):
+        request = self.make_request(self.products[:2])
+        Product.objects.filter(pk=self.products[0].pk).delete()
+
+        self.assertEqual([item['product'] for item in Cart(request)], [self.products[1]])
+
+    def test_cart_page_query_count_is_constant(self):
+        def cart_page_queries(products):
+            session = self.client.session
+            session[settings.CART_SESSION_ID] = token = 'page-%d' % len(products)
+            session.save()
+            for product in products:
+                DatabaseCartStore().increment('session:%s' % token, product.id, 1)
+            cache.clear()
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/cart/')
+            self.assertEqual(response.status_code, 200)
+            return len(context)
+
+        self.assertEqual(cart_page_queries(self.products[:3]), cart_page_queries(self.products))
+
+    def test_browsing_does_not_create_cart(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(len(Cart(request)), 0)
+        self.assertNotIn(settings.CART_SESSION_ID, request.session)
+
+    def test_count_reads_only_the_count(self):
+        request = self.make_request(self.products[:3])
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(len(Cart(request)), 6)
+            self.assertEqual(len(Cart(request)), 6)
+
+        self.assertEqual(len(context), 1)
+        self.assertNotIn('product_product', context[0]['sql'])
+
+    def test_change_quantity_is_incremental(self):
+        request = self.make_request(self.products[:1])
+
+        # Two carts loaded before either change, as with two tabs
+        first, second = Cart(request), Cart(request)
+        first.add(self.products[0].id, 3, True)
+        second.add(self.products[0].id, -1, True)
+
+        self.assertEqual(CartLine.objects.get().quantity, 4)
+
+        Cart(request).add(self.products[0].id, -4, True)
+        self.assertFalse(CartLine.objects.exists())
+
+    def test_session_cart_merged_on_login(self):
+        user = User.objects.create_user('customer', 'customer@example.com', 'password')
+        DatabaseCartStore().increment('user:%d' % user.pk, self.products[0].id, 1)
+
+        session = self.client.session
+        session[settings.CART_SESSION_ID] = 'anonymous'
+        session.save()
+        DatabaseCartStore().increment('session:anonymous', self.products[0].id, 2)
+        DatabaseCartStore().increment('session:anonymous', self.products[1].id, 1)
+
+        self.client.login(username='customer', password='password')
+
+        self.assertEqual(DatabaseCartStore().lines('user:%d' % user.pk), {str(self.products[0].id): 3, str(self.products[1].id): 1})
+        self.assertFalse(CartLine.objects.filter(cart_key='session:anonymous').exists())
+
+    def test_legacy_session_cart_is_migrated(self):
+        request = RequestFactory().get('/cart/')
+        request.session = SessionStore()
+        request.session[settings.CART_SESSION_ID] = {str(self.products[0].id): {'quantity': 2, 'id': str(self.products[0].id)}}
+
+        self.assertEqual(Cart(request).get_total_cost(), Decimal('2.50'))
+        self.assertIsInstance(request.session[settings.CART_SESSION_ID], str)
+
+    def test_expired_session_carts_are_cleared(self):
+        store = DatabaseCartStore()
+        for key in ('session:old', 'session:active', 'user:1'):
+            store.increment(key, self.products[0].id, 1)
+            store.increment(key, self.products[1].id, 1)
+
+        old = timezone.now() - timedelta(seconds=settings.SESSION_COOKIE_AGE + 60)
+        CartLine.objects.update(updated_at=old)
+        # A cart still in use keeps its older lines
+        store.increment('session:active', self.products[1].id, 1)
+
+        call_command('clear_expired_carts', stdout=StringIO())
+
+        self.assertEqual(sorted(CartLine.objects.values_list('cart_key', flat=True).distinct()), ['session:active', 'user:1'])
+        self.assertEqual(store.count('session:active'), 3)
+
+
+class CacheCartStoreTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.store = CacheCartStore()
+
+    def test_increment_and_remove(self):
+        self.store.increment('session:a', 1, 2)
+        self.store.increment('session:a', '1', 3)
+        self.store.setdefault('session:a', 2, 1)
+        self.store.setdefault('session:a', 2, 5)
+
+        self.assertEqual(self.store.lines('session:a'), {'1': 5, '2': 1})
+        self.assertEqual(self.store.count('session:a'), 6)
+
+        self.store.increment('session:a', 2, -1)
+        self.assertEqual(self.store.lines('session:a'), {'1': 5})
+
+        self.store.merge('session:a', 'user:1')
+        self.assertEqual(self.store.lines('session:a'), {})
+        self.assertEqual(self.store.lines('user:1'), {'1': 5})
+
+        self.store.increment('user:1', 3, 1)
+        self.store.remove_many('user:1', [1, 4])
+        self.assertEqual(self.store.lines('user:1'), {'3': 1})
@@ -7,5 +7,4 @@ app_name = 'cart'
 
 urlpatterns = [
     path('', views.cart_detail, name="cart"),
-    path('success/', views.success, name="success"),
 ]
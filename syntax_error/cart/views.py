@@ -1,12 +1,10 @@
-import stripe #pip install stripe 
-
 from django. conf import settings
 from django.contrib import messages
 from django.shortcuts import redirect, render
 from .cart import Cart
 from .forms import CheckoutForm
 
-from order.utilities import checkout, notify_vendor, notify_customer
+from order.utilities import place_order
 
 # Create your views here.
 def cart_detail(request):
@@ -16,39 +14,27 @@ def cart_detail(request):
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            stripe.api_key = settings.STRIPE_SECRET_KEY
-
-            stripe_token = form.cleaned_data['stripe_token']
-
-            try:
-                charge = stripe.Charge.create(
-                    amount=int(cart.get_total_cost() * 100), # Amount in Cents
-                    currency='RS',
-                    description='Charge From Multivendor Shop',
-                    source=stripe_token
-                )
-
-                first_name = form.cleaned_data['first_name']
-                last_name = form.cleaned_data['last_name']
-                email = form.cleaned_data['email']
-                phone = form.cleaned_data['phone']
-                address = form.cleaned_data['address']
-                zipcode = form.cleaned_data['zipcode']
-                place = form.cleaned_data['place']
-
-                order = checkout(request, first_name, last_name, email, phone, address, zipcode, place, cart.get_total_cost())
+            # Only a pending order is written here; process_payments charges it, writes the items
+            # and takes them out of the cart
+            order = place_order(
+                request,
+                checkout_id=form.cleaned_data['checkout_id'],
+                payment_token=form.cleaned_data['stripe_token'],
+                first_name=form.cleaned_data['first_name'],
+                last_name=form.cleaned_data['last_name'],
+                email=form.cleaned_data['email'],
+                address=form.cleaned_data['address'],
+                zipcode=form.cleaned_data['zipcode'],
+                place=form.cleaned_data['place'],
+                phone=form.cleaned_data['phone'],
+            )
+
+            if order is None:
+                messages.error(request, "Your cart is empty.")
+                return redirect('cart:cart')
+
+            return redirect('order:status', checkout_id=order.checkout_id)
 
-                cart.clear()
-
-                # SEnd Email Notification
-                notify_customer(order)
-                notify_vendor(order)
-
-                return redirect('cart:success')
-            
-            except Exception:
-                messages.error(request, "Something went wrong with payment.")
-            
     else:
         form = CheckoutForm()
 
@@ -65,7 +51,3 @@ def cart_detail(request):
         return redirect('cart:cart')
         
     return render(request, 'cart/cart.html', {'form': form, 'stripe_pub_key': settings.STRIPE_PUB_KEY})
-
-
-def success(request):
-    return render(request, 'cart/success.html')
\ No newline at end of file
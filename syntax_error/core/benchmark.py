@@ -0,0 +1,116 @@
+import random
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import Client, override_settings
+
+from cart.models import CartLine
+from order.models import Order, OrderItem
+from product.management.commands.benchmark_search import WORDS
+from product.models import Category, Product
+from vendor.models import Vendor
+from vendor.utilities import ensure_ledgers
+
+CART_SIZE = 10
+
+
+def seed_site(product_count, order_count):
+    """Vendors, categories, products and orders for the page benchmarks. Call inside a transaction that is rolled back."""
+    rng = random.Random(0)
+    categories = [Category.objects.create(title='Benchmark %d' % i, slug='benchmark-%d' % i, ordering=i) for i in range(20)]
+    vendors = [
+        Vendor.objects.create(name='Benchmark %d' % i, created_by=User.objects.create_user('benchmark-vendor-%d' % i))
+        for i in range(50)
+    ]
+
+    Product.objects.bulk_create([
+        Product(
+            category=rng.choice(categories),
+            vendor=rng.choice(vendors),
+            title=' '.join(rng.sample(WORDS, 3))[:50],
+            slug='benchmark-%d' % i,
+            description=' '.join(rng.choice(WORDS) for _ in range(30)),
+            price=Decimal('9.99'),
+        )
+        for i in range(product_count)
+    ], batch_size=1000)
+
+    # A tenth of the orders go to the first vendor, whose admin page is measured
+    products = list(Product.objects.filter(category__in=categories).values_list('id', 'vendor_id'))
+    own_products = [p for p in products if p[1] == vendors[0].id]
+
+    last_order = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    Order.objects.bulk_create([
+        Order(first_name='First', last_name='Last', email='customer@example.com', address='Address', zipcode='0000', place='Place', phone='000', paid_amount=Decimal('19.98'), status=Order.COMPLETED)
+        for _ in range(order_count)
+    ], batch_size=1000)
+
+    items = []
+    order_vendors = set()
+    for i, order_id in enumerate(Order.objects.filter(id__gt=last_order).order_by('id').values_list('id', flat=True).iterator()):
+        lines = [rng.choice(own_products if i % 10 == 0 and own_products else products), rng.choice(products)]
+        for product_id, vendor_id in lines:
+            items.append(OrderItem(order_id=order_id, product_id=product_id, vendor_id=vendor_id, price=Decimal('9.99'), quantity=1, vendor_paid=rng.random() < 0.5))
+            order_vendors.add((order_id, vendor_id))
+
+    OrderItem.objects.bulk_create(items, batch_size=1000)
+    Order.vendors.through.objects.bulk_create([
+        Order.vendors.through(order_id=order_id, vendor_id=vendor_id) for order_id, vendor_id in order_vendors
+    ], batch_size=1000)
+    ensure_ledgers([vendor.id for vendor in vendors])
+
+    return {
+        'vendor': vendors[0],
+        'category': categories[0],
+        'product': Product.objects.filter(category=categories[0]).select_related('category').first(),
+        'cart': [p[0] for p in products[:CART_SIZE]],
+    }
+
+
+def get_pages(seeded, rng):
+    """(name, setup(client) run untimed before each request, request(client), expected status) for every page."""
+    product = seeded['product']
+
+    def fill_cart(client):
+        session = client.session
+        session[settings.CART_SESSION_ID] = token = 'benchmark-%d' % rng.getrandbits(64)
+        session.save()
+        CartLine.objects.bulk_create([CartLine(cart_key='session:%s' % token, product_id=product_id, quantity=2) for product_id in seeded['cart']])
+
+    checkout_data = {
+        'first_name': 'First', 'last_name': 'Last', 'email': 'customer@example.com', 'phone': '000',
+        'address': 'Address', 'zipcode': '0000', 'place': 'Place', 'stripe_token': 'tok_benchmark',
+    }
+
+    return [
+        ('frontpage', None, lambda client: client.get('/'), 200),
+        ('category', None, lambda client: client.get('/product/%s/' % seeded['category'].slug), 200),
+        ('product', None, lambda client: client.get('/product/%s/%s/' % (product.category.slug, product.slug)), 200),
+        ('search', None, lambda client: client.get('/product/search', {'query': ' '.join(rng.sample(WORDS, 2))}), 200),
+        ('cart', fill_cart, lambda client: client.get('/cart/'), 200),
+        ('checkout', fill_cart, lambda client: client.post('/cart/', dict(checkout_data, checkout_id=uuid.uuid4())), 302),
+        ('vendor-admin', None, lambda client: client.get('/vendor/vendor-admin/'), 200),
+    ]
+
+
+def get_client(name, seeded):
+    client = Client()
+    if name == 'vendor-admin':
+        client.force_login(seeded['vendor'].created_by)
+    return client
+
+
+@contextmanager
+def site_stubs():
+    # The test client's host, and the local gateway in place of Stripe. random is seeded because the
+    # similar products fallback starts at a random id and takes one more query when it wraps around.
+    state = random.getstate()
+    random.seed(1)
+    try:
+        with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver'], PAYMENT_GATEWAY='order.payments.StubGateway'):
+            yield
+    finally:
+        random.setstate(state)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(name):
+    return 'version:%s' % name
+
+
+def get_version(name):
+    """Current version of a group of cache entries; pass it as version= to cache.get/set."""
+    version = cache.get(_version_key(name))
+
+    if version is None:
+        # Start from the clock so a version lost to eviction never reuses an older number
+        version = int(time.time() * 1000)
+        if not cache.add(_version_key(name), version, None):
+            version = cache.get(_version_key(name), version)
+
+    return version
+
+
+def bump_version(name):
+    """Invalidate every entry cached under the current version of name."""
+    try:
+        cache.incr(_version_key(name))
+    except ValueError:
+        get_version(name)
@@ -0,0 +1,112 @@
+import random
+import re
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.benchmark import get_client, get_pages, seed_site, site_stubs
+
+# Findings that are expected: sorts over rows an index has already narrowed down
+ACCEPTED = {
+    # bm25 ranking and facet counts over the FTS matches
+    ('search', 'USE TEMP B-TREE FOR ORDER BY'),
+    ('search', 'USE TEMP B-TREE FOR GROUP BY'),
+    # Per-order totals across the vendor's orders, newest first
+    ('vendor-admin', 'USE TEMP B-TREE FOR GROUP BY'),
+    ('vendor-admin', 'USE TEMP B-TREE FOR ORDER BY'),
+}
+
+EXPLAIN_SQL = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+PLAN_PROBLEMS = {
+    # Full table scans; a search of an index or a virtual table is fine
+    'sqlite': [re.compile(r'^(SCAN \w+)\b(?! USING (COVERING )?INDEX| VIRTUAL TABLE)'), re.compile(r'(USE TEMP B-TREE FOR [\w ]+)')],
+    'postgresql': [re.compile(r'(Seq Scan on \w+)'), re.compile(r'(Sort)  \(')],
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every main page on a synthetic catalog, run EXPLAIN on each query it issues and '
+        'report full table scans and temporary sort trees. Nothing is written to the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--fail', action='store_true', help='Exit with an error if anything not in ACCEPTED is found.')
+        parser.add_argument('--verbose', action='store_true', help='Print every plan, not just the findings.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in EXPLAIN_SQL:
+            raise CommandError('No query plan support for %s' % connection.vendor)
+
+        try:
+            with transaction.atomic():
+                seeded = seed_site(options['products'], options['orders'])
+                findings = self.audit(seeded, options['verbose'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        new = [finding for finding in findings if finding[:2] not in ACCEPTED]
+
+        for page, problem, sql in findings:
+            self.stdout.write('%-14s %-40s %s%s' % (page, problem, sql[:160], '' if (page, problem) in ACCEPTED else '  [NEW]'))
+        self.stdout.write('%d findings, %d not accepted' % (len(findings), len(new)))
+
+        if options['fail'] and new:
+            raise CommandError('%d query plan findings not in ACCEPTED' % len(new))
+
+    def audit(self, seeded, verbose):
+        findings = []
+        seen = set()
+
+        with site_stubs():
+            for name, setup, request, status in get_pages(seeded, random.Random(1)):
+                client = get_client(name, seeded)
+                cache.clear()
+                if setup:
+                    setup(client)
+
+                with CaptureQueriesContext(connection) as context:
+                    response = request(client)
+
+                if response.status_code != status:
+                    raise CommandError('%s returned %d, expected %d' % (name, response.status_code, status))
+
+                for query in context.captured_queries:
+                    sql = query['sql']
+                    if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')) or (name, sql) in seen:
+                        continue
+                    seen.add((name, sql))
+
+                    plan = self.explain(sql)
+                    if verbose:
+                        self.stdout.write('%s: %s\n    %s' % (name, sql, '\n    '.join(plan)))
+
+                    problems = set()
+                    for line in plan:
+                        for pattern in PLAN_PROBLEMS[connection.vendor]:
+                            match = pattern.search(line.strip())
+                            if match:
+                                problems.add(match.group(1))
+
+                    findings += [(name, problem, sql) for problem in sorted(problems)]
+
+        return findings
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(EXPLAIN_SQL[connection.vendor] + sql)
+            # SQLite: (id, parent, notused, detail); Postgres: one line of text per row
+            return [row[-1] for row in cursor.fetchall()]
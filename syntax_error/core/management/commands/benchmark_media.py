@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from core.views import media
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare serving one media file through core.views.media against django.views.static.serve: '
+        'full downloads, byte ranges, revalidation and X-Accel-Redirect. Bodies are read the way a '
+        'WSGI server without wsgi.file_wrapper reads them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1024, help='File size in KiB.')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        try:
+            name = 'benchmark.jpg'
+            with open(os.path.join(media_root, name), 'wb') as f:
+                f.write(os.urandom(options['size'] * 1024))
+
+            with override_settings(MEDIA_ROOT=media_root, MEDIA_SENDFILE=None):
+                results = self.run_cases(name, media_root, options['repeat'])
+        finally:
+            shutil.rmtree(media_root)
+
+        self.stdout.write('%-34s %8s %10s %10s %10s' % ('case', 'status', 'req/s', 'MiB/s', 'p50 ms'))
+        for case, status, timings, sent in results:
+            total = sum(timings)
+            self.stdout.write('%-34s %8d %10.0f %10.1f %10.3f' % (
+                case, status, len(timings) / total, sent * len(timings) / total / 1024 / 1024, sorted(timings)[len(timings) // 2] * 1000,
+            ))
+
+    def run_cases(self, name, media_root, repeat):
+        factory = RequestFactory()
+        etag = media(factory.get('/media/' + name), name)['ETag']
+        last_modified = serve(factory.get('/media/' + name), name, document_root=media_root)['Last-Modified']
+
+        cases = [
+            ('static.serve full', serve, {}, {'document_root': media_root}, None),
+            ('media full', media, {}, {}, None),
+            ('static.serve range 64 KiB', serve, {'HTTP_RANGE': 'bytes=0-65535'}, {'document_root': media_root}, None),
+            ('media range 64 KiB', media, {'HTTP_RANGE': 'bytes=0-65535'}, {}, None),
+            ('static.serve If-Modified-Since', serve, {'HTTP_IF_MODIFIED_SINCE': last_modified}, {'document_root': media_root}, None),
+            ('media If-None-Match', media, {'HTTP_IF_NONE_MATCH': etag}, {}, None),
+            ('media X-Accel-Redirect', media, {}, {}, 'x-accel-redirect'),
+        ]
+
+        results = []
+        for case, view, headers, kwargs, sendfile in cases:
+            with override_settings(MEDIA_SENDFILE=sendfile):
+                timings = []
+                for i in range(repeat):
+                    start = time.perf_counter()
+                    response = view(factory.get('/media/' + name, **headers), name, **kwargs)
+                    sent = sum(len(chunk) for chunk in response)
+                    response.close()
+                    timings.append(time.perf_counter() - start)
+
+            results.append((case, response.status_code, timings, sent))
+
+        return results
@@ -0,0 +1,136 @@
+import json
+import random
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.benchmark import get_client, get_pages, seed_site, site_stubs
+
+# Most queries one request to each page may run. Raise a budget only together with the change that needs it.
+QUERY_BUDGETS = {
+    'frontpage': 4,
+    'category': 5,
+    'product': 6,
+    'search': 8,
+    'cart': 6,
+    'checkout': 10,
+    'vendor-admin': 10,
+}
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic catalog, request every main page through the test client and report queries, '
+        'p50/p95 latency and allocated memory per page. Fails when a page goes over its query budget. '
+        'Nothing is written to the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--orders', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every request.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='JSON from an earlier run; fail if a page now runs more queries.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                start = time.perf_counter()
+                seeded = seed_site(options['products'], options['orders'])
+                self.stdout.write('Seeded %d products and %d orders in %.1fs' % (options['products'], options['orders'], time.perf_counter() - start))
+
+                results = self.run_pages(seeded, options['repeat'], options['cold'])
+
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write('%-14s %8s %8s %10s %10s %10s' % ('page', 'queries', 'budget', 'p50 ms', 'p95 ms', 'peak KiB'))
+        for name, result in results.items():
+            self.stdout.write('%-14s %8d %8d %10.2f %10.2f %10.1f' % (
+                name, result['queries'], result['budget'], result['p50_ms'], result['p95_ms'], result['peak_kib'],
+            ))
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'products': options['products'],
+            'orders': options['orders'],
+            'repeat': options['repeat'],
+            'cold': options['cold'],
+            'pages': results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        errors = ['%s: %d queries, budget %d' % (name, result['queries'], result['budget']) for name, result in results.items() if result['queries'] > result['budget']]
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['pages']
+
+            for name, result in results.items():
+                if name in baseline:
+                    if result['queries'] > baseline[name]['queries']:
+                        errors.append('%s: %d queries, %d in the baseline' % (name, result['queries'], baseline[name]['queries']))
+                    self.stdout.write('%-14s p95 %+.1f%% against the baseline' % (name, (result['p95_ms'] / (baseline[name]['p95_ms'] or 1) - 1) * 100))
+
+        if errors:
+            raise CommandError('Query budget exceeded:\n' + '\n'.join(errors))
+
+    def run_pages(self, seeded, repeat, cold):
+        results = {}
+        with site_stubs():
+            for name, setup, request, status in get_pages(seeded, random.Random(1)):
+                client = get_client(name, seeded)
+                cache.clear()
+
+                timings = []
+                queries = 0
+                for i in range(repeat + 1):
+                    if setup:
+                        setup(client)
+                    if cold:
+                        cache.clear()
+
+                    with CaptureQueriesContext(connection) as context:
+                        start = time.perf_counter()
+                        response = request(client)
+                        elapsed = time.perf_counter() - start
+
+                    if response.status_code != status:
+                        raise CommandError('%s returned %d, expected %d' % (name, response.status_code, status))
+
+                    queries = max(queries, len(context))
+                    # The first request warms the caches and is not timed
+                    if i:
+                        timings.append(elapsed * 1000)
+
+                # Memory is measured on a separate request, tracing slows everything else down
+                if setup:
+                    setup(client)
+                tracemalloc.start()
+                request(client)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                timings.sort()
+                results[name] = {
+                    'queries': queries,
+                    'budget': QUERY_BUDGETS[name],
+                    'p50_ms': timings[len(timings) // 2] if timings else 0,
+                    'p95_ms': timings[min(int(len(timings) * 0.95), len(timings) - 1)] if timings else 0,
+                    'peak_kib': peak / 1024,
+                }
+
+        return results
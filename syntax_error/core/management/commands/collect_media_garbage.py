@@ -0,0 +1,74 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.cache import bump_version
+from product.models import Product
+from product.utilities import get_referenced_media
+
+
+class Command(BaseCommand):
+    help = 'Delete media files no product references. --migrate first moves legacy uploads into content-addressed storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--migrate', action='store_true', help='Re-save product images stored under their original names so duplicates collapse.')
+        parser.add_argument('--min-age', type=float, default=24, help='Only delete files older than this many hours, so uploads in flight survive.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['migrate']:
+            self.migrate(options['dry_run'])
+
+        referenced = get_referenced_media()
+        cutoff = timezone.now() - timedelta(hours=options['min_age'])
+        deleted = 0
+        freed = 0
+
+        for directory in settings.MEDIA_GC_DIRS:
+            for name in self.walk(directory):
+                if name in referenced or default_storage.get_modified_time(name) > cutoff:
+                    continue
+
+                freed += default_storage.size(name)
+                deleted += 1
+                self.stdout.write('Deleting %s' % name)
+                if not options['dry_run']:
+                    default_storage.delete(name)
+
+        self.stdout.write('Deleted %d files, %d bytes' % (deleted, freed))
+
+    def walk(self, directory):
+        if not default_storage.exists(directory):
+            return
+
+        directories, files = default_storage.listdir(directory)
+        for name in files:
+            yield os.path.join(directory, name)
+        for name in directories:
+            yield from self.walk(os.path.join(directory, name))
+
+    def migrate(self, dry_run):
+        is_hashed = getattr(default_storage, 'is_hashed', lambda name: True)
+
+        for product in Product.objects.iterator():
+            changes = {}
+
+            for field in ('image', 'thumbnail'):
+                file = getattr(product, field)
+                if not file or is_hashed(file.name) or not default_storage.exists(file.name):
+                    continue
+
+                with default_storage.open(file.name, 'rb') as f:
+                    changes[field] = file.name if dry_run else default_storage.save(file.name, f)
+                self.stdout.write('%s: %s -> %s' % (product, file.name, changes[field]))
+
+            if changes and not dry_run:
+                if 'image' in changes:
+                    # Derivatives are rebuilt from the new name by build_product_images
+                    changes['image_status'] = Product.IMAGE_PENDING
+                Product.objects.filter(pk=product.pk).update(**changes)
+                bump_version('catalog')
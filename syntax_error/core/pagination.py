@@ -0,0 +1,114 @@
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+# Below this many rows COUNT(*) is cheap enough, and an exact count is nicer
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class KeysetPage(object):
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(value, pk):
+    return '%s,%d' % (value.isoformat(), pk)
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = cursor.rsplit(',', 1)
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+    if value is None:
+        return None
+    return value, pk
+
+
+def normalize_cursor(cursor):
+    """
+    The canonical form of cursor, or '' (the first page) if it doesn't decode. Cached pages are keyed
+    on it, so junk or differently spelled cursors share an entry instead of each adding one.
+    """
+    position = decode_cursor(cursor)
+    return encode_cursor(*position) if position else ''
+
+
+def keyset_paginate(queryset, cursor, field, per_page):
+    """Newest-first page of queryset starting after cursor, seeking on (field, id) instead of using OFFSET."""
+    queryset = queryset.order_by('-' + field, '-id')
+
+    position = decode_cursor(cursor)
+    if position is not None:
+        value, pk = position
+        queryset = queryset.filter(Q(**{field + '__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+
+    object_list = list(queryset[:per_page + 1])
+    next_cursor = None
+
+    if len(object_list) > per_page:
+        object_list = object_list[:per_page]
+        last = object_list[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+
+    return KeysetPage(object_list, next_cursor)
+
+
+def estimate_count(model):
+    """Row count of model's table from the database's statistics, or None when it has none (no ANALYZE yet)."""
+    table = model._meta.db_table
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            # -1 until the table is first analyzed
+            return int(row[0]) if row and row[0] >= 0 else None
+
+        if connection.vendor == 'mysql':
+            cursor.execute('SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s', [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] is not None else None
+
+        if connection.vendor == 'sqlite':
+            try:
+                # The first number of each index's stat is the table's row count
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            except DatabaseError:
+                # sqlite_stat1 only exists once ANALYZE has run
+                return None
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of big tables. An unfiltered list takes its count from the
+    database's statistics instead of running COUNT(*) over the whole table; filtered lists are counted exactly.
+    """
+    @cached_property
+    def count(self):
+        object_list = self.object_list
+        if isinstance(object_list, QuerySet) and not object_list.query.has_filters():
+            estimate = estimate_count(object_list.model)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+
+        return super().count
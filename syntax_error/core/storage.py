@@ -0,0 +1,39 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under the SHA-256 of its content, e.g. cas/3f/a2/3fa2...e1.jpg.
+    Identical uploads share one file and a name never changes content, so URLs can be cached forever.
+    Rows may share a file, so never delete one directly; collect_media_garbage removes unreferenced files.
+    """
+    prefix = 'cas'
+
+    def hashed_name(self, name, content):
+        sha = hashlib.sha256()
+        for chunk in content.chunks():
+            sha.update(chunk)
+        content.seek(0)
+
+        digest = sha.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        return '%s/%s/%s/%s%s' % (self.prefix, digest[:2], digest[2:4], digest, ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+
+        return super().save(name, content, max_length=max_length)
+
+    def is_hashed(self, name):
+        return name.startswith(self.prefix + '/')
@@ -1,3 +1,216 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+
+from product.models import Category, Product
+from vendor.models import Vendor
+
+from .pagination import EstimatedCountPaginator
+from .views import media
+
+
+class MediaTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('vendor', 'vendor@example.com', 'password')
+        cls.vendor = Vendor.objects.create(name='Vendor', created_by=user)
+        cls.category = Category.objects.create(title='Category', slug='category')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_product(self, slug, **kwargs):
+        return Product.objects.create(category=self.category, vendor=self.vendor, title=slug, slug=slug, price=Decimal('1.00'), **kwargs)
+
+    def age(self, name, hours=48):
+        path = default_storage.path(name)
+        then = time.time() - hours * 3600
+        os.utime(path, (then, then))
+
+
+class ContentAddressedStorageTestCase(MediaTestCase):
+    def test_identical_content_is_stored_once(self):
+        first = self.create_product('cake', image=SimpleUploadedFile('cake.JPG', b'cake'))
+        second = self.create_product('cake-2', image=SimpleUploadedFile('cake_rS2iTIn.jpg', b'cake'))
+        third = self.create_product('shirt', image=SimpleUploadedFile('shirt.jpg', b'shirt'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, third.image.name)
+        self.assertRegex(first.image.name, r'^cas/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(first.image.read(), b'cake')
+
+    def test_hashed_media_is_cached_forever(self):
+        name = default_storage.save('uploads/cake.jpg', ContentFile(b'cake'))
+
+        response = media(RequestFactory().get('/media/' + name), name)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+
+class MediaServingTestCase(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.name = default_storage.save('uploads/cake.jpg', ContentFile(b'0123456789'))
+
+    def get(self, **headers):
+        return media(RequestFactory().get('/media/' + self.name, **headers), self.name)
+
+    def test_full_file_with_validators(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('Last-Modified', response)
+        response.close()
+
+    def test_conditional_get(self):
+        etag = self.get()['ETag']
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_byte_ranges(self):
+        response = self.get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response), b'2345')
+
+        self.assertEqual(b''.join(self.get(HTTP_RANGE='bytes=7-')), b'789')
+        self.assertEqual(b''.join(self.get(HTTP_RANGE='bytes=-3')), b'789')
+
+        response = self.get(HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+        # A range of another version of the file gets the whole current one
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"').status_code, 200)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        response = self.get()
+
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.name)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_benchmark_media(self):
+        out = StringIO()
+        call_command('benchmark_media', '--size', '4', '--repeat', '2', stdout=out)
+
+        self.assertIn('media range 64 KiB', out.getvalue())
+
+    def test_paths_outside_media_root(self):
+        for path in ('../settings.py', 'cas', 'missing.jpg'):
+            with self.assertRaises(Http404):
+                media(RequestFactory().get('/media/' + path), path)
+
+
+class MediaGarbageTestCase(MediaTestCase):
+    def test_unreferenced_files_are_deleted(self):
+        kept = self.create_product('kept', image=SimpleUploadedFile('kept.jpg', b'kept'))
+        orphan = default_storage.save('uploads/orphan.jpg', ContentFile(b'orphan'))
+        recent = default_storage.save('uploads/recent.jpg', ContentFile(b'recent'))
+        self.age(kept.image.name)
+        self.age(orphan)
+
+        call_command('collect_media_garbage', stdout=StringIO())
+
+        self.assertTrue(default_storage.exists(kept.image.name))
+        self.assertTrue(default_storage.exists(recent))
+        self.assertFalse(default_storage.exists(orphan))
+
+    def test_legacy_duplicates_are_migrated(self):
+        os.makedirs(os.path.join(self.media_root, 'uploads', 'uploads'))
+        for name in ('uploads/cake.jpg', 'uploads/cake_rS2iTIn.jpg', 'uploads/uploads/cake.jpg'):
+            with open(os.path.join(self.media_root, name), 'wb') as f:
+                f.write(b'cake')
+            self.age(name)
+
+        first = self.create_product('cake')
+        second = self.create_product('cake-2')
+        Product.objects.filter(pk=first.pk).update(image='uploads/cake.jpg')
+        Product.objects.filter(pk=second.pk).update(image='uploads/cake_rS2iTIn.jpg', thumbnail='uploads/uploads/cake.jpg')
+
+        call_command('collect_media_garbage', '--migrate', '--min-age', '0', stdout=StringIO())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(second.image.name, second.thumbnail.name)
+        self.assertEqual(first.image_status, Product.IMAGE_PENDING)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads', 'uploads')), [])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.media_root, 'uploads'))), ['uploads'])
+
+
+class BenchmarkSiteTestCase(TestCase):
+    def setUp(self):
+        self.output = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.output))
+
+    def benchmark(self, *args):
+        call_command('benchmark_site', '--products', '200', '--orders', '50', '--repeat', '2', *args, stdout=StringIO())
+
+    def test_report_is_written_and_rolled_back(self):
+        self.benchmark('--output', self.output)
+
+        with open(self.output) as f:
+            pages = json.load(f)['pages']
+
+        self.assertEqual(set(pages), {'frontpage', 'category', 'product', 'search', 'cart', 'checkout', 'vendor-admin'})
+        for result in pages.values():
+            self.assertLessEqual(result['queries'], result['budget'])
+            self.assertGreater(result['p95_ms'], 0)
+        # random is seeded, so the similar products fallback runs the same queries every time
+        self.assertEqual(pages['product']['queries'], pages['product']['budget'])
+        self.assertFalse(Product.objects.exists())
+
+    def test_fails_over_budget_or_baseline(self):
+        with mock.patch.dict('core.management.commands.benchmark_site.QUERY_BUDGETS', {'product': 1}):
+            with self.assertRaisesMessage(CommandError, 'product:'):
+                self.benchmark()
+
+        with open(self.output, 'w') as f:
+            json.dump({'pages': {'cart': {'queries': 1, 'p95_ms': 1.0}}}, f)
+
+        with self.assertRaisesMessage(CommandError, 'in the baseline'):
+            self.benchmark('--baseline', self.output)
+
+    def test_query_plan_audit(self):
+        out = StringIO()
+        call_command('audit_query_plans', '--products', '200', '--orders', '50', '--fail', stdout=out)
+
+        self.assertIn('0 not accepted', out.getvalue())
+
+
+class EstimatedCountPaginatorTestCase(TestCase):
+    def test_estimate_only_for_unfiltered_lists(self):
+        Category.objects.create(title='Category', slug='category')
+
+        with mock.patch('core.pagination.estimate_count', return_value=500000):
+            self.assertEqual(EstimatedCountPaginator(Category.objects.all(), 10).count, 500000)
+            self.assertEqual(EstimatedCountPaginator(Category.objects.filter(slug='category'), 10).count, 1)
+
+        # No statistics yet, or a table small enough to count
+        with mock.patch('core.pagination.estimate_count', return_value=None):
+            self.assertEqual(EstimatedCountPaginator(Category.objects.all(), 10).count, 1)
+        with mock.patch('core.pagination.estimate_count', return_value=50):
+            self.assertEqual(EstimatedCountPaginator(Category.objects.all(), 10).count, 1)
@@ -1,15 +1,133 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from core.cache import get_version
 from product.models import Product
 
 # Create your views here.
 
 def frontpage(request):
-    newest_products = Product.objects.all()[0:8]
+    # Lazy querysets: not evaluated when the template's cached fragment is used
+    newest_products = Product.objects.select_related('category')[0:8]
     context = {
         'newest_products': newest_products,
+        'catalog_version': get_version('catalog'),
     }
     return render(request, 'core/frontpage.html', context)
 
 
 def contactpage(request):
-    return render(request, 'core/contact.html')
\ No newline at end of file
+    return render(request, 'core/contact.html')
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+@require_safe
+def media(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        st = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('"%s" does not exist' % path)
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('"%s" does not exist' % path)
+
+    etag = '"%x-%x"' % (st.st_mtime_ns, st.st_size)
+    last_modified = int(st.st_mtime)
+
+    # 304 for If-None-Match/If-Modified-Since, 412 for failed If-Match/If-Unmodified-Since
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    if response is None:
+        content_type = mimetypes.guess_type(fullpath)[0]
+
+        if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+            # nginx sends the file, and handles Range and conditional requests itself
+            response = HttpResponse(content_type=content_type or 'application/octet-stream')
+            response['X-Accel-Redirect'] = settings.MEDIA_SENDFILE_PREFIX + quote(path)
+        elif settings.MEDIA_SENDFILE == 'x-sendfile':
+            response = HttpResponse(content_type=content_type or 'application/octet-stream')
+            response['X-Sendfile'] = fullpath
+        else:
+            response = _file_response(request, fullpath, st.st_size, etag, last_modified, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+
+    # Content-addressed names never change content
+    if path.startswith('cas/'):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+
+    return response
+
+
+def _file_response(request, fullpath, size, etag, last_modified, content_type):
+    byte_range = _get_range(request, size, etag, last_modified)
+
+    if byte_range is None:
+        # The whole file; the WSGI server's file_wrapper can send it without reading it into Python
+        return FileResponse(open(fullpath, 'rb'), content_type=content_type)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % size
+        return response
+
+    start, end = byte_range
+    response = StreamingHttpResponse(_read_range(fullpath, start, end - start + 1), status=206, content_type=content_type or 'application/octet-stream')
+    response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+    response['Content-Length'] = end - start + 1
+    return response
+
+
+def _get_range(request, size, etag, last_modified):
+    """
+    (start, end) of a single satisfiable byte range, False for an unsatisfiable one, or None to send the whole file:
+    no Range header, several ranges, or an If-Range for another version of the file.
+    """
+    header = request.META.get('HTTP_RANGE', '').strip()
+    match = RANGE_RE.match(header)
+    if not match:
+        return None
+
+    if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # The last n bytes
+        if not last or not int(last) or not size:
+            return False
+        return max(size - int(last), 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(fullpath, start, length):
+    with open(fullpath, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
@@ -1,6 +1,79 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+
+from core.pagination import EstimatedCountPaginator
+from vendor.utilities import mark_items_paid
+
+from .models import Order, OrderItem, OutboxEmail
 
 # Register your models here.
-admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+
+def mark_vendor_paid(modeladmin, request, queryset):
+    if queryset.model is Order:
+        queryset = OrderItem.objects.filter(order__in=queryset)
+
+    count = mark_items_paid(queryset)
+    modeladmin.message_user(request, 'Marked %d items as paid to their vendors.' % count)
+
+mark_vendor_paid.short_description = 'Mark items as paid to their vendors'
+
+
+class OrderItemInline(admin.TabularInline):
+    # Items are written by finalize_order together with the vendor ledgers, so they are shown, not edited
+    model = OrderItem
+    fields = ('product', 'vendor', 'price', 'quantity', 'total', 'vendor_paid')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product', 'vendor')
+
+    def total(self, item):
+        return item.get_total_price()
+
+
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'first_name', 'last_name', 'email', 'status', 'paid_amount', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('email', 'last_name')
+    readonly_fields = ('created_at', 'checkout_id', 'charge_id', 'attempts', 'last_error', 'lines', 'refund_amount')
+    exclude = ('payment_token',)
+    autocomplete_fields = ('vendors',)
+    inlines = (OrderItemInline,)
+    actions = (mark_vendor_paid,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class OrderItemAdmin(admin.ModelAdmin):
+    # Like OrderItemInline: editing items here would change vendor balances behind the ledgers' back,
+    # so payouts only go through the mark_vendor_paid action
+    list_display = ('id', 'order', 'product', 'vendor', 'price', 'quantity', 'vendor_paid')
+    list_select_related = ('order', 'product', 'vendor')
+    list_filter = ('vendor_paid',)
+    search_fields = ('vendor__name', 'product__title')
+    fields = ('order', 'product', 'vendor', 'price', 'quantity', 'vendor_paid')
+    readonly_fields = fields
+    actions = (mark_vendor_paid,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to_email', 'status', 'attempts', 'next_attempt_at')
+    list_filter = ('status',)
+    raw_id_fields = ('order',)
+
+
+admin.site.register(Order, OrderAdmin)
+admin.site.register(OrderItem, OrderItemAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
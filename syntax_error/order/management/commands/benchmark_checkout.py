@@ -0,0 +1,82 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from order.utilities import place_order, process_payments
+from cart.cart import get_cart_key
+from cart.models import CartLine
+from product.models import Category, Product
+from vendor.models import Vendor
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time placing an order (in the request) and charging plus finalizing it (process_payments) for carts '
+        'of different sizes, against the stub gateway. Nothing is written to the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1, 10, 100, 500])
+        parser.add_argument('--vendors', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--gateway-delay', type=float, default=0.2, help='Seconds the stub gateway takes per charge.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic(), override_settings(PAYMENT_GATEWAY='order.payments.StubGateway', PAYMENT_STUB_DELAY=options['gateway_delay']):
+                products = self.seed(max(options['sizes']), options['vendors'])
+
+                self.stdout.write('%8s %16s %16s %16s %16s' % ('lines', 'request queries', 'request ms', 'worker queries', 'worker ms'))
+                for size in options['sizes']:
+                    request, worker = self.run_checkout(products[:size], options['repeat'])
+                    self.stdout.write('%8d %16d %16.2f %16d %16.2f' % (size, request[0], request[1] * 1000, worker[0], worker[1] * 1000))
+
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count, vendor_count):
+        category = Category.objects.create(title='Benchmark', slug='benchmark')
+        vendors = [
+            Vendor.objects.create(name='Benchmark %d' % i, created_by=User.objects.create_user('benchmark-vendor-%d' % i))
+            for i in range(vendor_count)
+        ]
+        Product.objects.bulk_create([
+            Product(category=category, vendor=vendors[i % vendor_count], title='Product %d' % i, slug='benchmark-checkout-%d' % i, price=Decimal('9.99'))
+            for i in range(count)
+        ])
+        return list(Product.objects.filter(category=category).order_by('id'))
+
+    def run_checkout(self, products, repeat):
+        best = {}
+
+        for _ in range(repeat):
+            request = RequestFactory().post('/cart/')
+            request.session = SessionStore()
+            key = get_cart_key(request, create=True)
+            CartLine.objects.bulk_create([CartLine(cart_key=key, product=product, quantity=2) for product in products])
+
+            for stage, run in (
+                ('request', lambda: place_order(request, uuid.uuid4(), 'tok_benchmark', 'First', 'Last', 'customer@example.com', 'Address', '0000', 'Place', '000')),
+                ('worker', lambda: process_payments()),
+            ):
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    run()
+                    elapsed = time.perf_counter() - start
+
+                if stage not in best or elapsed < best[stage][1]:
+                    best[stage] = (len(context), elapsed)
+
+        return best['request'], best['worker']
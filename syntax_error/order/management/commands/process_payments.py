@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from order.utilities import process_payments
+
+
+class Command(BaseCommand):
+    help = 'Charge pending orders and finalize paid ones: order items, vendor ledgers and the notification emails.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for orders instead of exiting.')
+        parser.add_argument('--interval', type=float, default=1, help='Seconds to sleep between polls with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            completed, failed = process_payments(batch_size=options['batch_size'])
+
+            if completed or failed:
+                self.stdout.write('Completed %d, failed or retrying %d' % (completed, failed))
+                continue
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
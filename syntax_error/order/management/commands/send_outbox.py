@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from order.utilities import send_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued order emails in batches over one SMTP connection per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when it is empty.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_outbox(batch_size=options['batch_size'])
+
+            if sent or failed:
+                self.stdout.write('Sent %d, failed %d' % (sent, failed))
+                continue
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0003_order_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['vendor', 'vendor_paid'], name='order_order_vendor__3d27e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'vendor', 'vendor_paid'], name='order_order_order_i_806e5d_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0005_order_payment_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='cart_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0006_order_cart_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='refund_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+    ]
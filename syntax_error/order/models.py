@@ -1,9 +1,26 @@
+from django.core.mail import EmailMultiAlternatives
 from django.db import models
+from django.utils import timezone
 from product.models import Product
 from vendor.models import Vendor
 
 # Create your models here.
 class Order(models.Model):
+    # pending: placed, waiting to be charged; paid: charged, waiting to be finalized;
+    # completed: items, ledgers and emails written, lines removed from the cart;
+    # failed: the charge was declined or kept failing, the customer is emailed
+    PENDING = 'pending'
+    PAID = 'paid'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (PAID, 'Paid'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    )
+
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100) 
     email = models.CharField(max_length=100)
@@ -15,8 +32,32 @@ class Order(models.Model):
     paid_amount = models.DecimalField(max_digits=8, decimal_places=2)
     vendors = models.ManyToManyField(Vendor, related_name="orders")
 
+    # Set by the checkout form, so a resubmitted form finds its order instead of placing another
+    checkout_id = models.UUIDField(unique=True, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    payment_token = models.CharField(max_length=255, blank=True)
+    charge_id = models.CharField(max_length=255, blank=True)
+    # Cart snapshot until finalization turns it into items: [{'product_id', 'vendor_id', 'price', 'quantity'}].
+    # Once completed, only the lines whose product was deleted before finalization are left
+    lines = models.JSONField(default=list, blank=True)
+    # Charged for those left over lines, to be refunded
+    refund_amount = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    # The cart the lines came from; they stay in it until the order is completed
+    cart_key = models.CharField(max_length=64, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def get_idempotency_key(self):
+        # Stable for the order, so a retried charge is never taken twice
+        return 'order-%d-%s' % (self.id, self.checkout_id or '')
 
     def __str__(self):
         return self.first_name
@@ -29,8 +70,54 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2)
     quantity = models.IntegerField(default=1)
 
+    class Meta:
+        # A vendor's unpaid items (payouts, ledgers) and a vendor's items within an order (vendor admin)
+        indexes = [
+            models.Index(fields=['vendor', 'vendor_paid']),
+            models.Index(fields=['order', 'vendor', 'vendor_paid']),
+        ]
+
     def __str__(self):
         return str(self.id)
 
     def get_total_price(self):
         return self.price * self.quantity
+
+class OutboxEmail(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    order = models.ForeignKey(Order, related_name="emails", on_delete=models.CASCADE, blank=True, null=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to_email = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return '%s to %s' % (self.subject, self.to_email)
+
+    def get_message(self, connection=None):
+        msg = EmailMultiAlternatives(self.subject, self.body, self.from_email, [self.to_email], connection=connection)
+        if self.html_body:
+            msg.attach_alternative(self.html_body, 'text/html')
+        return msg
@@ -0,0 +1,64 @@
+import hashlib
+import time
+
+import stripe #pip install stripe
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class PaymentError(Exception):
+    """The charge may succeed if retried later (network trouble, gateway errors)."""
+
+
+class PaymentDeclined(PaymentError):
+    """The charge will not succeed; the order fails."""
+
+
+class PaymentGateway(object):
+    def charge(self, amount, token, idempotency_key, description=''):
+        """Charge amount (Decimal) to token and return the charge id. The same idempotency_key must never charge twice."""
+        raise NotImplementedError
+
+
+class StripeGateway(PaymentGateway):
+    def charge(self, amount, token, idempotency_key, description=''):
+        try:
+            charge = stripe.Charge.create(
+                amount=int(amount * 100), # Amount in Cents
+                currency='RS',
+                description=description,
+                source=token,
+                api_key=settings.STRIPE_SECRET_KEY,
+                idempotency_key=idempotency_key,
+            )
+        except stripe.error.CardError as e:
+            raise PaymentDeclined(str(e))
+        except stripe.error.StripeError as e:
+            raise PaymentError(str(e))
+
+        return charge['id']
+
+
+class StubGateway(PaymentGateway):
+    """
+    Local gateway for development, tests and benchmarks. The token 'tok_declined' is declined,
+    'tok_error' fails as if the gateway were down, anything else is charged after PAYMENT_STUB_DELAY seconds.
+    """
+    charges = {} # idempotency key -> (charge id, amount), shared like a real gateway's records
+
+    def charge(self, amount, token, idempotency_key, description=''):
+        time.sleep(getattr(settings, 'PAYMENT_STUB_DELAY', 0))
+
+        if token == 'tok_declined':
+            raise PaymentDeclined('Your card was declined.')
+        if token == 'tok_error':
+            raise PaymentError('Gateway unavailable')
+
+        if idempotency_key not in self.charges:
+            self.charges[idempotency_key] = ('ch_stub_%s' % hashlib.sha1(idempotency_key.encode()).hexdigest()[:16], amount)
+        return self.charges[idempotency_key][0]
+
+
+def get_payment_gateway():
+    return import_string(settings.PAYMENT_GATEWAY)()
@@ -1,3 +1,358 @@
-from django.test import TestCase
+import socket
+import uuid
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core import mail
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+from cart.cart import get_cart_key
+from cart.models import CartLine
+from product.models import Category, Product
+from vendor.models import Vendor
+
+from .models import Order, OrderItem, OutboxEmail
+from .payments import StubGateway
+from .utilities import get_order_for_notification, place_order, process_payments, send_outbox
+
+
+@override_settings(PAYMENT_GATEWAY='order.payments.StubGateway', PAYMENT_STUB_DELAY=0)
+class OrderTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Category', slug='category')
+        cls.vendors = [
+            Vendor.objects.create(name='Vendor %d' % i, created_by=User.objects.create_user('vendor-%d' % i, 'vendor%d@example.com' % i))
+            for i in range(3)
+        ]
+        cls.products = [
+            Product.objects.create(category=category, vendor=cls.vendors[i % 3], title='Product %d' % i, slug='product-%d' % i, price=Decimal('2.50'))
+            for i in range(20)
+        ]
+
+    def setUp(self):
+        StubGateway.charges.clear()
+
+    def make_request(self, products):
+        request = RequestFactory().post('/cart/')
+        request.session = SessionStore()
+        key = get_cart_key(request, create=True)
+        CartLine.objects.bulk_create([CartLine(cart_key=key, product=product, quantity=2) for product in products])
+        return request
+
+    def place_order(self, request, token='tok_visa', checkout_id=None):
+        return place_order(request, checkout_id or uuid.uuid4(), token, 'First', 'Last', 'customer@example.com', 'Address', '1234', 'Place', '555')
+
+    def checkout(self, request):
+        order = self.place_order(request)
+        process_payments()
+        return get_order_for_notification(order.id)
+
+
+class CheckoutTestCase(OrderTestCase):
+    def test_checkout_creates_items_and_vendors(self):
+        order = self.checkout(self.make_request(self.products))
+
+        self.assertEqual(order.status, Order.COMPLETED)
+        self.assertEqual(order.items.count(), 20)
+        self.assertEqual(set(order.vendors.all()), set(self.vendors))
+        self.assertEqual(order.items.all()[0].price, Decimal('2.50'))
+        self.assertEqual(order.paid_amount, Decimal('100.00'))
+        self.assertEqual(order.phone, '555')
+        self.assertEqual(order.lines, [])
+        self.assertEqual(order.payment_token, '')
+
+    def test_checkout_query_count_is_constant(self):
+        def checkout_queries(products):
+            request = self.make_request(products)
+            with CaptureQueriesContext(connection) as place:
+                order = self.place_order(request)
+            with CaptureQueriesContext(connection) as process:
+                self.assertEqual(process_payments(), (1, 0))
+            self.assertEqual(Order.objects.get(pk=order.pk).status, Order.COMPLETED)
+            return len(place), len(process)
+
+        self.assertEqual(checkout_queries(self.products[:1]), checkout_queries(self.products))
+
+    def test_order_is_prefetched_for_notifications(self):
+        order = self.checkout(self.make_request(self.products))
+
+        with self.assertNumQueries(0):
+            for vendor in order.vendors.all():
+                vendor.created_by.email
+            for item in order.items.all():
+                item.product.title
+                item.vendor == self.vendors[0]
+
+    def test_failed_finalization_leaves_order_paid(self):
+        order = self.place_order(self.make_request(self.products))
+
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                process_payments()
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.PAID)
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(order.vendors.exists())
+
+        # The next run finishes it without charging again
+        with mock.patch.object(StubGateway, 'charge') as charge:
+            self.assertEqual(process_payments(), (1, 0))
+        charge.assert_not_called()
+        self.assertEqual(OrderItem.objects.count(), 20)
+
+    def test_deleted_product_is_kept_for_a_refund(self):
+        order = self.place_order(self.make_request(self.products[:3]))
+        product_id = self.products[0].id
+        Product.objects.filter(pk=product_id).delete()
+
+        with self.assertLogs('order.utilities', 'WARNING') as logs:
+            self.assertEqual(process_payments(), (1, 0))
+        self.assertIn('5.00 to refund', logs.output[0])
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.COMPLETED)
+        self.assertEqual([line['product_id'] for line in order.lines], [product_id])
+        self.assertEqual(order.refund_amount, Decimal('5.00'))
+        self.assertEqual(order.items.count(), 2)
+        self.assertContains(self.client.get('/order/%s/' % order.checkout_id), '$5.00 will be refunded')
+
+
+class PaymentTestCase(OrderTestCase):
+    def test_place_order_is_idempotent(self):
+        request = self.make_request(self.products[:2])
+        checkout_id = uuid.uuid4()
+
+        order = self.place_order(request, checkout_id=checkout_id)
+        self.assertEqual(self.place_order(request, checkout_id=checkout_id), order)
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(order.status, Order.PENDING)
+        self.assertEqual(order.paid_amount, Decimal('10.00'))
+        self.assertFalse(order.items.exists())
+
+    def test_declined_card_fails_the_order(self):
+        order = self.place_order(self.make_request(self.products[:2]), token='tok_declined')
+
+        self.assertEqual(process_payments(), (0, 1))
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.FAILED)
+        self.assertIn('declined', order.last_error)
+        self.assertFalse(OrderItem.objects.exists())
+        # The customer is told, and the cart is still there to try again
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.to_email, email.subject), ('customer@example.com', 'Payment failed'))
+        self.assertEqual(CartLine.objects.count(), 2)
+
+    def test_empty_cart_places_no_order(self):
+        self.assertIsNone(self.place_order(self.make_request([])))
+        self.assertFalse(Order.objects.exists())
+
+    @override_settings(PAYMENT_MAX_ATTEMPTS=2)
+    def test_gateway_error_is_retried_with_backoff(self):
+        order = self.place_order(self.make_request(self.products[:2]), token='tok_error')
+
+        self.assertEqual(process_payments(), (0, 1))
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.PENDING)
+        self.assertEqual(order.attempts, 1)
+        self.assertGreater(order.next_attempt_at, timezone.now())
+
+        # Not due yet
+        self.assertEqual(process_payments(), (0, 0))
+
+        Order.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_payments(), (0, 1))
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.FAILED)
+        self.assertEqual(order.emails.get().subject, 'Payment failed')
+
+    def test_retried_charge_uses_the_same_idempotency_key(self):
+        order = self.place_order(self.make_request(self.products[:2]))
+        gateway = StubGateway()
+
+        first = gateway.charge(order.paid_amount, 'tok_visa', order.get_idempotency_key())
+        self.assertEqual(process_payments(), (1, 0))
+
+        order.refresh_from_db()
+        self.assertEqual(order.charge_id, first)
+        self.assertEqual(len(StubGateway.charges), 1)
+
+    def test_checkout_view_returns_before_charging(self):
+        session = self.client.session
+        session[settings.CART_SESSION_ID] = 'view'
+        session.save()
+        CartLine.objects.create(cart_key='session:view', product=self.products[0], quantity=1)
+
+        data = {
+            'first_name': 'First', 'last_name': 'Last', 'email': 'customer@example.com', 'phone': '555',
+            'address': 'Address', 'zipcode': '1234', 'place': 'Place', 'stripe_token': 'tok_visa', 'checkout_id': str(uuid.uuid4()),
+        }
+        with mock.patch.object(StubGateway, 'charge') as charge:
+            response = self.client.post('/cart/', data)
+            # Submitted twice, as with a double click
+            self.client.post('/cart/', data)
+
+        charge.assert_not_called()
+        order = Order.objects.get()
+        self.assertRedirects(response, '/order/%s/' % order.checkout_id)
+        self.assertEqual(order.status, Order.PENDING)
+        self.assertEqual(order.lines[0]['product_id'], self.products[0].id)
+        self.assertContains(self.client.get(response.url), 'Processing your payment')
+
+        # The cart is only emptied once the order is completed, of what was ordered
+        CartLine.objects.create(cart_key='session:view', product=self.products[1], quantity=1)
+        self.assertEqual(process_payments(), (1, 0))
+        self.assertEqual(list(CartLine.objects.values_list('product', flat=True)), [self.products[1].id])
+        self.assertContains(self.client.get(response.url), 'Thanks for the order.')
+
+    def test_declined_checkout_keeps_the_cart(self):
+        session = self.client.session
+        session[settings.CART_SESSION_ID] = 'view'
+        session.save()
+        CartLine.objects.create(cart_key='session:view', product=self.products[0], quantity=1)
+
+        response = self.client.post('/cart/', {
+            'first_name': 'First', 'last_name': 'Last', 'email': 'customer@example.com', 'phone': '555',
+            'address': 'Address', 'zipcode': '1234', 'place': 'Place', 'stripe_token': 'tok_declined', 'checkout_id': str(uuid.uuid4()),
+        })
+        self.assertEqual(process_payments(), (0, 1))
+
+        self.assertContains(self.client.get(response.url), 'Something went wrong with payment.')
+        self.assertTrue(CartLine.objects.filter(cart_key='session:view').exists())
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboxTestCase(OrderTestCase):
+    def test_checkout_queues_emails_without_sending(self):
+        order = self.checkout(self.make_request(self.products))
+
+        self.assertEqual(order.emails.filter(status=OutboxEmail.PENDING).count(), 4)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_send_outbox_reuses_one_connection(self):
+        self.checkout(self.make_request(self.products))
+
+        with mock.patch('order.utilities.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(send_outbox(), (4, 0))
+
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['customer@example.com', 'vendor0@example.com', 'vendor1@example.com', 'vendor2@example.com'])
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+        self.assertEqual(send_outbox(), (0, 0))
+
+    def test_failed_email_is_retried_with_backoff(self):
+        self.checkout(self.make_request(self.products[:1]))
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=socket.error):
+            self.assertEqual(send_outbox(max_attempts=2), (0, 2))
+
+        email = OutboxEmail.objects.first()
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        # Not due yet
+        self.assertEqual(send_outbox(), (0, 0))
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=socket.error):
+            self.assertEqual(send_outbox(max_attempts=2), (0, 2))
+
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.FAILED).exists())
+
+    @skipUnless(Controller, 'aiosmtpd is not installed')
+    def test_send_outbox_over_smtp(self):
+        class Handler:
+            def __init__(self):
+                self.messages = []
+
+            async def handle_DATA(self, server, session, envelope):
+                self.messages.append(envelope)
+                return '250 OK'
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+
+        handler = Handler()
+        controller = Controller(handler, hostname='127.0.0.1', port=port)
+        controller.start()
+        self.addCleanup(controller.stop)
+
+        self.checkout(self.make_request(self.products))
+
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1', EMAIL_PORT=port, EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD=''):
+            self.assertEqual(send_outbox(), (4, 0))
+
+        self.assertEqual(len(handler.messages), 4)
+
+
+class OrderAdminTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+    def page_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_order_change_page_query_count_is_constant(self):
+        small = self.checkout(self.make_request(self.products[:1]))
+        large = self.checkout(self.make_request(self.products))
+        # The first admin request fills caches the later ones reuse
+        self.client.get('/admin/order/order/%d/change/' % small.pk)
+
+        self.assertEqual(self.page_queries('/admin/order/order/%d/change/' % small.pk), self.page_queries('/admin/order/order/%d/change/' % large.pk))
+
+    def test_item_changelist_query_count_is_constant(self):
+        self.checkout(self.make_request(self.products[:1]))
+        few = self.page_queries('/admin/order/orderitem/')
+
+        self.checkout(self.make_request(self.products))
+        self.assertEqual(self.page_queries('/admin/order/orderitem/'), few)
+
+    def test_items_are_read_only(self):
+        item = self.checkout(self.make_request(self.products[:1])).items.get()
+        url = '/admin/order/orderitem/%d/' % item.pk
+
+        self.client.post(url + 'change/', {'price': '0.01', 'quantity': 100, 'vendor_paid': 'on'})
+        self.assertEqual(self.client.post(url + 'delete/', {'post': 'yes'}).status_code, 403)
+        self.assertEqual(self.client.get('/admin/order/orderitem/add/').status_code, 403)
+
+        item.refresh_from_db()
+        self.assertEqual((item.quantity, item.vendor_paid), (2, False))
+        self.assertNotEqual(item.price, Decimal('0.01'))
+
+    def test_mark_vendor_paid_action(self):
+        order = self.checkout(self.make_request(self.products))
+        items = [item.pk for item in order.items.all() if item.vendor == self.vendors[0]]
+
+        response = self.client.post('/admin/order/orderitem/', {'action': 'mark_vendor_paid', '_selected_action': items})
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(set(OrderItem.objects.filter(vendor_paid=True).values_list('pk', flat=True)), set(items))
+        ledger = self.vendors[0].ledger
+        ledger.refresh_from_db()
+        self.assertEqual((ledger.balance, ledger.paid_amount), (Decimal('0.00'), Decimal('35.00')))
+
+        # From the order list, every item of the order
+        self.client.post('/admin/order/order/', {'action': 'mark_vendor_paid', '_selected_action': [order.pk]})
+        self.assertFalse(OrderItem.objects.filter(vendor_paid=False).exists())
@@ -1,9 +1,10 @@
 from django.urls import path
 
+from . import views
 
 app_name = 'order'
 
 
 urlpatterns = [
-    
+    path('<uuid:checkout_id>/', views.order_status, name='status'),
 ]
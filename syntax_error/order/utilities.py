@@ -1,23 +1,162 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
 from cart.cart import Cart
+from cart.stores import get_cart_store
+from product.models import Product
+from vendor.utilities import credit_vendors
 
 from django.conf import settings
-# for HTML Email
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch
 from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Order, OrderItem, OutboxEmail
+from .payments import PaymentDeclined, PaymentError, get_payment_gateway
+
+logger = logging.getLogger(__name__)
+
+def place_order(request, checkout_id, payment_token, first_name, last_name, email, address, zipcode, place, phone):
+    """
+    Snapshot the cart into a pending order, or return None for an empty cart; charging and finalization
+    happen in process_payments, and the cart is kept until then. A form submitted again with the same
+    checkout_id returns the order it placed the first time.
+    """
+    existing = Order.objects.filter(checkout_id=checkout_id).first()
+    if existing is not None:
+        return existing
+
+    # Prices are snapshotted from the cart, so the order keeps what the customer is charged
+    cart = Cart(request)
+    lines = [
+        {'product_id': item['product'].id, 'vendor_id': item['product'].vendor_id, 'price': str(item['product'].price), 'quantity': item['quantity']}
+        for item in cart
+    ]
+    if not lines:
+        return None
+    amount = sum((Decimal(line['price']) * line['quantity'] for line in lines), Decimal('0.00'))
+
+    try:
+        with transaction.atomic():
+            return Order.objects.create(
+                checkout_id=checkout_id, payment_token=payment_token, lines=lines, paid_amount=amount, cart_key=cart.key or '',
+                first_name=first_name, last_name=last_name, email=email, address=address, zipcode=zipcode, place=place, phone=phone,
+            )
+    except IntegrityError:
+        # The same form was submitted twice at once
+        return Order.objects.get(checkout_id=checkout_id)
+
+def charge_order(order, gateway=None):
+    """Charge a pending order once, whatever happens to this attempt. Returns True when it is paid."""
+    gateway = gateway or get_payment_gateway()
+
+    try:
+        charge_id = gateway.charge(order.paid_amount, order.payment_token, order.get_idempotency_key(), description='Order %d from Multivendor Shop' % order.id)
+    except PaymentDeclined as e:
+        fail_order(order, str(e))
+        return False
+    except PaymentError as e:
+        order.attempts += 1
+        order.last_error = str(e)
+        if order.attempts >= settings.PAYMENT_MAX_ATTEMPTS:
+            fail_order(order, order.last_error)
+            return False
+
+        # Exponential backoff, as for outbox emails
+        order.next_attempt_at = timezone.now() + timedelta(seconds=settings.PAYMENT_RETRY_DELAY * 2 ** (order.attempts - 1))
+        Order.objects.filter(pk=order.pk, status=Order.PENDING).update(attempts=order.attempts, last_error=order.last_error, next_attempt_at=order.next_attempt_at)
+        return False
 
-from .models import Order, OrderItem
+    # The token has done its job; the charge id is all we keep
+    Order.objects.filter(pk=order.pk, status=Order.PENDING).update(status=Order.PAID, charge_id=charge_id, payment_token='', attempts=F('attempts') + 1, last_error='')
+    return True
 
-def checkout(request, first_name, last_name, email, address, zipcode, place, phone, amount):
-    order = Order.objects.create(first_name=first_name, last_name=last_name, email=email, address=address, zipcode=zipcode, place=place, phone=phone, paid_amount=amount)
+def fail_order(order, error):
+    """Fail a pending order and queue the email telling the customer; the cart is left as it was."""
+    with transaction.atomic():
+        if Order.objects.filter(pk=order.pk, status=Order.PENDING).update(status=Order.FAILED, attempts=F('attempts') + 1, last_error=error):
+            order.status = Order.FAILED
+            order.last_error = error
+            notify_payment_failed(order)
+
+def finalize_order(order_id):
+    """
+    Turn a paid order's snapshot into items, credit the vendors and queue the emails, all or nothing.
+    Lines whose product was deleted since checkout stay on the order with their refund_amount.
+    The ordered lines are then taken out of the customer's cart.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().filter(pk=order_id, status=Order.PAID).first()
+        if order is None:
+            # Already finalized by another worker
+            return None
+
+        # A product deleted since the order was placed can't get an item, but it has been paid for
+        products = set(Product.objects.filter(pk__in=[line['product_id'] for line in order.lines]).values_list('pk', flat=True))
+        items = [
+            OrderItem(order=order, product_id=line['product_id'], vendor_id=line['vendor_id'], price=Decimal(line['price']), quantity=line['quantity'])
+            for line in order.lines if line['product_id'] in products
+        ]
+        dropped = [line for line in order.lines if line['product_id'] not in products]
+        refund = sum((Decimal(line['price']) * line['quantity'] for line in dropped), Decimal('0.00'))
+        if dropped:
+            logger.warning('Order %d: products %s were deleted before finalization, %s to refund', order.id, ', '.join(str(line['product_id']) for line in dropped), refund)
+        amounts = {}
+        for item in items:
+            amounts[item.vendor_id] = amounts.get(item.vendor_id, 0) + item.get_total_price()
+
+        # Ledgers first: a vendor's first ledger row is seeded from its existing items
+        credit_vendors(amounts)
+        OrderItem.objects.bulk_create(items)
+
+        vendor_ids = set(amounts)
+        Order.vendors.through.objects.bulk_create([
+            Order.vendors.through(order_id=order.id, vendor_id=vendor_id) for vendor_id in vendor_ids
+        ])
+
+        Order.objects.filter(pk=order.pk).update(status=Order.COMPLETED, lines=dropped, refund_amount=refund)
+        cart_key, lines = order.cart_key, order.lines
+        order = get_order_for_notification(order.id)
+
+        # Queued in the same transaction, sent later by the send_outbox command
+        notify_customer(order)
+        notify_vendor(order)
+
+    if cart_key:
+        # Only what was ordered: anything added to the cart since checkout stays
+        get_cart_store().remove_many(cart_key, [str(line['product_id']) for line in lines])
 
-    for item in Cart(request):
-        OrderItem.objects.create(order=order, product=item['product'], vendor=item['product'].vendor, price=item['product'].price, quantity=item['quantity'])
-        order.vendors.add(item['product'].vendor)
-        
     return order
 
+def process_payments(batch_size=None, gateway=None):
+    """Charge and finalize one batch of due orders, finishing any that were paid but not finalized. Returns (completed, failed)."""
+    batch_size = batch_size or settings.PAYMENT_BATCH_SIZE
+    gateway = gateway or get_payment_gateway()
+    completed = failed = 0
+
+    for order in Order.objects.filter(status=Order.PAID).order_by('id')[:batch_size]:
+        if finalize_order(order.id):
+            completed += 1
+
+    for order in Order.objects.filter(status=Order.PENDING, next_attempt_at__lte=timezone.now()).order_by('next_attempt_at', 'id')[:batch_size]:
+        if charge_order(order, gateway) and finalize_order(order.id):
+            completed += 1
+        else:
+            failed += 1
+
+    return completed, failed
+
+def get_order_for_notification(order_id):
+    # Everything the email templates touch, fetched up front
+    items = OrderItem.objects.select_related('product', 'vendor')
+    return Order.objects.prefetch_related(Prefetch('items', queryset=items), 'vendors__created_by').get(pk=order_id)
+
 def notify_vendor(order):
     from_email = settings.DEFAULT_EMAIL_FROM
+    emails = []
 
     for vendor in order.vendors.all():
         to_email = vendor.created_by.email
@@ -25,9 +164,9 @@ def notify_vendor(order):
         text_content = 'You have a new order!'
         html_content = render_to_string('order/email_notify_vendor.html', {'order': order, 'vendor': vendor})
 
-        msg = EmailMultiAlternatives(subject, text_content, from_email, [to_email])
-        msg.attach_alternative(html_content, 'text/html')
-        msg.send()
+        emails.append(OutboxEmail(order=order, subject=subject, body=text_content, html_body=html_content, from_email=from_email, to_email=to_email))
+
+    OutboxEmail.objects.bulk_create(emails)
 
 def notify_customer(order):
     from_email = settings.DEFAULT_EMAIL_FROM
@@ -37,6 +176,59 @@ def notify_customer(order):
     text_content = 'Thank you for the order!'
     html_content = render_to_string('order/email_notify_customer.html', {'order': order})
 
-    msg = EmailMultiAlternatives(subject, text_content, from_email, [to_email])
-    msg.attach_alternative(html_content, 'text/html')
-    msg.send()
\ No newline at end of file
+    OutboxEmail.objects.create(order=order, subject=subject, body=text_content, html_body=html_content, from_email=from_email, to_email=to_email)
+
+def notify_payment_failed(order):
+    from_email = settings.DEFAULT_EMAIL_FROM
+
+    to_email = order.email
+    subject = 'Payment failed'
+    text_content = 'We could not charge your card for order %d: %s. Your cart has been kept, so you can check out again.' % (order.id, order.last_error)
+    html_content = render_to_string('order/email_payment_failed.html', {'order': order})
+
+    OutboxEmail.objects.create(order=order, subject=subject, body=text_content, html_body=html_content, from_email=from_email, to_email=to_email)
+
+def send_outbox(batch_size=None, max_attempts=None):
+    """Send one batch of due outbox emails over a single connection. Returns (sent, failed)."""
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    max_attempts = max_attempts or settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+
+    now = timezone.now()
+    emails = list(OutboxEmail.objects.filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)[:batch_size])
+    if not emails:
+        return 0, 0
+
+    sent = []
+    failed = []
+    connection = get_connection()
+
+    try:
+        connection.open()
+    except Exception as e:
+        failed = [(email, e) for email in emails]
+    else:
+        try:
+            for email in emails:
+                try:
+                    connection.send_messages([email.get_message(connection)])
+                except Exception as e:
+                    failed.append((email, e))
+                else:
+                    sent.append(email.id)
+        finally:
+            connection.close()
+
+    OutboxEmail.objects.filter(id__in=sent).update(status=OutboxEmail.SENT, attempts=F('attempts') + 1, sent_at=timezone.now(), last_error='')
+
+    for email, error in failed:
+        email.attempts += 1
+        email.last_error = repr(error)
+        if email.attempts >= max_attempts:
+            email.status = OutboxEmail.FAILED
+        else:
+            # Exponential backoff: 1, 2, 4, 8... times the base delay
+            delay = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1)
+            email.next_attempt_at = now + timedelta(seconds=delay)
+    OutboxEmail.objects.bulk_update([email for email, error in failed], ['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+    return len(sent), len(failed)
@@ -1,3 +1,10 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
+
+from .models import Order
 
 # Create your views here.
+def order_status(request, checkout_id):
+    # The checkout id is only known to the browser that checked out
+    order = get_object_or_404(Order, checkout_id=checkout_id)
+
+    return render(request, 'order/status.html', {'order': order})
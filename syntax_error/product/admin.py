@@ -1,8 +1,55 @@
 from django.contrib import admin
+from django.utils.html import format_html, format_html_join
 
 # Register your models here.
 
-from .models import Category, Product
+from core.pagination import EstimatedCountPaginator
 
-admin.site.register(Category)
-admin.site.register(Product)
\ No newline at end of file
+from .models import CatalogImport, Category, Product
+
+
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug', 'ordering')
+    search_fields = ('title',)
+    prepopulated_fields = {'slug': ('title',)}
+
+
+class ProductAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/product/product/change_list.html'
+    list_display = ('title', 'vendor', 'category', 'price', 'image_status', 'added_date')
+    list_select_related = ('vendor', 'category')
+    list_filter = ('image_status',)
+    search_fields = ('title', 'slug')
+    autocomplete_fields = ('vendor', 'category')
+    prepopulated_fields = {'slug': ('title',)}
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class CatalogImportAdmin(admin.ModelAdmin):
+    # Uploads are only queued here; the import_catalog --queued worker imports them
+    list_display = ('id', 'vendor', 'format', 'status', 'created', 'created_at', 'finished_at')
+    list_select_related = ('vendor',)
+    list_filter = ('status',)
+    autocomplete_fields = ('vendor',)
+
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return ('vendor', 'file', 'format')
+        return ('vendor', 'format', 'status', 'created', 'created_at', 'finished_at', 'last_error', 'report')
+
+    def has_add_permission(self, request):
+        return request.user.has_perm('product.add_product')
+
+    def has_change_permission(self, request, obj=None):
+        # The result of an import is shown, not edited
+        return False
+
+    def report(self, catalog_import):
+        rows = format_html_join('', '<tr><td>{}</td><td>{}</td></tr>', catalog_import.errors[:1000])
+        return format_html('<table><thead><tr><th>Row</th><th>Error</th></tr></thead><tbody>{}</tbody></table>', rows)
+
+
+admin.site.register(Category, CategoryAdmin)
+admin.site.register(Product, ProductAdmin)
+admin.site.register(CatalogImport, CatalogImportAdmin)
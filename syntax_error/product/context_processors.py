@@ -1,6 +1,23 @@
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from core.cache import get_version
 from product.models import Category
 
+MENU_CACHE_TIMEOUT = 60 * 60
+
+
+def get_menu_categories():
+    version = get_version('categories')
+    categories = cache.get('menu-categories', version=version)
+
+    if categories is None:
+        categories = list(Category.objects.all())
+        cache.set('menu-categories', categories, MENU_CACHE_TIMEOUT, version=version)
+
+    return categories
+
 
 def menu_categories(request):
-    categories = Category.objects.all()
-    return {'categories': categories}
\ No newline at end of file
+    # Only evaluated by templates that render the menu
+    return {'categories': SimpleLazyObject(get_menu_categories)}
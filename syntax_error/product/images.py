@@ -0,0 +1,35 @@
+# Product image derivatives. Only PIL in here, so render_derivatives can run in a worker process.
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Name: bounding box. retina is the list size at 2x for high-density screens.
+SIZES = {
+    'list': (300, 200),
+    'retina': (600, 400),
+    'detail': (1200, 900),
+}
+
+FORMATS = {
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+def render_derivatives(data):
+    """Return {(size, format): encoded bytes} for the source image bytes."""
+    img = Image.open(BytesIO(data))
+    img = ImageOps.exif_transpose(img)
+    img = img.convert('RGB')
+
+    derivatives = {}
+    for size_name, size in SIZES.items():
+        resized = img.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+
+        for format_name, (pil_format, options) in FORMATS.items():
+            output = BytesIO()
+            resized.save(output, pil_format, **options)
+            derivatives[(size_name, format_name)] = output.getvalue()
+
+    return derivatives
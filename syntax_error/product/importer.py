@@ -0,0 +1,207 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django import forms
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.cache import bump_version
+
+from .models import CatalogImport, Category, Product
+from .utilities import get_unique_slugs
+
+CHUNK_SIZE = 500
+FORMATS = ('csv', 'jsonl')
+
+
+class ImportRowForm(forms.Form):
+    title = forms.CharField(max_length=50)
+    category = forms.SlugField(max_length=55)
+    price = forms.DecimalField(max_digits=6, decimal_places=2, min_value=0)
+    description = forms.CharField(required=False)
+    image_url = forms.URLField(max_length=500, required=False)
+
+
+class ImportReport(object):
+    def __init__(self):
+        self.created = 0
+        self.errors = [] # (row number, message)
+
+    def add_error(self, row, message):
+        self.errors.append((row, message))
+
+    def __str__(self):
+        return 'Created %d products, %d rows with errors' % (self.created, len(self.errors))
+
+
+def decode_lines(f, bad_lines):
+    """
+    Decode a binary file line by line, so one line that isn't UTF-8 doesn't stop the rest.
+    Such lines are decoded with replacement characters and their numbers added to bad_lines.
+    """
+    for number, line in enumerate(f, start=1):
+        if number == 1 and line.startswith(codecs.BOM_UTF8):
+            line = line[len(codecs.BOM_UTF8):]
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError:
+            bad_lines.add(number)
+            yield line.decode('utf-8', 'replace')
+
+
+def read_rows(f, format):
+    """
+    Yield (row number, dict) from a binary file without loading it whole. Rows that can't be read
+    (invalid UTF-8, malformed CSV, unparseable JSON) yield a ValueError to report, and reading goes on.
+    CSV needs a header row; JSON catalogs are JSON Lines, one product object per line.
+    """
+    bad_lines = set()
+    lines = decode_lines(f, bad_lines)
+
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        # Row 1 is the header
+        number = 1
+        while True:
+            first_line = reader.line_num + 1
+            try:
+                row = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                # The reader starts afresh on the next line
+                row = ValueError('Invalid CSV: %s' % e)
+
+            number += 1
+            # A quoted field can span several lines
+            if bad_lines.intersection(range(first_line, reader.line_num + 1)):
+                row = ValueError('Invalid UTF-8')
+            yield number, row
+    elif format == 'jsonl':
+        for number, line in enumerate(lines, start=1):
+            if number in bad_lines:
+                yield number, ValueError('Invalid UTF-8')
+                continue
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = ValueError('Invalid JSON: %s' % e)
+            if not isinstance(row, (dict, ValueError)):
+                row = ValueError('Invalid JSON: Expected an object')
+            yield number, row
+    else:
+        raise ValueError('Unknown catalog format %r' % format)
+
+
+def import_catalog(vendor, rows, chunk_size=CHUNK_SIZE):
+    """
+    Validate and insert (row number, dict) pairs in chunks for vendor.
+    Invalid rows are reported and skipped; the rest of the batch is still imported.
+    """
+    report = ImportReport()
+    rows = iter(rows)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        valid = _validate_chunk(chunk, report)
+        if valid:
+            _create_products(vendor, valid)
+            report.created += len(valid)
+
+    if report.created:
+        # bulk_create sends no signals
+        bump_version('catalog')
+
+    return report
+
+
+def run_catalog_imports(batch_size=10):
+    """
+    Import one batch of queued CatalogImports, oldest first, and delete their files.
+    Returns the imports that finished; one that raises is marked failed and the error propagates.
+    """
+    finished = []
+
+    for catalog_import in CatalogImport.objects.filter(status=CatalogImport.PENDING).select_related('vendor').order_by('id')[:batch_size]:
+        # Claimed first, so two workers never import the same file
+        if not CatalogImport.objects.filter(pk=catalog_import.pk, status=CatalogImport.PENDING).update(status=CatalogImport.RUNNING):
+            continue
+
+        try:
+            with catalog_import.file.open('rb') as f:
+                report = import_catalog(catalog_import.vendor, read_rows(f.file, catalog_import.format))
+        except Exception as e:
+            CatalogImport.objects.filter(pk=catalog_import.pk).update(status=CatalogImport.FAILED, last_error=repr(e), finished_at=timezone.now())
+            raise
+
+        catalog_import.file.delete(save=False)
+        catalog_import.file = ''
+        catalog_import.status = CatalogImport.DONE
+        catalog_import.created = report.created
+        catalog_import.errors = report.errors
+        catalog_import.finished_at = timezone.now()
+        catalog_import.save(update_fields=['file', 'status', 'created', 'errors', 'finished_at'])
+        finished.append(catalog_import)
+
+    return finished
+
+
+def _validate_chunk(chunk, report):
+    forms_by_row = []
+    for number, row in chunk:
+        if isinstance(row, ValueError):
+            report.add_error(number, str(row))
+            continue
+
+        form = ImportRowForm(row)
+        if form.is_valid():
+            forms_by_row.append((number, form.cleaned_data))
+        else:
+            report.add_error(number, '; '.join('%s: %s' % (field, ' '.join(errors)) for field, errors in form.errors.items()))
+
+    # One query for the chunk's categories
+    categories = Category.objects.in_bulk({data['category'] for number, data in forms_by_row}, field_name='slug')
+
+    valid = []
+    for number, data in forms_by_row:
+        if data['category'] not in categories:
+            report.add_error(number, 'category: Unknown category %r' % data['category'])
+        else:
+            valid.append((number, data, categories[data['category']]))
+
+    return valid
+
+
+def _create_products(vendor, valid, attempts=3):
+    for attempt in range(attempts):
+        slugs = get_unique_slugs([data['title'] for number, data, category in valid])
+        products = [
+            Product(
+                category=category,
+                vendor=vendor,
+                title=data['title'],
+                slug=slug,
+                description=data['description'],
+                price=data['price'],
+                image_url=data['image_url'],
+                # Downloaded by fetch_product_images, then picked up by build_product_images
+                image_status=Product.IMAGE_REMOTE if data['image_url'] else '',
+            )
+            for (number, data, category), slug in zip(valid, slugs)
+        ]
+
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create(products)
+            return
+        except IntegrityError:
+            # A product added meanwhile took one of the slugs
+            if attempt == attempts - 1:
+                raise
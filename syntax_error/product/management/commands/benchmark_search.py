@@ -0,0 +1,79 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product.models import Category, Product
+from product.search import LikeSearchBackend, get_search_backend
+from vendor.models import Vendor
+
+WORDS = (
+    'red blue green black white cotton linen wool leather silk shirt pant jacket shoe watch ring '
+    'cake chocolate laptop phone headphone lamp chair table mug bottle bag belt scarf hat glove '
+    'classic modern vintage slim large small soft warm light heavy handmade organic premium'
+).split()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare the indexed search backend with LIKE filtering on a synthetic catalog. Nothing is written to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                start = time.perf_counter()
+                self.seed(options['products'])
+                self.stdout.write('Seeded %d products in %.1fs' % (options['products'], time.perf_counter() - start))
+
+                rng = random.Random(0)
+                queries = [' '.join(rng.sample(WORDS, 2)) for _ in range(options['queries'])]
+                queries += [rng.choice(WORDS)[:3] for _ in range(options['queries'])] # search-as-you-type prefixes
+
+                for backend in (get_search_backend(), LikeSearchBackend()):
+                    timings = []
+                    for query in queries:
+                        start = time.perf_counter()
+                        backend.search(query)
+                        timings.append(time.perf_counter() - start)
+
+                    timings.sort()
+                    self.stdout.write('%-24s p50 %8.2fms  p95 %8.2fms' % (
+                        type(backend).__name__,
+                        timings[len(timings) // 2] * 1000,
+                        timings[int(len(timings) * 0.95)] * 1000,
+                    ))
+
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        rng = random.Random(0)
+        categories = [Category.objects.create(title='Benchmark %d' % i, slug='benchmark-%d' % i) for i in range(20)]
+        vendors = [
+            Vendor.objects.create(name='Benchmark %d' % i, created_by=User.objects.create_user('benchmark-vendor-%d' % i))
+            for i in range(50)
+        ]
+
+        products = []
+        for i in range(count):
+            title = ' '.join(rng.sample(WORDS, 3))
+            products.append(Product(
+                category=rng.choice(categories),
+                vendor=rng.choice(vendors),
+                title=title[:50],
+                slug='benchmark-%d' % i,
+                description=' '.join(rng.choice(WORDS) for _ in range(30)),
+                price=Decimal('9.99'),
+            ))
+        Product.objects.bulk_create(products, batch_size=1000)
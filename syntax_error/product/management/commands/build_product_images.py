@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+
+from product.models import Product
+from product.utilities import build_product_images
+
+
+class Command(BaseCommand):
+    help = 'Build list, retina and detail JPEG/WebP derivatives for products with a pending image.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Backfill: rebuild derivatives for every product that has an image.')
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU).')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for pending images instead of exiting.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls with --loop.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            count = Product.objects.exclude(image='').exclude(image__isnull=True).update(image_status=Product.IMAGE_PENDING)
+            self.stdout.write('Queued %d products' % count)
+
+        # One pool for the whole run: the workers are started once, not for every batch or poll
+        pool = ProcessPoolExecutor(max_workers=options['workers'])
+
+        try:
+            while True:
+                products = list(Product.objects.filter(image_status=Product.IMAGE_PENDING).exclude(image='').order_by('id')[:options['batch_size']])
+
+                if products:
+                    try:
+                        built, failed = build_product_images(products, pool)
+                    except BrokenProcessPool:
+                        # A worker died (out of memory, say); the batch is retried with fresh workers
+                        pool.shutdown(wait=False)
+                        pool = ProcessPoolExecutor(max_workers=options['workers'])
+                        continue
+                    self.stdout.write('Built %d, failed %d' % (built, failed))
+                    continue
+
+                if not options['loop']:
+                    break
+
+                time.sleep(options['interval'])
+        finally:
+            pool.shutdown()
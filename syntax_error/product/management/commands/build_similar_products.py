@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from order.models import OrderItem
+from product.models import SimilarProduct
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the similar products table from products bought in the same order. Run it periodically, e.g. nightly from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-product', type=int, default=8, help='Neighbours kept for each product.')
+        parser.add_argument('--min-score', type=int, default=1, help='Orders two products must share to count as similar.')
+
+    def handle(self, *args, **options):
+        table = OrderItem._meta.db_table
+        per_product = options['per_product']
+
+        # Number of distinct orders containing both products, strongest pairs first
+        sql = '''
+            SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id) AS score
+            FROM {table} a JOIN {table} b ON a.order_id = b.order_id AND a.product_id <> b.product_id
+            GROUP BY a.product_id, b.product_id
+            HAVING COUNT(DISTINCT a.order_id) >= %s
+            ORDER BY a.product_id, score DESC, b.product_id
+        '''.format(table=connection.ops.quote_name(table))
+
+        rows = []
+        kept = {}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [options['min_score']])
+            for product_id, similar_id, score in cursor:
+                if kept.get(product_id, 0) < per_product:
+                    kept[product_id] = kept.get(product_id, 0) + 1
+                    rows.append(SimilarProduct(product_id=product_id, similar_id=similar_id, score=score))
+
+        with transaction.atomic():
+            SimilarProduct.objects.all().delete()
+            SimilarProduct.objects.bulk_create(rows, batch_size=1000)
+
+        self.stdout.write('Stored %d similar products for %d products' % (len(rows), len(kept)))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from product.models import Product
+from product.utilities import fetch_product_images
+
+
+class Command(BaseCommand):
+    help = 'Download the image URLs of imported products; build_product_images then renders their derivatives.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for images to download instead of exiting.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            products = list(Product.objects.filter(image_status=Product.IMAGE_REMOTE).order_by('id')[:options['batch_size']])
+
+            if products:
+                fetched, failed = fetch_product_images(products)
+                self.stdout.write('Fetched %d, failed %d' % (fetched, failed))
+                continue
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
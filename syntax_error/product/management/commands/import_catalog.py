@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.importer import CHUNK_SIZE, FORMATS, import_catalog, read_rows, run_catalog_imports
+from vendor.models import Vendor
+
+
+class Command(BaseCommand):
+    help = (
+        'Import products for a vendor from a CSV or JSON Lines catalog, or with --queued the catalogs uploaded in the admin. '
+        'Rows with errors are reported and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('vendor_id', type=int, nargs='?')
+        parser.add_argument('path', nargs='?')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--queued', action='store_true', help='Run the imports queued in the admin instead.')
+        parser.add_argument('--loop', action='store_true', help='With --queued, keep polling for imports instead of exiting.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls with --loop.')
+
+    def handle(self, *args, **options):
+        if options['queued']:
+            return self.run_queued(options['loop'], options['interval'])
+
+        if options['vendor_id'] is None or options['path'] is None:
+            raise CommandError('Give a vendor id and a path, or --queued')
+
+        try:
+            vendor = Vendor.objects.get(pk=options['vendor_id'])
+        except Vendor.DoesNotExist:
+            raise CommandError('Vendor %d does not exist' % options['vendor_id'])
+
+        format = options['format'] or ('csv' if options['path'].lower().endswith('.csv') else 'jsonl')
+
+        with open(options['path'], 'rb') as f:
+            report = import_catalog(vendor, read_rows(f, format), chunk_size=options['chunk_size'])
+
+        for row, message in report.errors:
+            self.stdout.write('Row %d: %s' % (row, message))
+        self.stdout.write(str(report))
+
+    def run_queued(self, loop, interval):
+        while True:
+            finished = run_catalog_imports()
+
+            for catalog_import in finished:
+                self.stdout.write('Import %d for %s: %s' % (catalog_import.id, catalog_import.vendor, catalog_import))
+            if finished:
+                continue
+
+            if not loop:
+                break
+
+            time.sleep(interval)
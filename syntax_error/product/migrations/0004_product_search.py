@@ -0,0 +1,72 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE product_search USING fts5(
+        title, description,
+        content='product_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER product_search_insert AFTER INSERT ON product_product BEGIN
+        INSERT INTO product_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER product_search_delete AFTER DELETE ON product_product BEGIN
+        INSERT INTO product_search(product_search, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER product_search_update AFTER UPDATE OF title, description ON product_product BEGIN
+        INSERT INTO product_search(product_search, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO product_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO product_search(product_search) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER product_search_update',
+    'DROP TRIGGER product_search_delete',
+    'DROP TRIGGER product_search_insert',
+    'DROP TABLE product_search',
+]
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE product_product ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX product_product_search_vector ON product_product USING GIN (search_vector)',
+]
+
+POSTGRES_BACKWARD = [
+    'DROP INDEX product_product_search_vector',
+    'ALTER TABLE product_product DROP COLUMN search_vector',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_product_derivatives'),
+    ]
+
+    # The search index lives outside the models: an FTS5 table on SQLite, a generated column on Postgres
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar', to='product.product')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='product.product')),
+            ],
+            options={
+                'ordering': ['-score', 'similar'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='similarproduct',
+            index=models.Index(fields=['product', '-score'], name='product_sim_product_d8b141_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_similarproduct'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'added_date', 'id'], name='product_pro_categor_463956_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['vendor', 'added_date', 'id'], name='product_pro_vendor__2af75d_idx'),
+        ),
+    ]
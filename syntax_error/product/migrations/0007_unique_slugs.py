@@ -0,0 +1,93 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+# Rebuilding product_product on SQLite to add the unique constraint drops the triggers from 0004
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_insert AFTER INSERT ON product_product BEGIN
+        INSERT INTO product_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_delete AFTER DELETE ON product_product BEGIN
+        INSERT INTO product_search(product_search, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_update AFTER UPDATE OF title, description ON product_product BEGIN
+        INSERT INTO product_search(product_search, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO product_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+
+def dedupe_slugs(apps, schema_editor):
+    # Later duplicates get -2, -3, ... so the unique constraints can be added
+    for model_name in ('Category', 'Product'):
+        model = apps.get_model('product', model_name)
+        taken = set(model.objects.values_list('slug', flat=True))
+        seen = set()
+
+        for pk, slug in model.objects.order_by('id').values_list('id', 'slug'):
+            if slug not in seen:
+                seen.add(slug)
+                continue
+
+            n = 2
+            while '%s-%d' % (slug[:50], n) in taken:
+                n += 1
+            new_slug = '%s-%d' % (slug[:50], n)
+            taken.add(new_slug)
+            seen.add(new_slug)
+            model.objects.filter(pk=pk).update(slug=new_slug)
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_triggers),
+        migrations.RunPython(dedupe_slugs, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='similarproduct',
+            options={'ordering': ['-score', 'similar_id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='similarproduct',
+            name='product_sim_product_d8b141_idx',
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(max_length=55, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='slug',
+            field=models.SlugField(max_length=55, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['ordering'], name='product_cat_orderin_5b60dc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['added_date'], name='product_pro_added_d_257e82_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='similarproduct',
+            index=models.Index(fields=['product', '-score', 'similar'], name='product_sim_product_48ddb0_idx'),
+        ),
+        migrations.RunPython(create_triggers, migrations.RunPython.noop),
+    ]
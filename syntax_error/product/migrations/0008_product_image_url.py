@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+# Adding the column rebuilds product_product on SQLite, which drops the triggers from 0004
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_insert AFTER INSERT ON product_product BEGIN
+        INSERT INTO product_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_delete AFTER DELETE ON product_product BEGIN
+        INSERT INTO product_search(product_search, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_update AFTER UPDATE OF title, description ON product_product BEGIN
+        INSERT INTO product_search(product_search, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO product_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_unique_slugs'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_triggers),
+        migrations.AddField(
+            model_name='product',
+            name='image_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('remote', 'Waiting for download'), ('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, max_length=10),
+        ),
+        migrations.RunPython(create_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import product.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendor', '0002_vendorledger'),
+        ('product', '0008_product_image_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(help_text='CSV with a header row, or JSON Lines. Columns: title, category (slug), price, description, image_url.', storage=product.models.CatalogImportStorage(), upload_to='%Y/%m/')),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('created', models.IntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_imports', to='vendor.vendor')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='catalogimport',
+            index=models.Index(fields=['status', 'id'], name='product_cat_status_453476_idx'),
+        ),
+    ]
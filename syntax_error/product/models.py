@@ -1,9 +1,7 @@
-# Form Images
-from io import BytesIO
-from os import name
-from PIL import Image
-from django.core.files import File
+import os
 
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from vendor.models import Vendor
 
@@ -11,58 +9,150 @@ from vendor.models import Vendor
 # Create your models here.
 class Category(models.Model):
     title = models.CharField(max_length=50)
-    slug = models.SlugField(max_length=55)
+    slug = models.SlugField(max_length=55, unique=True)
     ordering = models.IntegerField(default=0)
 
     class Meta:
         ordering = ['ordering']
+        indexes = [
+            models.Index(fields=['ordering']),
+        ]
 
     def __str__(self):
         return self.title
 
 
 class Product(models.Model):
+    IMAGE_REMOTE = 'remote'
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_REMOTE, 'Waiting for download'),
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     vendor = models.ForeignKey(Vendor, related_name="products", on_delete=models.CASCADE)
     title = models.CharField(max_length=50)
-    slug = models.SlugField(max_length=55)
+    slug = models.SlugField(max_length=55, unique=True)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=6, decimal_places=2)
     added_date = models.DateTimeField(auto_now_add=True)
     image = models.ImageField(upload_to='uploads/', blank=True, null=True)
     thumbnail = models.ImageField(upload_to='uploads/', blank=True, null=True) # Change uploads to thumbnails 
+    # Catalog imports give an image URL; the fetch_product_images worker downloads it into image
+    image_url = models.URLField(max_length=500, blank=True)
+    # Set by the build_product_images worker: {'source': image name, 'files': [names], size: {format: url}}
+    derivatives = models.JSONField(default=dict, blank=True)
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, blank=True, db_index=True)
 
     class Meta:
         ordering = ['-added_date']
+        # Listing pages seek on (added_date, id) within a category or vendor; the frontpage takes the newest overall
+        indexes = [
+            models.Index(fields=['added_date']),
+            models.Index(fields=['category', 'added_date', 'id']),
+            models.Index(fields=['vendor', 'added_date', 'id']),
+        ]
 
     def __str__(self):
         return self.title
 
-    
+    def save(self, *args, **kwargs):
+        # A new or replaced image queues the product for the derivative worker
+        if not self.image:
+            self.derivatives = {}
+            self.image_status = self.IMAGE_REMOTE if self.image_url else ''
+        elif self.image.name != self.derivatives.get('source'):
+            self.image_status = self.IMAGE_PENDING
+
+        super().save(*args, **kwargs)
+
+    def get_image_url(self, size, format='jpeg'):
+        return self.derivatives.get(size, {}).get(format, '')
+
     def get_thumbnail(self):
-        if self.thumbnail:
+        # Never decodes images: derivatives are built in the background
+        if self.get_image_url('list'):
+            return self.get_image_url('list')
+        elif self.thumbnail:
             return self.thumbnail.url
+        elif self.image:
+            return self.image.url
         else:
-            if self.image:
-                self.thumbnail = self.make_thumbnail(self.image)
-                self.save()
-                return self.thumbnail.url
-            
-            else:
-                # Default Image
-                return 'https://via.placeholder.com/240x180.jpg'
-    
-    # Generating Thumbnail - Thumbnail is created when get_thumbnail is called
-    def make_thumbnail(self, image, size=(300, 200)):
-        img = Image.open(image)
-        img.convert('RGB')
-        img.thumbnail(size)
+            # Default Image
+            return 'https://via.placeholder.com/240x180.jpg'
+
+
+class SimilarProduct(models.Model):
+    # Rebuilt by the build_similar_products command from products bought together
+    product = models.ForeignKey(Product, related_name='similar', on_delete=models.CASCADE)
+    similar = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    score = models.IntegerField()
+
+    class Meta:
+        ordering = ['-score', 'similar_id']
+        indexes = [
+            models.Index(fields=['product', '-score', 'similar']),
+        ]
+
+    def __str__(self):
+        return '%s -> %s' % (self.product, self.similar)
+
+
+class CatalogImportStorage(FileSystemStorage):
+    # CATALOG_IMPORT_ROOT is read on every use rather than when the model is loaded
+    @property
+    def base_location(self):
+        return settings.CATALOG_IMPORT_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
 
-        thumb_io = BytesIO()
-        img.save(thumb_io, 'JPEG', quality=85)
 
-        thumbnail = File(thumb_io, name=image.name)
+class CatalogImport(models.Model):
+    # Queued by the admin and run by import_catalog --queued, which deletes the file when it is done.
+    # A worker killed mid-import leaves its import running; its rows may be partly imported.
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
 
-        return thumbnail
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
 
+    FORMAT_CHOICES = (
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    )
 
+    vendor = models.ForeignKey(Vendor, related_name='catalog_imports', on_delete=models.CASCADE)
+    file = models.FileField(upload_to='%Y/%m/', storage=CatalogImportStorage(), help_text='CSV with a header row, or JSON Lines. Columns: title, category (slug), price, description, image_url.')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created = models.IntegerField(default=0)
+    # [[row number, message]] for the rows that were skipped
+    errors = models.JSONField(default=list, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        if self.status == self.DONE:
+            return 'Created %d products, %d rows with errors' % (self.created, len(self.errors))
+        return 'Catalog import %d: %s' % (self.id, self.get_status_display())
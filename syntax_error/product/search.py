@@ -0,0 +1,197 @@
+import re
+
+from django.db import connection
+from django.db.models import Count, Q
+
+from vendor.models import Vendor
+
+from .models import Category, Product
+
+PER_PAGE = 20
+MAX_PAGE = 50
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())
+
+
+class SearchResults(object):
+    def __init__(self, products, total, page, per_page, facets):
+        self.products = products
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+        self.facets = facets
+
+    def __iter__(self):
+        return iter(self.products)
+
+    def __len__(self):
+        return len(self.products)
+
+    def has_previous(self):
+        return self.page > 1
+
+    def has_next(self):
+        return self.page * self.per_page < self.total and self.page < MAX_PAGE
+
+    def previous_page_number(self):
+        return self.page - 1
+
+    def next_page_number(self):
+        return self.page + 1
+
+
+class SearchBackend(object):
+    """
+    Ranked product search with category/vendor facets.
+
+    Subclasses implement _match(), returning (ranked product ids for the page,
+    total, {'category': {id: count}, 'vendor': {id: count}} or None without facets).
+    """
+
+    def search(self, query, category=None, vendor=None, page=1, per_page=PER_PAGE, facets=True):
+        tokens = tokenize(query)
+        page = min(max(page, 1), MAX_PAGE)
+
+        if not tokens:
+            return SearchResults([], 0, page, per_page, {'category': [], 'vendor': []})
+
+        ids, total, facet_counts = self._match(tokens, category, vendor, (page - 1) * per_page, per_page, facets)
+
+        products = Product.objects.select_related('category', 'vendor').in_bulk(ids)
+        products = [products[pk] for pk in ids if pk in products]
+
+        facets = self._load_facets(facet_counts) if facets else {'category': [], 'vendor': []}
+
+        return SearchResults(products, total, page, per_page, facets)
+
+    def _load_facets(self, facets):
+        categories = Category.objects.in_bulk(list(facets['category']))
+        vendors = Vendor.objects.in_bulk(list(facets['vendor']))
+
+        return {
+            'category': [(categories[pk], count) for pk, count in facets['category'].items() if pk in categories],
+            'vendor': [(vendors[pk], count) for pk, count in facets['vendor'].items() if pk in vendors],
+        }
+
+    def _count_facets(self, matches, filters):
+        # Each facet counts matches under the other filters, so its options stay visible
+        facet_counts = {}
+        for facet, column in (('category', 'category_id'), ('vendor', 'vendor_id')):
+            others = {key: value for key, value in filters.items() if key != column}
+            facet_counts[facet] = dict(matches.filter(**others).order_by().values_list(column).annotate(count=Count('id')))
+        return facet_counts
+
+    def _filters(self, category, vendor):
+        filters = {}
+        if category is not None:
+            filters['category_id'] = category
+        if vendor is not None:
+            filters['vendor_id'] = vendor
+        return filters
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    FTS5 index product_search, kept in sync with product_product by triggers (see migration 0004).
+    Most schema changes to Product rebuild the table on SQLite and drop the triggers, so those
+    migrations recreate them with their own copy of the SQL (see 0007 and 0008).
+    """
+
+    # bm25 column weights: a title match counts ten times a description match
+    RANK = 'bm25(product_search, 10.0, 1.0)'
+
+    def match_expression(self, tokens):
+        # Quoted so user input can't use FTS5 syntax; the last word is a prefix for search-as-you-type
+        terms = ['"%s"' % token for token in tokens]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def _match(self, tokens, category, vendor, offset, limit, facets):
+        match = self.match_expression(tokens)
+        filters = self._filters(category, vendor)
+
+        def where(exclude=None):
+            sql = ['product_search MATCH %s']
+            params = [match]
+            for column, value in filters.items():
+                if column != exclude:
+                    sql.append('p.%s = %%s' % column)
+                    params.append(value)
+            return ' AND '.join(sql), params
+
+        base = 'FROM product_search JOIN product_product p ON p.id = product_search.rowid WHERE '
+
+        with connection.cursor() as cursor:
+            sql, params = where()
+            cursor.execute('SELECT p.id ' + base + sql + ' ORDER BY ' + self.RANK + ', p.id LIMIT %s OFFSET %s', params + [limit, offset])
+            ids = [row[0] for row in cursor.fetchall()]
+
+            cursor.execute('SELECT COUNT(*) ' + base + sql, params)
+            total = cursor.fetchone()[0]
+
+            if not facets:
+                return ids, total, None
+
+            # Each facet counts matches under the other filters, so its options stay visible
+            facet_counts = {}
+            for facet, column in (('category', 'category_id'), ('vendor', 'vendor_id')):
+                sql, params = where(exclude=column)
+                cursor.execute('SELECT p.%s, COUNT(*) %s%s GROUP BY p.%s' % (column, base, sql, column), params)
+                facet_counts[facet] = dict(cursor.fetchall())
+
+        return ids, total, facet_counts
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Generated tsvector column product_product.search_vector with a GIN index (see migration 0004)."""
+
+    def tsquery(self, tokens):
+        terms = list(tokens)
+        terms[-1] += ':*'
+        return ' & '.join(terms)
+
+    def _matches(self, tokens):
+        return Product.objects.extra(
+            where=["product_product.search_vector @@ to_tsquery('english', %s)"],
+            params=[self.tsquery(tokens)],
+        )
+
+    def _match(self, tokens, category, vendor, offset, limit, facets):
+        matches = self._matches(tokens)
+        filters = self._filters(category, vendor)
+        filtered = matches.filter(**filters)
+
+        ids = list(
+            filtered.extra(
+                select={'rank': "ts_rank_cd(product_product.search_vector, to_tsquery('english', %s))"},
+                select_params=[self.tsquery(tokens)],
+            ).order_by('-rank', 'id').values_list('id', flat=True)[offset:offset + limit]
+        )
+
+        return ids, filtered.count(), self._count_facets(matches, filters) if facets else None
+
+
+class LikeSearchBackend(SearchBackend):
+    """Unindexed fallback for other databases: every word must appear in the title or description."""
+
+    def _match(self, tokens, category, vendor, offset, limit, facets):
+        matches = Product.objects.all()
+        for token in tokens:
+            matches = matches.filter(Q(title__icontains=token) | Q(description__icontains=token))
+
+        filters = self._filters(category, vendor)
+        filtered = matches.filter(**filters)
+        ids = list(filtered.order_by('-added_date', 'id').values_list('id', flat=True)[offset:offset + limit])
+
+        return ids, filtered.count(), self._count_facets(matches, filters) if facets else None
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    return BACKENDS.get(connection.vendor, LikeSearchBackend)()
@@ -1,3 +1,456 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from http.client import IncompleteRead
+from io import BytesIO, StringIO
+from urllib.parse import quote
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from order.models import Order, OrderItem
+from vendor.models import Vendor
+
+from .images import SIZES, render_derivatives
+from .importer import import_catalog, read_rows
+from .models import CatalogImport, Category, Product, SimilarProduct
+from .search import LikeSearchBackend, get_search_backend
+from .utilities import download_image, fetch_product_images, get_similar_products, sample_category_products
+
+
+def make_image(size=(1600, 1200), format='JPEG'):
+    output = BytesIO()
+    Image.new('RGB', size, 'red').save(output, format)
+    return output.getvalue()
+
+
+class ProductTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('vendor', 'vendor@example.com', 'password')
+        cls.vendor = Vendor.objects.create(name='Vendor', created_by=user)
+        cls.category = Category.objects.create(title='Category', slug='category')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_product(self, slug='product', **kwargs):
+        return Product.objects.create(category=self.category, vendor=self.vendor, title=slug.title(), slug=slug, price=Decimal('10.00'), **kwargs)
+
+
+class ImageDerivativeTestCase(ProductTestCase):
+    def test_render_derivatives(self):
+        derivatives = render_derivatives(make_image(format='PNG'))
+
+        self.assertEqual(len(derivatives), len(SIZES) * 2)
+        for (size, format), data in derivatives.items():
+            img = Image.open(BytesIO(data))
+            self.assertEqual(img.format, format.upper())
+            self.assertLessEqual(img.size, SIZES[size])
+
+    def test_upload_queues_and_worker_builds(self):
+        product = self.create_product(image=SimpleUploadedFile('cake.jpg', make_image()))
+        self.assertEqual(product.image_status, Product.IMAGE_PENDING)
+        self.assertEqual(product.get_thumbnail(), product.image.url)
+
+        call_command('build_product_images', '--workers', '1', stdout=StringIO())
+
+        product.refresh_from_db()
+        self.assertEqual(product.image_status, Product.IMAGE_READY)
+        self.assertEqual(product.derivatives['source'], product.image.name)
+        self.assertEqual(product.get_thumbnail(), product.thumbnail.url)
+        self.assertIn(product.thumbnail.name, product.derivatives['files'])
+        self.assertTrue(product.get_image_url('retina', 'webp').endswith('.webp'))
+        self.assertEqual(Image.open(product.thumbnail.path).size, (267, 200))
+
+        # Saving again without a new image keeps the derivatives
+        product.title = 'Renamed'
+        product.save()
+        self.assertEqual(product.image_status, Product.IMAGE_READY)
+
+        product.image = SimpleUploadedFile('other.jpg', make_image())
+        product.save()
+        self.assertEqual(product.image_status, Product.IMAGE_PENDING)
+
+    def test_rendering_never_decodes_images(self):
+        self.create_product(image=SimpleUploadedFile('cake.jpg', make_image()))
+        self.create_product(slug='plain')
+
+        with mock.patch('PIL.Image.open', side_effect=AssertionError('PIL used while rendering')):
+            response = self.client.get('/product/category/')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_backfill_and_broken_images(self):
+        product = self.create_product(image=SimpleUploadedFile('cake.jpg', make_image()))
+        broken = self.create_product(slug='broken', image=SimpleUploadedFile('broken.jpg', b'not an image'))
+        Product.objects.update(image_status='')
+
+        # One batch per product, all through one pool
+        with mock.patch('product.management.commands.build_product_images.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            call_command('build_product_images', '--all', '--workers', '1', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(pool.call_count, 1)
+
+        self.assertEqual(Product.objects.get(pk=product.pk).image_status, Product.IMAGE_READY)
+        self.assertEqual(Product.objects.get(pk=broken.pk).image_status, Product.IMAGE_FAILED)
+
+
+class SearchTestCase(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_category = Category.objects.create(title='Other', slug='other')
+        self.shirt = self.create_product('checked-shirt', description='A warm cotton shirt')
+        self.pant = self.create_product('pant', description='Goes well with a shirt')
+        self.cake = Product.objects.create(category=self.other_category, vendor=self.vendor, title='Chocolate Cake', slug='chocolate-cake', price=Decimal('5.00'), description='Sweet')
+
+    def search(self, query, **kwargs):
+        return get_search_backend().search(query, **kwargs)
+
+    def test_title_matches_rank_first(self):
+        results = self.search('shirt')
+
+        self.assertEqual(results.products, [self.shirt, self.pant])
+        self.assertEqual(results.total, 2)
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.search('choc').products, [self.cake])
+        self.assertEqual(self.search('checked sh').products, [self.shirt])
+        self.assertEqual(self.search('sh"irt OR').products, [])
+
+    def test_index_follows_changes(self):
+        self.cake.title = 'Vanilla Cake'
+        self.cake.save()
+        self.assertEqual(self.search('chocolate').products, [])
+        self.assertEqual(self.search('vanilla').products, [self.cake])
+
+        Product.objects.filter(pk=self.cake.pk).update(description='with chocolate')
+        self.assertEqual(self.search('chocolate').products, [self.cake])
+
+        self.cake.delete()
+        self.assertEqual(self.search('vanilla').products, [])
+
+    def test_facets_and_filters(self):
+        Product.objects.create(category=self.other_category, vendor=self.vendor, title='Shirt Cake', slug='shirt-cake', price=Decimal('1.00'))
+
+        results = self.search('shirt', category=self.category.id)
+        self.assertEqual(results.total, 2)
+        self.assertEqual(dict(results.facets['category']), {self.category: 2, self.other_category: 1})
+        self.assertEqual(dict(results.facets['vendor']), {self.vendor: 2})
+
+    def test_pagination(self):
+        for i in range(25):
+            self.create_product('shirt-%d' % i)
+
+        first = self.search('shirt', per_page=10)
+        third = self.search('shirt', page=3, per_page=10)
+
+        self.assertEqual(first.total, 27)
+        self.assertTrue(first.has_next())
+        self.assertEqual(len(third), 7)
+        self.assertFalse(third.has_next())
+
+    def test_like_backend_matches_index(self):
+        self.assertEqual(set(LikeSearchBackend().search('shirt').products), set(self.search('shirt').products))
+
+    def test_search_views(self):
+        response = self.client.get('/product/search', {'query': 'shirt'})
+        self.assertEqual(list(response.context['products']), [self.shirt, self.pant])
+
+        response = self.client.get('/product/search/suggest', {'query': 'choc'})
+        self.assertEqual(response.json(), {'suggestions': [{'title': 'Chocolate Cake', 'url': '/product/other/chocolate-cake/'}]})
+
+
+class SimilarProductsTestCase(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [self.create_product('product-%d' % i) for i in range(10)]
+
+    def order(self, *products):
+        order = Order.objects.create(first_name='First', last_name='Last', email='a@example.com', address='Address', zipcode='1234', place='Place', phone='555', paid_amount=0)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, vendor=self.vendor, price=product.price)
+
+    def test_co_purchases_rank_first(self):
+        a, b, c, d = self.products[:4]
+        self.order(a, b, c)
+        self.order(a, b)
+        self.order(a, d)
+        self.order(a, d)
+        self.order(a, d)
+
+        call_command('build_similar_products', stdout=StringIO())
+
+        self.assertEqual(list(SimilarProduct.objects.filter(product=a).values_list('similar', 'score')), [(d.id, 3), (b.id, 2), (c.id, 1)])
+
+        similar = get_similar_products(a, 4)
+        self.assertEqual(similar[:3], [d, b, c])
+        self.assertEqual(len(similar), 4)
+        self.assertEqual(len(set(similar)), 4)
+        self.assertNotIn(a, similar)
+
+    def test_category_fallback_is_sampled(self):
+        product = self.products[0]
+
+        # Bounds and one range query, plus one when it wraps around, however large the category
+        for start in (self.products[1].id, self.products[-1].id):
+            with mock.patch('random.randint', return_value=start), CaptureQueriesContext(connection) as context:
+                similar = sample_category_products(product.category_id, 4, [product.id])
+            self.assertEqual(len(context), 2 if start == self.products[1].id else 3)
+
+        self.assertEqual(len(set(similar)), 4)
+        self.assertNotIn(product, similar)
+        self.assertEqual(len(sample_category_products(product.category_id, 20, [product.id])), 9)
+
+    def test_product_page(self):
+        response = self.client.get('/product/category/product-0/')
+
+        self.assertEqual(len(response.context['similar_products']), 4)
+
+
+class MenuCacheTestCase(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.create_product('product')
+
+    def page_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        return [query['sql'] for query in context.captured_queries]
+
+    def category_queries(self, url):
+        return [sql for sql in self.page_queries(url) if 'FROM "product_category"' in sql and 'WHERE' not in sql]
+
+    def test_menu_is_cached_until_categories_change(self):
+        self.assertEqual(len(self.category_queries('/')), 1)
+        self.assertEqual(len(self.category_queries('/')), 0)
+
+        Category.objects.create(title='New', slug='new')
+        self.assertEqual(len(self.category_queries('/')), 1)
+        self.assertContains(self.client.get('/'), '/product/new/')
+
+        Category.objects.get(slug='new').delete()
+        self.assertNotContains(self.client.get('/'), '/product/new/')
+
+    def test_pages_without_menu_skip_it(self):
+        # Before: the admin and error pages queried every category too
+        self.assertEqual(self.page_queries('/admin/login/'), [])
+        self.assertEqual(self.category_queries('/vendor/999/'), [])
+
+    def test_browsing_without_cart_writes_no_session(self):
+        # Before: building the cart stored an empty one, saving a session row per visitor
+        self.assertFalse([sql for sql in self.page_queries('/') if 'django_session' in sql])
+        self.assertNotIn('sessionid', self.client.cookies)
+
+    def test_query_count_per_page(self):
+        pages = {
+            '/': 2,                          # newest products with categories, menu
+            '/product/category/': 3,         # category, page of products, menu
+            '/product/category/product/': 8, # product, vendor, similar products (bounds, seek, wrap around), menu
+        }
+        for url, count in pages.items():
+            cache.clear()
+            self.assertLessEqual(len(self.page_queries(url)), count, url)
+
+            # Warm: the menu comes from the cache
+            self.assertLessEqual(len(self.page_queries(url)), count - 1, url)
+
+
+class ListingTestCase(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.products = [self.create_product('product-%d' % i) for i in range(45)]
+        # Same timestamp for a run of products, so the id tie-break matters
+        Product.objects.filter(pk__in=[p.pk for p in self.products[10:30]]).update(added_date=self.products[10].added_date)
+
+    def walk(self, url):
+        seen = []
+        counts = []
+        while url:
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            counts.append(len(context))
+
+            page = response.context['products']
+            seen.extend(product.pk for product in page)
+            url = '%s?cursor=%s' % (url.split('?')[0], quote(page.next_cursor)) if page.has_next() else None
+        return seen, counts
+
+    def test_category_pages_cover_every_product_once(self):
+        seen, counts = self.walk('/product/category/')
+
+        self.assertEqual(sorted(seen), sorted(p.pk for p in self.products))
+        self.assertEqual(len(counts), 3)
+        self.assertEqual(len(set(counts)), 1)
+
+    def test_vendor_pages(self):
+        seen, counts = self.walk('/vendor/%d/' % self.vendor.pk)
+
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len(set(counts)), 1)
+
+    def test_invalid_cursors_share_the_first_page_cache(self):
+        self.client.get('/product/category/')
+
+        for cursor in ('junk', 'junk-2', '2020-01-01,x'):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/product/category/?cursor=%s' % cursor)
+            self.assertEqual(response.context['cursor'], '')
+            self.assertFalse([query for query in context.captured_queries if 'FROM "product_product"' in query['sql']])
+
+    def test_cached_fragment_skips_product_query(self):
+        self.client.get('/product/category/')
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/product/category/')
+        self.assertFalse([query for query in context.captured_queries if 'FROM "product_product"' in query['sql']])
+
+        product = self.products[-1]
+        product.title = 'Renamed Product'
+        product.save()
+        self.assertContains(self.client.get('/product/category/'), 'Renamed Product')
+        self.assertContains(self.client.get('/'), 'Renamed Product')
+
+
+class CatalogImportTestCase(ProductTestCase):
+    CSV = (
+        'title,category,price,description,image_url\n'
+        'Cake,category,10.00,Chocolate,https://example.com/images/cake.jpg\n'
+        'Cake,category,12.00,,\n'
+        ',category,1.00,,\n'
+        'Shirt,unknown,5.00,,\n'
+        'Mug,category,cheap,,\n'
+    )
+
+    def test_csv_rows_with_errors_are_skipped(self):
+        self.create_product('cake')
+
+        report = import_catalog(self.vendor, read_rows(BytesIO(self.CSV.encode()), 'csv'), chunk_size=2)
+
+        self.assertEqual(report.created, 2)
+        self.assertEqual([row for row, message in report.errors], [4, 5, 6])
+        self.assertIn('title', report.errors[0][1])
+        self.assertIn('Unknown category', report.errors[1][1])
+        self.assertIn('price', report.errors[2][1])
+
+        imported = Product.objects.filter(vendor=self.vendor, title='Cake').exclude(slug='cake').order_by('id')
+        self.assertEqual([p.slug for p in imported], ['cake-2', 'cake-3'])
+        self.assertEqual(imported[0].image_status, Product.IMAGE_REMOTE)
+        self.assertEqual(imported[1].image_status, '')
+
+    def test_unreadable_rows_are_reported(self):
+        data = b'\xef\xbb\xbf' + self.CSV.encode().replace(b'Chocolate', b'Choc\xff') + b'Lamp,category,3.00,' + b'x' * 200000 + b',\nVase,category,4.00,,\n'
+        report = import_catalog(self.vendor, read_rows(BytesIO(data), 'csv'))
+
+        errors = dict(report.errors)
+        self.assertEqual(sorted(errors), [2, 4, 5, 6, 7])
+        self.assertEqual(errors[2], 'Invalid UTF-8')
+        # Over csv.field_size_limit()
+        self.assertIn('Invalid CSV', errors[7])
+        # Rows after the bad ones are still imported
+        self.assertTrue(Product.objects.filter(title='Vase').exists())
+
+        report = import_catalog(self.vendor, read_rows(BytesIO(b'{"title": "Caf\xe9"}\n{"title": "Bowl", "category": "category", "price": 2}\n'), 'jsonl'))
+        self.assertEqual(report.errors, [(1, 'Invalid UTF-8')])
+        self.assertEqual(report.created, 1)
+
+    def test_jsonl_and_chunked_queries(self):
+        lines = ['{"title": "Product %d", "category": "category", "price": 1.5}' % i for i in range(1200)]
+        lines[10] = '{"title": '
+        lines[11] = '[1, 2]'
+        data = ('\n'.join(lines) + '\n').encode()
+
+        with CaptureQueriesContext(connection) as context:
+            report = import_catalog(self.vendor, read_rows(BytesIO(data), 'jsonl'), chunk_size=500)
+
+        self.assertEqual(report.created, 1198)
+        self.assertEqual([row for row, message in report.errors], [11, 12])
+        self.assertLess(len(context), 30)
+        self.assertTrue(Product.objects.filter(slug='product-1199', price=Decimal('1.50')).exists())
+        # Imported products are searchable right away
+        self.assertEqual(get_search_backend().search('product 1199').total, 1)
+
+    def test_admin_upload_and_command(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        imports = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, imports)
+
+        # Vendors are looked up as you type, not listed in one select box
+        self.assertContains(self.client.get('/admin/product/catalogimport/add/'), 'admin-autocomplete')
+
+        with override_settings(CATALOG_IMPORT_ROOT=imports):
+            upload = SimpleUploadedFile('catalog.csv', self.CSV.encode())
+            response = self.client.post('/admin/product/catalogimport/add/', {'vendor': self.vendor.pk, 'format': 'csv', 'file': upload})
+            self.assertEqual(response.status_code, 302)
+
+            # Queued, not imported in the request
+            catalog_import = CatalogImport.objects.get()
+            self.assertEqual(catalog_import.status, CatalogImport.PENDING)
+            self.assertFalse(Product.objects.filter(title='Cake').exists())
+
+            out = StringIO()
+            call_command('import_catalog', '--queued', stdout=out)
+            self.assertIn('Created 2 products, 3 rows with errors', out.getvalue())
+
+        catalog_import.refresh_from_db()
+        self.assertEqual((catalog_import.status, catalog_import.created, catalog_import.file.name), (CatalogImport.DONE, 2, ''))
+        self.assertEqual(os.listdir(os.path.join(imports, catalog_import.created_at.strftime('%Y/%m'))), [])
+        self.assertContains(self.client.get('/admin/product/catalogimport/%d/change/' % catalog_import.pk), 'Unknown category')
+
+        path = tempfile.mktemp(suffix='.csv')
+        with open(path, 'w') as f:
+            f.write(self.CSV)
+        self.addCleanup(os.remove, path)
+
+        out = StringIO()
+        call_command('import_catalog', str(self.vendor.pk), path, stdout=out)
+        self.assertIn('Row 6: price', out.getvalue())
+        self.assertEqual(Product.objects.filter(title='Cake').count(), 4)
+        self.assertEqual(len(set(Product.objects.values_list('slug', flat=True))), 4)
+
+    def test_fetch_images_queues_derivatives(self):
+        import_catalog(self.vendor, read_rows(BytesIO(self.CSV.encode()), 'csv'))
+        product = Product.objects.get(image_status=Product.IMAGE_REMOTE)
+
+        with mock.patch('product.utilities.download_image', return_value=make_image()):
+            self.assertEqual(fetch_product_images([product]), (1, 0))
+
+        product.refresh_from_db()
+        self.assertEqual(product.image_status, Product.IMAGE_PENDING)
+        self.assertTrue(product.image.name.endswith('.jpg'))
+
+        for error in (OSError, IncompleteRead(b'')):
+            Product.objects.filter(pk=product.pk).update(image='', image_status=Product.IMAGE_REMOTE)
+            with mock.patch('product.utilities.download_image', side_effect=error):
+                self.assertEqual(fetch_product_images([product]), (0, 1))
+            self.assertEqual(Product.objects.get(pk=product.pk).image_status, Product.IMAGE_FAILED)
+
+    def test_fetch_images_rejects_internal_hosts_and_non_images(self):
+        for url in ('http://127.0.0.1/image.jpg', 'http://localhost:8000/admin/', 'http://[::1]/image.jpg', 'http://10.0.0.1/image.jpg', 'file:///etc/passwd'):
+            with self.assertRaises(ValueError):
+                download_image(url)
+
+        import_catalog(self.vendor, read_rows(BytesIO(self.CSV.encode()), 'csv'))
+        product = Product.objects.get(image_status=Product.IMAGE_REMOTE)
+        for data in (b'<html><script>alert(1)</script></html>', make_image()[:200], make_image(format='BMP')):
+            Product.objects.filter(pk=product.pk).update(image='', image_status=Product.IMAGE_REMOTE)
+            with mock.patch('product.utilities.download_image', return_value=data):
+                self.assertEqual(fetch_product_images([product]), (0, 1))
+            self.assertEqual(Product.objects.get(pk=product.pk).image, '')
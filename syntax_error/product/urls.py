@@ -8,6 +8,7 @@ app_name = 'product'
 
 urlpatterns = [
     path('search', views.search, name="search"),
+    path('search/suggest', views.search_suggest, name="search-suggest"),
     path('<slug:category_slug>/<slug:product_slug>/', views.product, name="product"),
     path('<slug:category_slug>/', views.category, name="category"),
     
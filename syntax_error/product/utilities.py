@@ -0,0 +1,234 @@
+import ipaddress
+import operator
+import os
+import random
+import socket
+import urllib.request
+from functools import reduce
+from http.client import HTTPException
+from io import BytesIO
+from urllib.parse import urlparse
+
+from PIL import Image
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Max, Min, Q
+from django.utils.functional import SimpleLazyObject
+from django.utils.text import slugify
+
+from core.cache import bump_version
+from core.pagination import keyset_paginate
+
+from .images import render_derivatives
+from .models import Product, SimilarProduct
+
+PRODUCTS_PER_PAGE = 20
+IMAGE_FETCH_TIMEOUT = 10 # Seconds
+IMAGE_FETCH_MAX_BYTES = 10 * 1024 * 1024
+# Formats a downloaded image may have, with the extension it is stored under
+IMAGE_FETCH_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def get_unique_slugs(titles):
+    """slugify() each title, with -2, -3, ... appended where a product or an earlier title already has the slug."""
+    bases = [slugify(title)[:50] or 'product' for title in titles]
+
+    # Only the slugs already taken need a second look for their numbered variants
+    taken = set(Product.objects.filter(slug__in=set(bases)).values_list('slug', flat=True))
+    if taken:
+        numbered = reduce(operator.or_, (Q(slug__startswith=base + '-') for base in taken))
+        taken.update(Product.objects.filter(numbered).values_list('slug', flat=True))
+
+    slugs = []
+    for base in bases:
+        slug, n = base, 2
+        while slug in taken:
+            slug = '%s-%d' % (base, n)
+            n += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def get_unique_slug(title):
+    return get_unique_slugs([title])[0]
+
+
+def read_image(product):
+    with product.image.open('rb') as f:
+        return f.read()
+
+
+def save_derivatives(product, rendered):
+    derivatives = {'source': product.image.name, 'files': []}
+    thumbnail = ''
+
+    for (size, format), data in rendered.items():
+        name = 'derivatives/%d/%s.%s' % (product.id, size, 'jpg' if format == 'jpeg' else format)
+        name = default_storage.save(name, ContentFile(data))
+
+        # Storage names are kept so garbage collection knows the files are in use
+        derivatives['files'].append(name)
+        derivatives.setdefault(size, {})[format] = default_storage.url(name)
+        if (size, format) == ('list', 'jpeg'):
+            thumbnail = name
+
+    # Skip the write if the image was replaced while we were working on it
+    Product.objects.filter(pk=product.pk, image=product.image.name).update(derivatives=derivatives, thumbnail=thumbnail, image_status=Product.IMAGE_READY)
+    # update() sends no signals, and cached listings show the thumbnail
+    bump_version('catalog')
+
+
+def build_product_images(products, pool):
+    """
+    Render and store derivatives for products, decoding images in pool (a ProcessPoolExecutor the caller
+    keeps for all its batches, so workers aren't started for each one). Returns (built, failed).
+    """
+    products = [product for product in products if product.image]
+    if not products:
+        return 0, 0
+
+    built = failed = 0
+
+    futures = []
+    for product in products:
+        try:
+            futures.append((product, pool.submit(render_derivatives, read_image(product))))
+        except OSError:
+            futures.append((product, None))
+
+    for product, future in futures:
+        try:
+            if future is None:
+                raise OSError('Image file is missing')
+            save_derivatives(product, future.result())
+            built += 1
+        except Exception:
+            Product.objects.filter(pk=product.pk, image=product.image.name).update(image_status=Product.IMAGE_FAILED)
+            failed += 1
+
+    return built, failed
+
+
+def check_image_url(url):
+    """Raise ValueError unless url is http(s) on a host that only resolves to public addresses."""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError('Only http and https image URLs are fetched')
+
+    for family, type, proto, canonname, address in socket.getaddrinfo(parsed.hostname, parsed.port or parsed.scheme, type=socket.SOCK_STREAM):
+        if not ipaddress.ip_address(address[0].split('%')[0]).is_global:
+            raise ValueError('%s is not a public host' % parsed.hostname)
+
+
+class CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    # A public URL must not redirect to an internal one
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_image_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+image_opener = urllib.request.build_opener(CheckedRedirectHandler)
+
+
+def download_image(url):
+    check_image_url(url)
+
+    with image_opener.open(url, timeout=IMAGE_FETCH_TIMEOUT) as response:
+        data = response.read(IMAGE_FETCH_MAX_BYTES + 1)
+
+    if len(data) > IMAGE_FETCH_MAX_BYTES:
+        raise ValueError('Image is larger than %d bytes' % IMAGE_FETCH_MAX_BYTES)
+    return data
+
+
+def verify_image(data):
+    """The storage extension for image bytes in one of IMAGE_FETCH_FORMATS; ValueError for anything else."""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            format = image.format
+            image.verify()
+    except Exception as e:
+        # PIL raises a variety of errors for truncated and malformed files
+        raise ValueError('Not a valid image: %s' % e)
+
+    if format not in IMAGE_FETCH_FORMATS:
+        raise ValueError('Unsupported image format %s' % format)
+    return IMAGE_FETCH_FORMATS[format]
+
+
+def fetch_product_images(products):
+    """
+    Download image_url into image for imported products, queueing them for derivatives. Returns (fetched, failed).
+    Only public http(s) URLs are fetched and only verified JPEG, PNG, GIF and WebP images are stored; anything else fails the product.
+    """
+    fetched = failed = 0
+
+    for product in products:
+        # Only products still waiting for this URL, in case the vendor changed it meanwhile
+        waiting = Product.objects.filter(pk=product.pk, image_status=Product.IMAGE_REMOTE, image_url=product.image_url)
+
+        try:
+            data = download_image(product.image_url)
+            extension = verify_image(data)
+        except (OSError, ValueError, HTTPException):
+            waiting.update(image_status=Product.IMAGE_FAILED)
+            failed += 1
+            continue
+
+        # The extension comes from the verified format, not from the URL
+        name = os.path.splitext(os.path.basename(urlparse(product.image_url).path))[0] or 'image'
+        name = default_storage.save('uploads/%s.%s' % (name, extension), ContentFile(data))
+        waiting.update(image=name, image_status=Product.IMAGE_PENDING)
+        fetched += 1
+
+    return fetched, failed
+
+
+def get_referenced_media():
+    """Storage names still used by some product: image, thumbnail and derivative files."""
+    names = set()
+
+    for image, thumbnail, derivatives in Product.objects.values_list('image', 'thumbnail', 'derivatives').iterator():
+        names.update(name for name in (image, thumbnail) if name)
+        names.update(derivatives.get('files', []))
+
+    return names
+
+
+def sample_category_products(category, k, exclude_ids=()):
+    """
+    Up to k products from category, starting at a random point in its id range, without
+    loading the whole category: the bounds, one indexed range query, and one more from the
+    start of the range when it runs past the last id. Always two or three queries.
+    """
+    products = Product.objects.filter(category=category).exclude(id__in=list(exclude_ids)).select_related('category').order_by('id')
+    bounds = products.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+
+    start = random.randint(bounds['low'], bounds['high'])
+    picked = list(products.filter(id__gte=start)[:k])
+
+    if len(picked) < k:
+        # Ran past the last id; wrap around to the start
+        picked += products.filter(id__lt=start)[:k - len(picked)]
+
+    return picked
+
+
+def get_similar_products(product, k=4):
+    similar = [
+        row.similar for row in SimilarProduct.objects.filter(product=product).select_related('similar__category')[:k]
+    ]
+
+    if len(similar) < k:
+        similar += sample_category_products(product.category_id, k - len(similar), [product.id] + [p.id for p in similar])
+
+    return similar
+
+
+def get_listing_page(products, cursor):
+    """Newest-first keyset page of products, only queried if the template's cached fragment misses."""
+    return SimpleLazyObject(lambda: keyset_paginate(products.select_related('category'), cursor, 'added_date', PRODUCTS_PER_PAGE))
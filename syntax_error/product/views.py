@@ -1,13 +1,17 @@
-import random # To get random products from the database
 from django.contrib import messages
 from django.shortcuts import redirect, render, get_object_or_404
 
 from .models import Category, Product
 
-from django.db.models import Q
+from django.http import JsonResponse
+from django.urls import reverse
 
 from .forms import AddToCartForm
+from .search import get_search_backend
+from .utilities import get_listing_page, get_similar_products
 from cart.cart import Cart
+from core.cache import get_version
+from core.pagination import normalize_cursor
 
 
 # Create your views here.
@@ -32,12 +36,9 @@ def product(request, category_slug, product_slug):
     else:
         form = AddToCartForm()
 
-    similar_products = list(product.category.products.exclude(id=product.id))
+    # Bought together with this product, topped up with random picks from its category
+    similar_products = get_similar_products(product, 4)
 
-    # If more than 4 similar products, then get 4 random products 
-    if len(similar_products) >= 4:
-        similar_products = random.sample(similar_products, 4)
-    
     context = {
         'product': product,
         'similar_products': similar_products,
@@ -49,11 +50,50 @@ def product(request, category_slug, product_slug):
 
 def category(request, category_slug):
     category = get_object_or_404(Category, slug=category_slug)
-    return render(request,'product/category.html', {'category': category})
+    cursor = normalize_cursor(request.GET.get('cursor', ''))
+
+    context = {
+        'category': category,
+        'products': get_listing_page(category.products.all(), cursor),
+        'cursor': cursor,
+        'catalog_version': get_version('catalog'),
+    }
+
+    return render(request,'product/category.html', context)
 
 
 def search(request):
     query = request.GET.get('query', '') # second is default parameter which is empty
-    products = Product.objects.filter(Q(title__icontains=query) | Q(description__icontains=query))
+    category = _int_param(request, 'category')
+    vendor = _int_param(request, 'vendor')
+    page = _int_param(request, 'page') or 1
+
+    results = get_search_backend().search(query, category=category, vendor=vendor, page=page)
+
+    context = {
+        'products': results,
+        'query': query,
+        'selected_category': category,
+        'selected_vendor': vendor,
+    }
+
+    return render(request, 'product/search.html', context)
+
+
+def search_suggest(request):
+    query = request.GET.get('query', '')
+    results = get_search_backend().search(query, per_page=8, facets=False)
+
+    suggestions = [
+        {'title': product.title, 'url': reverse('product:product', args=[product.category.slug, product.slug])}
+        for product in results
+    ]
+
+    return JsonResponse({'suggestions': suggestions})
+
 
-    return render(request, 'product/search.html', {'products':products, 'query': query})
\ No newline at end of file
+def _int_param(request, name):
+    try:
+        return int(request.GET.get(name, ''))
+    except ValueError:
+        return None
@@ -77,6 +77,17 @@ DATABASES = {
 }
 
 
+# Cache
+# Per-process by default; use a shared backend (Redis, Memcached) when running several workers
+# so version bumps (see core/cache.py) reach every process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -120,6 +131,20 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 
+# Uploads are stored by content hash (see core/storage.py)
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+# Directories collect_media_garbage may delete unreferenced files from
+MEDIA_GC_DIRS = ['cas', 'uploads', 'derivatives']
+# Catalogs uploaded in the admin, kept until import_catalog --queued imports them; never served
+CATALOG_IMPORT_ROOT = BASE_DIR / 'imports/'
+
+# Serve MEDIA_URL from Django (core.views.media). Turn off when the front server serves MEDIA_ROOT itself.
+SERVE_MEDIA = True
+# Hand the file body to the front server: None (Django sends it), 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd)
+MEDIA_SENDFILE = None
+# nginx internal location aliased to MEDIA_ROOT, for X-Accel-Redirect
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -131,13 +156,20 @@ LOGIN_REDIRECT_URL = 'vendor:vendor-admin'
 LOGOUT_REDIRECT_URL = 'core:home'
 
 SESSION_COOKIE_AGE = 86400 # Day in Seconds
-CART_SESSION_ID = 'cart'
+CART_SESSION_ID = 'cart' # Session key holding the anonymous cart token
+CART_STORE = 'cart.stores.DatabaseCartStore' # Or 'cart.stores.CacheCartStore' with a shared cache (Redis/Memcached)
 
 
 # STRIPE PAYMENT
 STRIPE_PUB_KEY = 'pk_test_OKdhbDNME5KHtnpzYRBfNmEZ00mjM6DVsJ' # For JavaScript
 STRIPE_SECRET_KEY = 'sk_test_jaIdMJOlkcUG6QpXV5wAJxXT005aZAJVM1' # For Django Backend
 
+# Orders are charged and finalized by "python manage.py process_payments", not in the request
+PAYMENT_GATEWAY = 'order.payments.StripeGateway' # 'order.payments.StubGateway' charges nothing, for development
+PAYMENT_BATCH_SIZE = 20
+PAYMENT_MAX_ATTEMPTS = 5
+PAYMENT_RETRY_DELAY = 30 # Seconds, doubled after every failed attempt
+
 # For Email Notification
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -147,3 +179,7 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 DEFAULT_EMAIL_FROM = 'Multi Vendor Site <YOUR-EMAIL>'
 
+# Order emails are queued in the outbox and sent by "python manage.py send_outbox"
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60 # Seconds, doubled after every failed attempt
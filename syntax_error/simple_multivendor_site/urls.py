@@ -1,9 +1,10 @@
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,4 +13,10 @@ urlpatterns = [
     path('product/', include('product.urls')),
     path('cart/', include('cart.urls')),
     path('order/', include('order.urls')),
-]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+# Unlike django.conf.urls.static.static(), also for production: conditional GET, byte ranges and X-Sendfile
+if settings.SERVE_MEDIA:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), media),
+    ]